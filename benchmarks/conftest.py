@@ -0,0 +1,36 @@
+"""
+    Fixtures for the benchmark suite. Each fixture is parametrized over the
+    named sizes in lesson_builder.config.BENCH_SIZES, so every benchmark runs at
+    each size. Run with `jtl bench`, or with pytest and pytest-benchmark:
+
+        pytest benchmarks -o addopts=
+"""
+
+import pytest
+
+from lesson_builder.config import BENCH_SIZES
+from lesson_builder.jmod.util import compile_meta
+from lesson_builder.jmod.walk import process_dir, walk_assignments
+from lesson_builder.synthetic import make_lesson_plan, make_levels
+
+
+@pytest.fixture(scope='module', params=list(BENCH_SIZES))
+def site(request, tmp_path_factory):
+    """A synthetic lesson plan and docs dir. Returns (lesson_dir, docs_dir)"""
+    root = tmp_path_factory.mktemp(f'site-{request.param}')
+    return make_lesson_plan(root, **BENCH_SIZES[request.param])
+
+
+@pytest.fixture(scope='module', params=list(BENCH_SIZES))
+def levels(request, tmp_path_factory):
+    """A synthetic java-modules tree. Returns (repo_root, levels_dir)"""
+    root = tmp_path_factory.mktemp(f'levels-{request.param}')
+    return root, make_levels(root, **BENCH_SIZES[request.param])
+
+
+@pytest.fixture(scope='module')
+def level_meta(levels):
+    """The meta.yaml data for the levels, as update_meta() compiles it"""
+    repo_root, levels_dir = levels
+    metas = [process_dir(repo_root, levels_dir, d) for d in walk_assignments(levels_dir)]
+    return compile_meta([m for m in metas if m])
@@ -0,0 +1,51 @@
+import shutil
+
+from lesson_builder.assignment import get_assignment
+from lesson_builder.dircache import DirCache
+from lesson_builder.lesson_plan import LessonPlan
+from lesson_builder.render import render
+from lesson_builder.trinket import extract_python
+
+
+def test_build_cold(benchmark, site):
+    lesson_dir, docs_dir = site
+
+    def clean():
+        shutil.rmtree(docs_dir / 'src' / 'lessons', ignore_errors=True)
+
+    benchmark.pedantic(lambda: LessonPlan(lesson_dir, docs_dir).build(),
+                       setup=clean, rounds=5)
+
+
+def test_build_warm(benchmark, site):
+    lesson_dir, docs_dir = site
+    LessonPlan(lesson_dir, docs_dir).build()
+
+    benchmark(lambda: LessonPlan(lesson_dir, docs_dir).build())
+
+
+def test_get_assignment(benchmark, site):
+    lesson_dir, docs_dir = site
+    paths = [a.path for a in LessonPlan(lesson_dir, docs_dir).curriculum.assignments]
+
+    def load_all():
+        # Like a build, the assignments share one set of directory listings
+        dc = DirCache()
+        return [get_assignment(p, dc) for p in paths]
+
+    benchmark(load_all)
+
+
+def test_extract_python(benchmark, site):
+    lesson_dir, docs_dir = site
+    text = '\n'.join(p.read_text() for p in sorted(lesson_dir.glob('*/*.md')))
+
+    _, code = benchmark(extract_python, text, 'program')
+    assert code
+
+
+def test_render(benchmark, site):
+    lesson_dir, docs_dir = site
+    plan = LessonPlan(lesson_dir, docs_dir).build()
+
+    benchmark(lambda: [render(**r.source) for r in plan.renders])
@@ -0,0 +1,79 @@
+""" The python.run fence tokenizer against the regex it replaced, on large
+lesson files. """
+import random
+import re
+
+import pytest
+
+from lesson_builder.synthetic import markdown_text
+from lesson_builder.trinket import extract_python
+
+
+def extract_python_regex(source: str, base_name: str = None):
+    """The DOTALL regex version of extract_python, for comparison"""
+    pattern = re.compile(r"```python\.run(?:\:\s*height='?(\d+)'?)?(?:,width='?(\d+)%?'?)?\n(.*?)```",
+                         re.DOTALL)
+
+    counter = [1]
+    code = {}
+
+    def replacer(match):
+        m = match.group(0).strip('```')
+
+        lines = m.split('\n')
+        first = lines[0]
+        py_code = '\n'.join(lines[1:])
+        if ':' in first:
+            _, spec = first.split(':')
+            _, height = spec.strip().split('=')
+            height = int(height.strip("'"))
+        else:
+            height = (len(py_code.split('\n')) * 17) + 110
+
+        prog_name = f"{base_name}_{counter[0]}.py"
+        code[prog_name] = py_code
+        counter[0] += 1
+
+        return f"{{{{ trinket(\"{prog_name}\", width=\"100%\", height=\"{height}\", embed_type=\"python3\") | safe }}}}"
+
+    return pattern.sub(replacer, source), code
+
+
+def large_lesson(blocks):
+    rng = random.Random(blocks)
+    return '\n'.join(markdown_text(rng, f'Part {i}', run_blocks=1, paragraphs=1)
+                     for i in range(blocks))
+
+
+def unclosed_lesson(blocks):
+    """Many run fences that are never closed, which the regex rescans to the end"""
+    return ''.join(f"Step {i}\n```python.run\nprint({i})\n\n" for i in range(blocks))
+
+
+@pytest.fixture(params=[100, 1000])
+def lesson(request):
+    return large_lesson(request.param)
+
+
+def test_same_output(lesson):
+    assert extract_python(lesson, 'prog') == extract_python_regex(lesson, 'prog')
+
+
+@pytest.mark.benchmark(group='fences')
+def test_tokenizer(benchmark, lesson):
+    benchmark(extract_python, lesson, 'prog')
+
+
+@pytest.mark.benchmark(group='fences')
+def test_regex(benchmark, lesson):
+    benchmark(extract_python_regex, lesson, 'prog')
+
+
+@pytest.mark.benchmark(group='fences-unclosed')
+def test_tokenizer_unclosed(benchmark):
+    benchmark(extract_python, unclosed_lesson(2000), 'prog')
+
+
+@pytest.mark.benchmark(group='fences-unclosed')
+def test_regex_unclosed(benchmark):
+    benchmark(extract_python_regex, unclosed_lesson(2000), 'prog')
@@ -0,0 +1,70 @@
+from copy import deepcopy
+
+import pytest
+import yaml
+
+from lesson_builder.buildlevels import make_lessons
+from lesson_builder.jmod.metastore import read_level, write_meta
+from lesson_builder.jmod.tasks import update_meta
+from lesson_builder.jmod.walk import cached_process_dir, process_dir, walk_assignments
+
+
+def test_update_meta(benchmark, levels):
+    repo_root, levels_dir = levels
+
+    benchmark(update_meta, repo_root, levels_dir)
+
+
+def test_make_lessons(benchmark, levels, level_meta):
+    repo_root, levels_dir = levels
+    meta = level_meta['Level0']
+    web_root = repo_root / '_build' / 'Level0'
+
+    # make_lessons() consumes the readmes in the meta, so each round gets a copy
+    benchmark.pedantic(make_lessons,
+                       setup=lambda: (('Level0', repo_root, web_root, deepcopy(meta)), {}),
+                       rounds=5)
+
+
+@pytest.fixture(scope='module')
+def stored_meta(levels, level_meta, tmp_path_factory):
+    """The level meta, as the old meta.yaml and in the meta store"""
+    root = tmp_path_factory.mktemp('meta')
+    (root / 'meta.yaml').write_text(yaml.dump(level_meta, indent=2))
+    write_meta(root, deepcopy(level_meta))
+    return root
+
+
+@pytest.mark.benchmark(group='level-meta')
+def test_load_meta_yaml(benchmark, stored_meta):
+    benchmark(lambda: yaml.safe_load((stored_meta / 'meta.yaml').read_text())['Level0'])
+
+
+@pytest.mark.benchmark(group='level-meta')
+def test_read_level(benchmark, stored_meta):
+    benchmark(read_level, stored_meta, 'Level0')
+
+
+@pytest.mark.benchmark(group='assignment-meta')
+def test_process_dirs(benchmark, levels):
+    repo_root, levels_dir = levels
+    dirs = walk_assignments(levels_dir)
+
+    benchmark(lambda: [process_dir(repo_root, levels_dir, d) for d in dirs])
+
+
+@pytest.mark.benchmark(group='assignment-meta')
+def test_process_dirs_reused(benchmark, levels):
+    """The .meta files are up to date, as in a second `jtl java meta`"""
+    repo_root, levels_dir = levels
+    dirs = walk_assignments(levels_dir)
+    for d in dirs:
+        cached_process_dir(repo_root, levels_dir, d)
+
+    benchmark(lambda: [cached_process_dir(repo_root, levels_dir, d) for d in dirs])
+
+
+def test_walk_assignments(benchmark, levels):
+    _, levels_dir = levels
+
+    benchmark(walk_assignments, levels_dir)
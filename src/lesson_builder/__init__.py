@@ -1,17 +1,61 @@
+import importlib
+import sys
+import types
 
-from pkg_resources import get_distribution, DistributionNotFound
+# The version and the names re-exported from the render, trinket and lesson
+# modules are loaded on first access, so importing a small module of the package,
+# like the CLI does, doesn't import Jinja, frontmatter and the lesson stack.
+_reexport_modules = ('.render', '.trinket', '.lesson')
 
-try:
-    # Change here if project is renamed and does not equal the package name
-    dist_name = 'lesson-builder'
-    __version__ = get_distribution(dist_name).version
-except DistributionNotFound:
-    __version__ = 'unknown'
-finally:
-    del get_distribution, DistributionNotFound
 
-from .render import *
-from .trinket import *
-from .lesson import *
+class _Package(types.ModuleType):
+    """The package module. When a re-exported module is first imported, the
+    import system binds it on the package, which would hide a function of the
+    same name, like render.render and trinket.trinket. Those names are bound to
+    the function instead, as `from .render import *` did, so the result doesn't
+    depend on what was imported first."""
 
+    def __setattr__(self, name, value):
+        if isinstance(value, types.ModuleType) and '.' + name in _reexport_modules \
+                and value.__name__ == f'{__name__}.{name}' and hasattr(value, name):
+            value = getattr(value, name)
+        super().__setattr__(name, value)
 
+
+sys.modules[__name__].__class__ = _Package
+
+
+def _get_version():
+    if sys.version_info[:2] >= (3, 8):
+        from importlib.metadata import PackageNotFoundError, version
+    else:
+        from importlib_metadata import PackageNotFoundError, version
+
+    try:
+        # Change here if project is renamed and does not equal the package name
+        dist_name = 'lesson-builder'
+        return version(dist_name)
+    except PackageNotFoundError:
+        return 'unknown'
+
+
+def _reexport():
+    """Do what `from .render import *`, and so on, did at import"""
+    for m in _reexport_modules:
+        mod = importlib.import_module(m, __name__)
+        names = getattr(mod, '__all__', None) or [n for n in vars(mod) if not n.startswith('_')]
+        globals().update({n: getattr(mod, n) for n in names})
+
+
+def __getattr__(name):
+    if name == '__version__':
+        globals()['__version__'] = v = _get_version()
+        return v
+
+    if not name.startswith('_') and '_reexported' not in globals():
+        globals()['_reexported'] = True
+        _reexport()
+        if name in globals():
+            return globals()[name]
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
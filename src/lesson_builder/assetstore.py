@@ -0,0 +1,146 @@
+""" Content addressed asset store. Images are written once, to a path named by
+the hash of their content, like `.vuepress/public/assets/ab/abcdef0123.png`,
+instead of into every lesson and assignment that uses them, and the references
+in the rendered pages are rewritten to the stored paths.
+"""
+import dataclasses
+import hashlib
+import os
+import re
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from .config import resource_extensions
+from .manifest import hash_file
+
+if TYPE_CHECKING:
+    from .util import ResourceWrite
+
+DIGEST_LENGTH = 20  # Hex digits of the sha256 in the stored names
+
+# Markdown images, ![alt](goal.png), without a title
+MD_IMAGE_RE = re.compile(r'!\[([^\]]*)\]\(\s*([^)\s]+)\s*\)')
+IMG_TAG_RE = re.compile(r'<img\b[^>]*>')
+IMG_ATTR_RE = re.compile(r'(?<![:\w-])(src|srcset)="([^"]*)"')
+
+
+def with_base(url):
+    """A Vue expression for a URL under the site base"""
+    return f"$withBase('{url}')"
+
+
+def rewrite_asset_refs(text: str, urls: dict):
+    """Rewrite the references to stored assets in a rendered page. Markdown
+    images and the src and srcset of img tags that refer to a name in urls,
+    relative to the page, are replaced with img tags bound to the stored URL,
+    under the site base.
+
+    Args:
+        text (str): The rendered page
+        urls (dict): Names of assets, relative to the page, to their URLs in the store
+    """
+
+    def url_for(ref):
+        return urls.get(ref[2:] if ref.startswith('./') else ref)
+
+    def replace_attr(m):
+        name, value = m.groups()
+
+        if name == 'src':
+            url = url_for(value)
+            return m.group(0) if url is None else f':src="{with_base(url)}"'
+
+        candidates = [c.split() for c in value.split(',') if c.strip()]
+        if not candidates or not all(url_for(c[0]) for c in candidates):
+            return m.group(0)
+
+        expr = " + ', ' + ".join(with_base(url_for(c[0])) + ''.join(f" + ' {d}'" for d in c[1:])
+                                 for c in candidates)
+        return f':srcset="{expr}"'
+
+    def replace_md(m):
+        alt, ref = m.groups()
+        url = url_for(ref)
+        if url is None:
+            return m.group(0)
+
+        alt = alt.replace('"', '&quot;')
+        return f'<img :src="{with_base(url)}" alt="{alt}">'
+
+    text = IMG_TAG_RE.sub(lambda m: IMG_ATTR_RE.sub(replace_attr, m.group(0)), text)
+    return MD_IMAGE_RE.sub(replace_md, text)
+
+
+class AssetStore:
+    """Moves the image writes of a lesson or assignment into the store.
+
+    Args:
+        assets_dir (Path): The store directory, in the vuepress public dir
+        url_prefix (str): The URL of assets_dir, without the site base
+    """
+
+    def __init__(self, assets_dir: Path, url_prefix: str = '/assets'):
+        self.assets_dir = Path(assets_dir)
+        self.url_prefix = url_prefix.rstrip('/')
+        self._digests = {}  # (path, size, mtime, inputs key) -> digest
+        self._lock = threading.Lock()
+
+    def digest(self, w: "ResourceWrite"):
+        """Hash of the content that a write produces: the source file and the
+        settings that change how it is written, like image optimization"""
+        st = os.stat(w.source)
+        key = (str(w.source), st.st_size, st.st_mtime_ns, w.inputs_key())
+
+        with self._lock:
+            d = self._digests.get(key)
+
+        if d is None:
+            h = hashlib.sha256(hash_file(w.source).encode('ascii'))
+            if key[3] is not None:
+                h.update(key[3].encode('utf8'))
+            d = h.hexdigest()[:DIGEST_LENGTH]
+
+            with self._lock:
+                self._digests[key] = d
+
+        return d
+
+    def stored_name(self, w: "ResourceWrite"):
+        """Path of the stored asset, relative to the store"""
+        d = self.digest(w)
+        return f"{d[:2]}/{d}{w.source.suffix.lower()}"
+
+    def store_writes(self, writes):
+        """Move the image copies that are in the working directory of a render
+        to the store, and give each of those renders the URLs of its assets,
+        for rewrite_asset_refs(). Other writes are unchanged. Each stored asset
+        is written once per call, however many copies of it there were."""
+
+        pages = {Path(w.source['working_directory']).absolute() for w in writes if w.is_render}
+
+        urls = {}  # page dir -> {name: url}
+        stored = set()
+        res = []
+
+        for w in writes:
+            dest = Path(w.dest).absolute()
+
+            if (w.is_render or not isinstance(w.source, Path) or dest.parent not in pages
+                    or w.source.suffix.lower() not in resource_extensions or not w.source.is_file()):
+                res.append(w)
+                continue
+
+            name = self.stored_name(w)
+            urls.setdefault(dest.parent, {})[dest.name] = f"{self.url_prefix}/{name}"
+
+            if name not in stored:
+                stored.add(name)
+                res.append(dataclasses.replace(w, dest=self.assets_dir / name))
+
+        for i, w in enumerate(res):
+            page_urls = urls.get(Path(w.source['working_directory']).absolute()) if w.is_render else None
+            if page_urls:
+                res[i] = dataclasses.replace(w, source=dict(w.source, asset_urls=page_urls))
+
+        return res
@@ -1,11 +1,14 @@
 import logging
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-import frontmatter
-import yaml
+from .dircache import DirCache
+from .parsecache import parse_cache
+from .trinket import generate_trinket_embed
+from .util import Frozen, ResourceWrite, freeze, get_first_h1_heading
 
-from .trinket import generate_trinket_iframe
-from .util import ResourceWrite, get_first_h1_heading
+if TYPE_CHECKING:
+    from .lesson import Lesson
 
 logger = logging.getLogger('lesson-builder')
 from .config import resource_extensions
@@ -29,10 +32,17 @@ def get_resource_references(dir_, text):
 
 
 
-def get_assignment(path):
-    """Read an assignment and construct a dict of the important information"""
+def get_assignment(path, dir_cache: DirCache = None):
+    """Read an assignment and construct a dict of the important information
+
+    Args:
+        path: The assignment markdown file or directory
+        dir_cache (DirCache): Directory listings shared with the rest of the
+            build. Each directory is listed once.
+    """
 
     path = Path(path)
+    dc = dir_cache if dir_cache is not None else DirCache()
 
     def prep_meta(meta):
         meta['texts'] = {}
@@ -40,10 +50,8 @@ def get_assignment(path):
         meta['sources'] = []
 
 
-    if path.is_file():
-        text = path.read_text()
-
-        meta = frontmatter.loads(text)
+    if dc.is_file(path):
+        meta = parse_cache.frontmatter(path)
         if 'title' not in meta:
             meta['title'] = get_first_h1_heading(path)
 
@@ -53,18 +61,18 @@ def get_assignment(path):
 
         meta['texts']['trinket'] = path
 
-        meta['resources'] = get_resource_references(path.parent, text)
+        meta['resources'] = get_resource_references(path.parent, meta.content)
 
-        for f in list(path.parent.glob('*')):
+        for f in dc.children(path.parent):
             if f.suffix in resource_extensions:
                 meta['resources'].append(f)
 
         meta['resources'] = list(set(meta['resources']))
 
-    elif path.is_dir():
+    elif dc.is_dir(path):
         meta_path = path / '_assignment.yaml'
 
-        if not meta_path.exists():
+        if not dc.exists(meta_path):
             logger.warning(f"No _assignment.yaml meta file found in {path}")
             return {
                 'sources': [],
@@ -72,23 +80,24 @@ def get_assignment(path):
                 'resources': []
             }
 
-        meta = yaml.safe_load(meta_path.read_text())
+        meta = parse_cache.yaml(meta_path)
 
         meta['source_dir'] = path
         meta['name'] = path.name
         prep_meta(meta)
 
-        for f in path.glob('*.py'):
-            meta['sources'].append(f)
+        # One pass over the directory for the sources, texts and resources
+        for f in dc.children(path):
+            if f.suffix == '.py':
+                meta['sources'].append(f)
 
-        for f in path.glob('*.md'):
-            meta['texts'][f.stem] = f
+            elif f.suffix == '.md':
+                meta['texts'][f.stem] = f
 
-            if 'title' not in meta:
-                meta['title'] = get_first_h1_heading(f)
+                if 'title' not in meta:
+                    meta['title'] = get_first_h1_heading(f)
 
-        for f in list(path.glob('*')):
-            if f.suffix in resource_extensions:
+            elif f.suffix in resource_extensions:
                 meta['resources'].append(f)
 
     if not meta['title']:
@@ -97,18 +106,29 @@ def get_assignment(path):
     return meta
 
 
-class Assignment:
+class Assignment(Frozen):
+    """An assignment, from either a markdown file or a directory with an
+    _assignment.yaml file. The assignment data is read once, when the assignment
+    is constructed, and the assignment is immutable after that."""
+
+    __slots__ = ('lesson', 'path', 'ass_data', 'title', 'name', 'dest_dir')
+
     def __init__(self, lesson: "Lesson", path):
-        self.lesson = lesson
-        self.path = Path(path)
+        self._set(lesson=lesson, path=Path(path))
+
+        dir_cache = self.lesson.lesson_plan.dir_cache
 
-        if not self.path.exists():
+        if not dir_cache.exists(self.path):
             raise FileNotFoundError(f'Assignment directory nonexistant: ', path)
 
-        self.ass_data = get_assignment(self.path)
+        ad = get_assignment(self.path, dir_cache)
+        # A file assignment's data is a frontmatter.Post; keep its metadata
+        self._set(ass_data=freeze(getattr(ad, 'metadata', ad)))
+        self._set(title=self._find_title(),
+                  name=self.ass_data.get('name', self.path.stem))
+        self._set(dest_dir=self.lesson.dest_dir / self.name)
 
-    @property
-    def title(self):
+    def _find_title(self):
         try:
             title = self.ass_data['title']
 
@@ -118,18 +138,26 @@ class Assignment:
             logger.warning(f'Did not get a title from assignment data, directory {self.path}\n')
             return "<No Title>"
 
-    @property
-    def name(self):
-        return self.ass_data['name']
-
     @property
     def src_dir(self):
         """Source directory for the assignment"""
         return self.path
 
     @property
-    def dest_dir(self):
-        return self.lesson.dest_dir / self.name
+    def source_paths(self):
+        """All of the files the assignment is built from"""
+        ad = self.ass_data
+
+        if self.path.is_dir():
+            paths = [self.path / '_assignment.yaml']
+        else:
+            paths = [self.path]
+
+        paths.extend(ad.get('texts', {}).values())
+        paths.extend(ad.get('sources', []))
+        paths.extend(ad.get('resources', []))
+
+        return [Path(p) for p in dict.fromkeys(paths)]
 
     def render(self):
 
@@ -137,7 +165,8 @@ class Assignment:
 
         for text_name in ('trinket', 'index'):
             if text_name in ad['texts']:
-                text = ad['texts'][text_name].read_text()
+                text_path = ad['texts'][text_name]
+                text = text_path.read_text()
                 break
         else:
             logger.warning(f"No text content for {self.name} ({ad['texts']})")
@@ -145,12 +174,17 @@ class Assignment:
 
         from .trinket import extract_python
 
-        def replace_f(code, height):
-            return generate_trinket_iframe(code, height=str(height), width='100%')
+        embed_mode = self.lesson.lesson_plan.trinket_embed
+
+        def replace_f(code, height, width='100%'):
+            embed = generate_trinket_embed(code, height=str(height), width=width, mode=embed_mode)
+            # The placeholders show the code, which must not be read as Jinja
+            return embed if embed_mode in ('iframe', 'lazy') else f"{{% raw %}}{embed}{{% endraw %}}"
 
         # Convert "```python.run" lines, which are not
         # handled by Markdown.
-        modified_text, code = extract_python(text, replacement_f=replace_f)
+        modified_text, code = extract_python(text, replacement_f=replace_f,
+                                             source_name=str(text_path))
 
         # We are turning a dict here so it can be rendered later. The dict is the
         # argument list for render()
@@ -158,9 +192,10 @@ class Assignment:
                   frontmatter={'title': ad['title']},
                   title=ad['title'],
                   working_directory=self.dest_dir,
+                  trinket_embed=embed_mode,
                   content=modified_text)
 
-        return ResourceWrite(md, self.dest_dir / 'index.md')
+        return ResourceWrite(md, self.dest_dir / 'index.md', file=str(text_path))
 
     def collect_writes(self):
 
@@ -191,7 +226,7 @@ class Assignment:
         else:
             logger.warning(f"Render returned nothing for {self.name}")
 
-        return res
+        return self.lesson.lesson_plan.prepare_writes(res)
 
     @property
     def sidebar_entry(self):
@@ -0,0 +1,222 @@
+""" The build plan: every ResourceWrite for a lesson plan, computed once and
+executed in two phases, copies first and then renders.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .lesson_plan import LessonPlan
+    from .manifest import BuildManifest
+
+logger = logging.getLogger('lesson-builder')
+
+
+class BuildCancelled(Exception):
+    """Raised at a write boundary when the build's CancelToken is cancelled"""
+
+
+class CancelToken:
+    """Cancellation flag for a running build. The plan checks it before each
+    ResourceWrite, so a cancelled build stops at the next write boundary and
+    never leaves a half written file."""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def check(self):
+        if self._event.is_set():
+            raise BuildCancelled()
+
+
+def write_chains(writes):
+    """Group writes by destination. Writes to unrelated destinations are
+    independent and can run concurrently. Writes to the same destination, or
+    to a directory and a path inside it, as with a copytree of an images dir
+    and a file in it, stay in one chain, in plan order, so the last one still
+    wins."""
+
+    # Each destination's group, joined with the group of any destination that
+    # is one of its ancestors
+    parent = {}
+
+    def find(d):
+        while parent[d] != d:
+            parent[d] = parent[parent[d]]
+            d = parent[d]
+        return d
+
+    dests = [Path(os.path.abspath(w.dest)) for w in writes]
+    for d in dests:
+        parent.setdefault(d, d)
+
+    for d in parent:
+        for a in d.parents:
+            if a in parent:
+                parent[find(d)] = find(a)
+
+    chains = {}
+    for w, d in zip(writes, dests):
+        chains.setdefault(find(d), []).append(w)
+
+    return list(chains.values())
+
+
+def render_in_worker(source: dict, file: str = None):
+    """Render one template source in a worker process and return the text.
+    Errors are re-raised with the name of the lesson or assignment text, since
+    the worker's traceback alone does not say which page failed."""
+    from .render import render
+
+    try:
+        return render(**source)
+    except Exception as e:
+        name = file or source.get('working_directory')
+        raise RuntimeError(f"Error rendering {name}: {type(e).__name__}: {e}") from None
+
+
+class BuildPlan:
+    """An ordered list of ResourceWrites for one build of a lesson plan,
+    split into a copy phase and a render phase. The renders run after the
+    copies because templates may read the files that were copied, such as
+    the program files that trinket() embeds."""
+
+    def __init__(self, lesson_plan: "LessonPlan", writes):
+        self.lesson_plan = lesson_plan
+
+        self.copies = [w for w in writes if not w.is_render]
+        self.renders = [w for w in writes if w.is_render]
+
+    @classmethod
+    def from_lesson_plan(cls, lesson_plan: "LessonPlan"):
+        """Walk the lesson plan once and collect all of its writes"""
+        return cls(lesson_plan, lesson_plan.collect_writes())
+
+    @property
+    def writes(self):
+        """All of the writes, in the order they are executed"""
+        return self.copies + self.renders
+
+    @property
+    def destinations(self):
+        return [r.dest for r in self.writes]
+
+    @property
+    def root(self):
+        """Common root of the sources and destinations, for short log messages"""
+        lp = self.lesson_plan
+        dirs = [lp.less_plan_dir, Path(lp.asgn_dir), lp.vue_doc_dir]
+        return Path(os.path.commonpath([str(Path(d).absolute()) for d in dirs]))
+
+    def describe(self, r):
+        try:
+            return r.as_str(self.root)
+        except ValueError:
+            return str(r)
+
+    def _run_one(self, r, action, manifest=None, cancel=None):
+        if cancel is not None:
+            cancel.check()
+
+        if manifest is not None and manifest.is_fresh(r):
+            logger.debug(f'Unchanged {r}')
+            return
+
+        logger.debug(f'{action.title()} {r}')
+        try:
+            getattr(r, action)()
+        except Exception as e:
+            from_file = f' (from {r.file})' if r.file else ''
+            logger.error(f'Error in {action} {self.describe(r)}{from_file}: {e}')
+            raise
+
+        if manifest is not None:
+            manifest.record(r)
+
+    def _run_chain(self, chain, action, manifest=None, cancel=None):
+        for r in chain:
+            self._run_one(r, action, manifest, cancel)
+
+    def _run_phase(self, writes, action, jobs=1, manifest=None, cancel=None):
+        if jobs <= 1:
+            self._run_chain(writes, action, manifest, cancel)
+            return
+
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            futures = [pool.submit(self._run_chain, chain, action, manifest, cancel)
+                       for chain in write_chains(writes)]
+
+            errors = [f.exception() for f in futures if f.exception() is not None]
+
+        if errors:
+            raise errors[0]
+
+    def run_copies(self, jobs=1, manifest=None, cancel=None):
+        self._run_phase(self.copies, 'write', jobs, manifest, cancel)
+
+    def run_renders(self, jobs=1, manifest=None, procs=0, cancel=None):
+        if procs > 0:
+            self._run_renders_in_processes(procs, manifest, cancel)
+        else:
+            self._run_phase(self.renders, 'render', jobs, manifest, cancel)
+
+    def _run_renders_in_processes(self, procs, manifest=None, cancel=None):
+        """Render the templates in a process pool. The workers only render; the
+        text comes back to this process and is written in plan order."""
+
+        renders = [r for r in self.renders if manifest is None or not manifest.is_fresh(r)]
+
+        pool = ProcessPoolExecutor(max_workers=procs)
+        try:
+            texts = pool.map(render_in_worker,
+                             [r.source for r in renders],
+                             [r.file for r in renders])
+
+            for r, text in zip(renders, texts):
+                if cancel is not None:
+                    cancel.check()
+
+                logger.debug(f'Rendered {r}')
+                r.write_rendered(text)
+
+                if manifest is not None:
+                    manifest.record(r)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def execute(self, jobs=1, manifest: "BuildManifest" = None, render_procs=0,
+                cancel: CancelToken = None):
+        """Run the copy phase, then the render phase
+
+        Args:
+            jobs (int): Number of worker threads per phase. With 1, the writes
+                run one after another in plan order.
+            manifest (BuildManifest): If given, skip writes whose inputs and outputs
+                are unchanged since the last build, and save the new hashes.
+            render_procs (int): If greater than 0, render templates in a pool of
+                this many worker processes.
+            cancel (CancelToken): If given and cancelled, stop at the next write and
+                raise BuildCancelled.
+        """
+        try:
+            self.run_copies(jobs, manifest, cancel)
+            self.run_renders(jobs, manifest, render_procs, cancel)
+        finally:
+            if manifest is not None:
+                manifest.save()
+
+    def __len__(self):
+        return len(self.copies) + len(self.renders)
+
+    def __str__(self):
+        return f"BuildPlan: {len(self.copies)} copies, {len(self.renders)} renders"
@@ -5,6 +5,7 @@ from pathlib import Path
 import frontmatter
 import yaml
 
+from .sink import sink
 from .util import logger
 from .render import javaref, forkrepo, reporef
 
@@ -118,9 +119,7 @@ def copy_resources(dir_, lv):
             if r.exists():
                 r = r.resolve()
                 if r.is_file():
-                    d = dir_ / r.name
-                    d.parent.mkdir(parents=True, exist_ok=True)
-                    d.write_bytes(r.read_bytes())
+                    sink.copy_file(r, dir_ / r.name)
 
                 else:
                     logger.debug(f"Resource {r} is not a file.")
@@ -180,7 +179,7 @@ def make_lessons(level, repo_root, web_root, meta):
             # Output the combined content with frontmatter
             t = frontmatter.dumps(post)
 
-            f.write_text(t)
+            sink.write_text(f, t)
 
             continue
 
@@ -205,13 +204,13 @@ def make_lessons(level, repo_root, web_root, meta):
 
             text = make_text(lv)
 
-            (dir_ / 'index.md').write_text(text)
+            sink.write_text(dir_ / 'index.md', text)
 
             fm = dict(frontmatter.loads(text))
 
             copy_resources(dir_, lv)
 
-            (dir_ / '_assignment.yaml').write_text(yaml.dump(fm))
+            sink.write_text(dir_ / '_assignment.yaml', yaml.dump(fm))
 
             lessons[mk]['assignments'].append(str(dir_.relative_to(ld)))
             lessons[mk]['assignments'] = list(sorted(lessons[mk]['assignments']))
@@ -239,7 +238,7 @@ def make_lessons(level, repo_root, web_root, meta):
 
         readme = frontmatter.dumps(frontmatter.Post(readme, **fm))
 
-        dir_.write_text(readme)
+        sink.write_text(dir_, readme)
 
 
 
@@ -249,4 +248,4 @@ def make_lessons(level, repo_root, web_root, meta):
 
     logger.info(f"Built {n_modules} modules and {n_lessons} lessons in {web_root}")
 
-    (ld / 'lesson-plan.yaml').write_text(yaml.dump(lp, sort_keys=False))
+    sink.write_text(ld / 'lesson-plan.yaml', yaml.dump(lp, sort_keys=False))
@@ -8,30 +8,20 @@ __license__ = "MIT"
 import logging
 import os
 import shutil
+from contextlib import nullcontext
 from pathlib import Path
 from textwrap import dedent
 
 import click
-import yaml
-from plumbum import local, FG
-from plumbum.cmd import yarn, git
-from plumbum.commands.processes import ProcessExecutionError
-from slugify import slugify
-from watchdog.events import FileSystemEventHandler
-from watchdog.observers import Observer
-
-from lesson_builder.buildlevels import make_lessons
-from lesson_builder.config import assignment_template_url, lesson_template_url
-from lesson_builder.jmod.git import clone_or_pull_repo, new_vuepress
-from lesson_builder.jmod.git import create_repo
-from lesson_builder.jmod.git import logger as git_logger
-from lesson_builder.jmod.tasks import update_meta
-from lesson_builder.jmod.util import copy_devcontainer
-from lesson_builder.jmod.walk import walk_modules
-from lesson_builder.lesson import logger as lesson_logger
-from lesson_builder.lesson_plan import LessonPlan
-from lesson_builder.util import download_and_extract_zip, find_file_path, get_repo_root, build_dir
-from lesson_builder.util import logger
+
+# Only light modules are imported here, for the option choices and defaults.
+# Each command imports what it needs when it runs, so `jtl --help` and
+# `jtl config` stay fast, and commands that don't use yarn work without it.
+from lesson_builder.config import DEFAULT_DEBOUNCE, DEFAULT_IGNORE, BENCH_SIZES
+from lesson_builder.sink import LINK_MODES
+
+logger = logging.getLogger('lesson-builder')
+git_logger = logging.getLogger('lesson_builder.jmod.git')
 
 show_exceptions = False
 
@@ -41,24 +31,28 @@ show_exceptions = False
 @click.option('-vv', '--debug', is_flag=True, show_default=True, default=False, help="DEBUG logging")
 @click.option('-E', '--exceptions', is_flag=True, show_default=True, default=False,
               help="Display exception stack traces")
-def main(verbose: bool, debug: bool,  exceptions: bool):
+@click.option('--no-cache', is_flag=True, default=False,
+              help="Parse the lesson plan, config and frontmatter without the parse cache")
+def main(verbose: bool, debug: bool,  exceptions: bool, no_cache: bool):
 
 
 
     if debug:
         logging.basicConfig()
         logger.setLevel(logging.DEBUG)
-        lesson_logger.setLevel(logging.DEBUG)
         git_logger.setLevel(logging.DEBUG)
     elif verbose:
         logging.basicConfig()
         logger.setLevel(logging.INFO)
-        lesson_logger.setLevel(logging.INFO)
         git_logger.setLevel(logging.INFO)
 
     global show_exceptions
     show_exceptions = exceptions
 
+    if no_cache:
+        from lesson_builder.parsecache import parse_cache
+        parse_cache.enabled = False
+
 
 def main_entry():
     try:
@@ -71,13 +65,15 @@ def main_entry():
 
 
 def check_dirs(lesson_path: str = None, docs_path=None, assignments_path=None):
+    from lesson_builder.util import find_vuepress_dir
+
     if lesson_path is None:
         lesson_path = Path.cwd() / 'lessons'
 
     lesson_path = Path(lesson_path)
 
     if docs_path is None:
-        vp = find_file_path(Path.cwd(), '.vuepress')
+        vp = find_vuepress_dir(Path.cwd())
         if not vp:
             raise FileNotFoundError(f"Vuepress dir '.vuepress' not found in {Path.cwd()}")
 
@@ -119,70 +115,110 @@ def check_dirs(lesson_path: str = None, docs_path=None, assignments_path=None):
 @click.option('-D', '--yarn-dev', is_flag=True, default=False,
               help='Also run Yarn Dev server. Incompatible with --yarn-build')
 @click.option('-w', '--watch', is_flag=True, default=False, help='Rebuild when source files change')
+@click.option('-j', '--jobs', type=int, default=1, show_default=True,
+              help='Number of worker threads for copying and writing files')
+@click.option('-F', '--force', is_flag=True, default=False,
+              help='Rewrite all outputs, ignoring the hashes in the build manifest')
+@click.option('-P', '--render-procs', type=int, default=0, show_default=True,
+              help='Render templates in this many worker processes. 0 renders in the main process')
+@click.option('-L', '--link-mode', type=click.Choice(LINK_MODES), default='copy', show_default=True,
+              help='How to put asset files in the docs dir. Falls back to copy where the '
+                   'file system does not support links')
+@click.option('-i', '--ignore', multiple=True,
+              help='Glob for files that do not trigger a rebuild in --watch. May be repeated')
+@click.option('--debounce', type=float, default=DEFAULT_DEBOUNCE, show_default=True,
+              help='Seconds to wait for changes to stop before rebuilding in --watch')
+@click.option('--profile', is_flag=True, default=False,
+              help='Profile the build. Writes jtl-build.pstats and prints the hot functions '
+                   'by module')
+@click.option('--sample', is_flag=True, default=False,
+              help='With --profile, also sample the stacks and write jtl-build.collapsed. '
+                   'The sampler adds to the profiled times')
 def build(lesson_path: str = None, docs_path=None, assignments_path=None,
-          url_base=None, yarn_build=False, yarn_dev=False, watch=False):
+          url_base=None, yarn_build=False, yarn_dev=False, watch=False, jobs=1,
+          force=False, render_procs=0, link_mode='copy', ignore=(), debounce=DEFAULT_DEBOUNCE,
+          profile=False, sample=False):
     """Build the website from the lesson plan
 
     Args:
         lesson_path (str): The path to the lesson plan. If not specified, the default is 'lessons'
         docs_path (str): The path to the docs directory. If not specified, the default is 'docs/src'
         assignments_path (str): The path to the assignments directory. If not specified, the default is 'assignments'
+        jobs (int): Number of worker threads for the writes
+        force (bool): Rewrite all outputs, even if the manifest says they are unchanged
+        render_procs (int): Number of worker processes for rendering templates
+        link_mode (str): copy, hardlink, reflink or symlink
+        ignore (tuple): Globs, in addition to DEFAULT_IGNORE, that --watch ignores
+        debounce (float): Seconds of quiet before --watch rebuilds
+        profile (bool): Profile the first build, not the --watch rebuilds
+        sample (bool): Also run the stack sampler while profiling
+
+    Returns:
+        The IncrementalBuilder
     """
 
+    from plumbum import local, FG
+
+    from lesson_builder.parsecache import parse_cache
+    from lesson_builder.profiling import profiled
+    from lesson_builder.sink import sink
+    from lesson_builder.watch import IncrementalBuilder
+
     lesson_path, docs_path, assignments_path = check_dirs(lesson_path, docs_path, assignments_path)
 
     if url_base is None or url_base is False:
+        from plumbum.cmd import git
+
         origin_url = git('remote', 'get-url', 'origin').strip()
         url_base = Path(origin_url).stem
         logger.info(f"Using url base '{url_base}'")
     elif url_base == '/':
         url_base = None
 
+    sink.link_mode = link_mode
+
     # Always build once first,
-    lp = LessonPlan(lesson_path, docs_path, assignments_path, less_subdir='lessons')
-    lp.update_config(basedir=url_base)
-    lp.build(url_base_dir=url_base)
+    with profiled('jtl-build', sample=sample) if profile else nullcontext():
+        builder = IncrementalBuilder(lesson_path, docs_path, assignments_path, url_base=url_base,
+                                     jobs=jobs, render_procs=render_procs)
+        manifest = builder.full_build(force=force)
+        print(manifest.summary())
+        if builder.lp.image_optimizer is not None:
+            print(builder.lp.image_optimizer.summary())
+        logger.info(parse_cache.summary())
 
     if yarn_build or yarn_dev:
+        from plumbum.cmd import yarn
+
         with local.cwd(docs_path):
             yarn['build'] & FG
 
     dist = docs_path / 'src/.vuepress/dist'
 
     if watch:
+        watch_and_rebuild(builder, yarn_build, ignore, debounce)
+    elif yarn_build:
+        print("Built to ", dist)
 
-        class RebuildHandler(FileSystemEventHandler):
-
-            def on_any_event(self, event):
-
-                if not event.src_path.endswith('~') and Path(event.src_path).is_file():
-                    logger.info(f"Got file change event: {Path(event.src_path)}")
-                    lp = LessonPlan(lesson_path, docs_path, assignments_path, less_subdir='lessons')
+    return builder
 
-                    try:
-                        lp.build(url_base_dir=url_base)
 
-                        if yarn_build:
-                            with local.cwd(docs_path):
-                                yarn['build'] & FG
+def watch_and_rebuild(builder, yarn_build=False, ignore=(), debounce=DEFAULT_DEBOUNCE):
+    """Watch the lesson plan and assignments of a finished build, and rebuild
+    on changes, until interrupted"""
+    from lesson_builder.watch import watch as watch_site
 
-                    except Exception as e:
-                        logger.error(f"Error building: {e}")
+    def after_build():
+        if yarn_build:
+            from plumbum import local, FG
+            from plumbum.cmd import yarn
 
-        event_handler = RebuildHandler()
-        observer = Observer()
-        observer.schedule(event_handler, assignments_path, recursive=True)
-        observer.schedule(event_handler, lesson_path, recursive=True)
-        observer.start()
-        try:
-            while observer.is_alive():
-                observer.join(1)
-        finally:
-            observer.stop()
-            observer.join()
+            with local.cwd(builder.docs_path):
+                yarn['build'] & FG
 
-    elif yarn_build:
-        print("Built to ", dist)
+    watch_site(builder, [builder.assignments_path, builder.lesson_path],
+               ignore=DEFAULT_IGNORE + tuple(ignore), debounce=debounce,
+               after_build=after_build)
 
 
 @main.command(help="Print configuration, exec path and version")
@@ -193,10 +229,70 @@ def config():
     exit(0)
 
 
+@main.command(help="Run the benchmarks and compare them to the saved baseline")
+@click.option('-s', '--size', 'sizes', multiple=True, type=click.Choice(list(BENCH_SIZES)),
+              help='Only run this size. May be repeated. Defaults to all sizes')
+@click.option('-S', '--save', is_flag=True, default=False,
+              help='Save the results as the new baseline')
+@click.option('-t', '--threshold', type=float, default=10.0, show_default=True,
+              help='Fail if a mean time is this many percent slower than the baseline')
+@click.option('--suite', default=None, help='Path to the benchmark suite. Defaults to the '
+                                            'benchmarks dir of the lesson-builder checkout; '
+                                            'required when lesson-builder is installed')
+@click.option('--storage', default='.benchmarks', show_default=True,
+              help='Directory for saved benchmark results')
+def bench(sizes=(), save=False, threshold=10.0, suite=None, storage='.benchmarks'):
+    """Run the pytest-benchmark suite on synthetic curricula
+
+    Args:
+        sizes (tuple): Names from BENCH_SIZES to run
+        save (bool): Save the results as the baseline that later runs compare to
+        threshold (float): Percent slowdown in the mean that fails the run
+        suite (str): Path to the benchmark suite
+        storage (str): Directory for saved results
+    """
+    import pytest
+
+    if suite:
+        suite = Path(suite)
+        if not suite.is_dir():
+            raise click.BadParameter(f"No benchmark suite at {suite}", param_hint="'--suite'")
+    else:
+        # The benchmarks are not installed with the package, only in a checkout
+        suite = Path(__file__).parents[3] / 'benchmarks'
+        if not suite.is_dir():
+            raise click.UsageError("The benchmark suite is only in a source checkout of "
+                                   "lesson-builder; use --suite to give its path")
+
+    # Clear the project's addopts, since coverage would skew the timings
+    args = [str(suite), '-o', 'addopts=', '-p', 'no:cacheprovider',
+            f'--benchmark-storage=file://{Path(storage).absolute()}']
+
+    if sizes:
+        # Benchmarks that are not parametrized by size, like the fence ones, always run
+        args += ['-k', f"({' or '.join(sizes)}) or not ({' or '.join(BENCH_SIZES)})"]
+
+    baselines = sorted(Path(storage).glob('*/*_baseline.json'))
+
+    if save:
+        args.append('--benchmark-save=baseline')
+    elif baselines:
+        run_id = baselines[-1].name.split('_')[0]
+        print(f"Comparing to baseline {baselines[-1]}")
+        args += [f'--benchmark-compare={run_id}',
+                 f'--benchmark-compare-fail=mean:{threshold}%']
+    else:
+        print("No saved baseline; run with --save to create one")
+
+    exit(int(pytest.main(args)))
+
+
 
 @click.option('-d', '--devcontainer', is_flag=True, show_default=True, default=False, help="Update devcontainer config")
 @main.command(help="Update various components")
 def update(devcontainer: bool, root_path=None, levels_root='levels'):
+    from lesson_builder.jmod.util import copy_devcontainer
+    from lesson_builder.jmod.walk import walk_modules
 
     if root_path is None:
         root_path = Path.cwd()
@@ -220,6 +316,9 @@ def update(devcontainer: bool, root_path=None, levels_root='levels'):
 @click.option('-r', '--root', 'root_path',
               help='Path to the dir tht will hold docs, defaults to current dir')
 def installvp(root_path=None):
+    from plumbum import local, FG
+    from plumbum.cmd import yarn
+
     if root_path is None:
         root_path = Path.cwd()
     else:
@@ -255,6 +354,11 @@ def deploy(docs_path=None):
     # Maybe need to set this extern to the call:
     # NODE_OPTIONS=--openssl-legacy-provider ./jtl deploy
 
+    import yaml
+    from plumbum import local, FG
+    from plumbum.cmd import yarn, git
+    from plumbum.commands.processes import ProcessExecutionError
+
     os.environ['NODE_OPTIONS'] = '--openssl-legacy-provider'
 
     if docs_path is None:
@@ -302,6 +406,11 @@ def new():
               help="Overwrite existing lesson plan")
 @click.argument('name')
 def new_lessonplan(name: str, force: bool):
+    from slugify import slugify
+
+    from lesson_builder.config import lesson_template_url
+    from lesson_builder.util import download_and_extract_zip
+
     title = slugify(name, separator='_')
 
     print("New Lesson Plan", title)
@@ -319,6 +428,12 @@ def new_lessonplan(name: str, force: bool):
               help="Create a directory assignment. Otherwise, create a file assignment.")
 @click.argument('name')
 def new_assignment(name: str, dir: bool = False, force: bool = False):
+    import yaml
+    from slugify import slugify
+
+    from lesson_builder.config import assignment_template_url
+    from lesson_builder.util import download_and_extract_zip
+
     slug = slugify(name, separator='_')
 
     print("New Assignment", slug)
@@ -394,6 +509,9 @@ def jweb(level: str, org: str):
     from plumbum import local
     from plumbum.cmd import yarn
 
+    from lesson_builder.jmod.git import clone_or_pull_repo, new_vuepress
+    from lesson_builder.util import build_dir
+
     level = level.title()
 
     new_vuepress(level, dest_org=org)
@@ -412,12 +530,20 @@ def jweb(level: str, org: str):
             yarn('install')
 
 
-@java.command(name='push', help='Push modules to repos. Depends on meta.yaml, so make sure it is updated first')
+@java.command(name='push', help='Push modules to repos. Depends on the metadata, so make sure it is updated first')
 @click.option('-l', '--level', default=None, help="Push all modules from this level")
 @click.option('-m', '--module', default=None, help="With --level, push use this module")
 @click.option('-o', '--org', default='League-Java', help="Org or owner of the repo")
 def jpush(level, module, org="League-Java"):
-    meta = yaml.safe_load(Path(get_repo_root() / 'meta.yaml').read_text())
+    from lesson_builder.jmod.git import create_repo
+    from lesson_builder.jmod.metastore import read_index
+    from lesson_builder.util import build_dir, get_repo_root
+
+    # Only the index of the levels and modules, not the texts
+    index = read_index(get_repo_root())
+
+    if level and level not in index['levels']:
+        logger.warning(f"Level {level} is not in the metadata; run 'jtl java meta' to update it")
 
     assert not (module and not level), "If module is specified, must also specify level"
 
@@ -435,15 +561,23 @@ def jpush(level, module, org="League-Java"):
         create_repo(m, org, build_dir)
 
 
-@java.command(name='meta', help='Regenerate meta.yaml')
+@java.command(name='meta', help='Regenerate the level metadata in the meta dir')
 @click.option('-l', '--level_dir', default='levels', help="Root directory to levels")
-def jmeta(level_dir='levels'):
-    update_meta(get_repo_root(), level_dir)
+@click.option('-F', '--force', is_flag=True, default=False,
+              help="Process every assignment, even if its .meta file is up to date")
+def jmeta(level_dir='levels', force=False):
+    from lesson_builder.jmod.tasks import update_meta
+    from lesson_builder.util import get_repo_root
+
+    reused, processed = update_meta(get_repo_root(), level_dir, force=force)
+    print(f"Metadata: {reused} reused, {processed} processed")
 
 @java.command(name='serve', help='Development server for a level website')
 @click.option('-l', '--level', help="Name of the level to serve")
 @click.pass_context
 def jserve(ctx, level):
+    from lesson_builder.util import build_dir, get_repo_root
+
     r = get_repo_root()
     docs_path = build_dir(level) / 'docs'
 
@@ -451,12 +585,21 @@ def jserve(ctx, level):
 
 @java.command(name='build', help='Build the lesson website for a level')
 @click.option('-l', '--level', help="Name of the level to serve")
-@click.option('-m', '--meta', is_flag=True, default=False, help='Regenerate meta.yaml before the build')
+@click.option('-m', '--meta', is_flag=True, default=False, help='Regenerate the level metadata before the build')
 @click.option('-Y', '--yarn-build', is_flag=True, default=False, help='Also run Yarn Build')
 @click.option('-w', '--watch', is_flag=True, default=False, help='Rebuild when source files change')
-
+@click.option('--profile', is_flag=True, default=False,
+              help='Profile the build, including the metadata and the lesson data. Writes '
+                   'jtl-java-build.pstats')
+@click.option('--sample', is_flag=True, default=False,
+              help='With --profile, also sample the stacks and write jtl-java-build.collapsed')
 @click.pass_context
-def jbuild(ctx, level, yarn_build=False, meta=False, watch=False):
+def jbuild(ctx, level, yarn_build=False, meta=False, watch=False, profile=False, sample=False):
+    from lesson_builder.buildlevels import make_lessons
+    from lesson_builder.jmod.metastore import read_level
+    from lesson_builder.profiling import profiled
+    from lesson_builder.util import build_dir, get_repo_root
+
     r = get_repo_root()
 
     level = level.title()
@@ -465,24 +608,33 @@ def jbuild(ctx, level, yarn_build=False, meta=False, watch=False):
     docs_path = web_root / 'docs'
     lesson_path = web_root / 'lessons'
 
-    if meta:
-        update_meta(get_repo_root(), 'levels')
+    with profiled('jtl-java-build', sample=sample) if profile else nullcontext():
+        if meta:
+            from lesson_builder.jmod.tasks import update_meta
+            reused, processed = update_meta(get_repo_root(), 'levels')
+            print(f"Metadata: {reused} reused, {processed} processed")
 
-    meta = yaml.safe_load(Path(r / 'meta.yaml').read_text())
-    meta = meta[level]
+        # Only this level's shard and texts
+        meta = read_level(r, level)
 
-    # Create the lesson data in the _build directory
-    make_lessons(level, r, web_root, meta)
+        # Create the lesson data in the _build directory
+        make_lessons(level, r, web_root, meta)
 
-    # Normal lesson-builder build out of the _build directory
-    ctx.invoke(build, lesson_path=lesson_path, docs_path=docs_path,
-               url_base=level, yarn_build=yarn_build, watch=watch)
+        # Normal lesson-builder build out of the _build directory
+        builder = ctx.invoke(build, lesson_path=lesson_path, docs_path=docs_path,
+                             url_base=level, yarn_build=yarn_build, profile=profile,
+                             sample=sample)
+
+    if watch:
+        watch_and_rebuild(builder, yarn_build)
 
 
 @java.command(name='deploy', help="Deploy the website to Github Pages")
 @click.option('-l', '--level', help="Name of the level to serve")
 @click.pass_context
 def jdeploy(ctx, level):
+    from lesson_builder.util import build_dir, get_repo_root
+
     r = get_repo_root()
     docs_path = build_dir(level) / 'docs'
 
@@ -1,3 +1,6 @@
+import os
+from pathlib import Path
+
 # URLS and URL templates
 
 assignment_template_url = 'https://github.com/league-python/PythonLessons/raw/master/templates/assignment_template.zip'
@@ -12,4 +15,21 @@ level_module_codespaces_tmpl = "https://codespaces.new/League-Java/{level}-{modu
 
 site_template_url = 'https://github.com/league-curriculum/New_Curriculum_Template.git'
 
-resource_extensions = ('.png', '.gif', '.jpeg', '.jpg')
\ No newline at end of file
+resource_extensions = ('.png', '.gif', '.jpeg', '.jpg')
+# Where caches that persist between builds are kept
+cache_dir = Path(os.environ.get('LESSON_BUILDER_CACHE_DIR', Path.home() / '.cache' / 'lesson-builder'))
+
+# Globs for files and directories that never trigger a rebuild in `jtl build --watch`.
+# They are matched against each component of the path.
+DEFAULT_IGNORE = ('.git', 'node_modules', '__pycache__', '.DS_Store',
+                  '*.swp', '*.swx', '*.swo', '*~', '.#*', '#*#', '4913', '*.tmp')
+
+DEFAULT_DEBOUNCE = 0.5  # Seconds of quiet before a burst of watch events is built
+
+# Named sizes of synthetic curricula for the benchmarks, as arguments to
+# lesson_builder.synthetic.make_lesson_plan() and make_levels()
+BENCH_SIZES = {
+    'small': dict(lessons=4, assignments=3, modules=2),
+    'medium': dict(lessons=16, assignments=6, modules=4),
+    'large': dict(lessons=64, assignments=8, modules=8),
+}
@@ -0,0 +1,99 @@
+""" The parsed curriculum: the lessons and assignments of a lesson plan,
+loaded in one pass and indexed by lesson name, assignment path and source file.
+"""
+from pathlib import Path
+from types import MappingProxyType
+from typing import TYPE_CHECKING
+
+from .lesson import Lesson
+from .util import Frozen
+
+if TYPE_CHECKING:
+    from .lesson_plan import LessonPlan
+
+
+def _abs(p):
+    return Path(p).absolute()
+
+
+class Curriculum(Frozen):
+    """All of the lessons in a lesson plan, with their assignments. The
+    curriculum is built once per build and is immutable, so the sidebar, the
+    write collection and the CLI all share the same Lesson and Assignment
+    objects instead of re-reading the file system.
+
+    Indexes:
+        by_lesson: lesson name -> Lesson
+        by_assignment: absolute assignment path -> Assignment
+        by_source: absolute path of a file that a lesson or assignment reads ->
+            tuple of the Lessons and Assignments that read it
+    """
+
+    __slots__ = ('lessons', 'by_lesson', 'by_assignment', 'by_source')
+
+    def __init__(self, lessons):
+        lessons = tuple(lessons)
+
+        by_lesson = {l.name: l for l in lessons}
+        by_assignment = {}
+        by_source = {}
+
+        def add_source(path, node):
+            if path is not None:
+                by_source.setdefault(_abs(path), []).append(node)
+
+        for l in lessons:
+            add_source(l.lesson_text_path, l)
+
+            for r in l.ld.get('resources', []):
+                add_source(l.lesson_plan.assets_src_dir / r, l)
+
+            for a in l.assignments:
+                by_assignment[_abs(a.path)] = a
+
+                for p in a.source_paths:
+                    add_source(p, a)
+
+        self._set(lessons=lessons,
+                  by_lesson=MappingProxyType(by_lesson),
+                  by_assignment=MappingProxyType(by_assignment),
+                  by_source=MappingProxyType({k: tuple(v) for k, v in by_source.items()}))
+
+    @classmethod
+    def from_lesson_plan(cls, lesson_plan: "LessonPlan"):
+        """Load all of the lessons in the lesson plan, in plan order"""
+
+        def lessons():
+            for lesson_key, lesson in lesson_plan.lesson_plan['lessons'].items():
+                yield Lesson(lesson_plan, dict(lesson, name=lesson_key))
+
+        return cls(lessons())
+
+    def replace(self, lessons):
+        """Return a new curriculum with the given lessons in place of the lessons
+        of the same name"""
+        new = {l.name: l for l in lessons}
+        return Curriculum(new.get(l.name, l) for l in self.lessons)
+
+    @property
+    def assignments(self):
+        return tuple(a for l in self.lessons for a in l.assignments)
+
+    def lesson(self, name):
+        return self.by_lesson[name]
+
+    def assignment(self, path):
+        return self.by_assignment.get(_abs(path))
+
+    def sources(self, path):
+        """Lessons and assignments that read the file at path"""
+        return self.by_source.get(_abs(path), ())
+
+    def __iter__(self):
+        return iter(self.lessons)
+
+    def __len__(self):
+        return len(self.lessons)
+
+    def __str__(self):
+        return f"Curriculum: {len(self.lessons)} lessons, {len(self.by_assignment)} assignments"
@@ -0,0 +1,68 @@
+""" Directory listings shared by everything that loads one lesson plan. Each
+directory is listed once, with os.scandir, and existence and type checks are
+answered from the listing of the parent directory.
+"""
+import os
+from pathlib import Path
+
+
+class DirCache:
+    """A cache of directory listings for one build. The listings are not
+    updated when files change, so a new cache is needed for each build, or
+    after files change in watch mode."""
+
+    def __init__(self):
+        self._listings = {}  # absolute path -> {name: os.DirEntry}, or None if not a dir
+        self.scans = 0
+
+    def listing(self, path):
+        """Return the entries of a directory as {name: os.DirEntry}, sorted by
+        name. Returns an empty dict if path is not a readable directory"""
+        key = os.path.abspath(path)
+
+        try:
+            entries = self._listings[key]
+        except KeyError:
+            self.scans += 1
+            try:
+                with os.scandir(key) as it:
+                    entries = {e.name: e for e in sorted(it, key=lambda e: e.name)}
+            except OSError:
+                entries = None
+            self._listings[key] = entries
+
+        return entries or {}
+
+    def entry(self, path):
+        """The os.DirEntry for path, from the listing of its parent, or None if
+        it does not exist"""
+        parent, name = os.path.split(os.path.abspath(path))
+
+        if not name:  # The file system root
+            return None
+
+        return self.listing(parent).get(name)
+
+    def exists(self, path):
+        if self.entry(path) is None:
+            return os.path.abspath(path) == os.path.dirname(os.path.abspath(path))
+        return True
+
+    def is_dir(self, path):
+        e = self.entry(path)
+        if e is None:
+            return self.exists(path)
+        return e.is_dir()
+
+    def is_file(self, path):
+        e = self.entry(path)
+        return e is not None and e.is_file()
+
+    def children(self, path, suffix=None):
+        """The paths of the entries of a directory, like Path.glob('*'), which
+        includes hidden entries, but sorted. With suffix, only entries with that
+        suffix, as Path.suffix has it"""
+        path = Path(path)
+
+        return [path / name for name in self.listing(path)
+                if suffix is None or Path(name).suffix == suffix]
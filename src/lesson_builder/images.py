@@ -0,0 +1,192 @@
+""" Image optimization. PNG and JPEG resources are recompressed, and the images
+that are shown at a known size, like goal images, get resized variants for a
+srcset. The results are cached on disk by the hash of the source image, so
+only new or changed images are processed.
+
+Pillow is optional. Without it, images are copied as they are.
+"""
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+
+from .manifest import hash_file
+from .trinket import GOAL_IMAGE_WIDTH
+from .util import ResourceWrite, variant_path
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional
+    Image = None
+
+logger = logging.getLogger('lesson-builder')
+
+OPTIMIZED_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+# Version of the optimization settings, part of every cache key, so changing
+# how images are processed invalidates the cache
+OPTIMIZER_VERSION = 1
+
+# goal_image("goal.png") calls in lesson and assignment texts
+GOAL_IMAGE_RE = re.compile(r"""goal_image\(\s*['"]([^'"]+)['"]""")
+
+
+def pillow_available():
+    return Image is not None
+
+
+class ImageOptimizer:
+    """Recompresses images and makes resized variants, caching the results in
+    cache_dir by the hash of the source and the settings."""
+
+    def __init__(self, cache_dir: Path = None, jpeg_quality: int = 85):
+        if cache_dir is None:
+            from .config import cache_dir as default_cache_dir
+            cache_dir = default_cache_dir / 'images'
+
+        self.cache_dir = Path(cache_dir)
+        self.jpeg_quality = jpeg_quality
+        self.hits = 0
+        self.misses = 0
+        self._sizes = {}
+        self._lock = threading.Lock()
+
+    @property
+    def settings(self):
+        """The settings that change the output, for cache keys and the manifest"""
+        return {'version': OPTIMIZER_VERSION, 'jpeg_quality': self.jpeg_quality}
+
+    def size(self, path: Path):
+        """(width, height) of an image, from its header"""
+        key = (str(path), os.stat(path).st_mtime_ns)
+        if key not in self._sizes:
+            with Image.open(path) as img:
+                self._sizes[key] = img.size
+        return self._sizes[key]
+
+    def cache_path(self, source: Path, width: int = None):
+        key = hashlib.sha256(json.dumps([hash_file(source), width, self.settings]).encode('utf8')).hexdigest()
+        return self.cache_dir / key[:2] / (key + source.suffix.lower())
+
+    def optimize(self, source: Path, width: int = None):
+        """Return the path of the optimized image in the cache, processing the
+        source if it is not cached yet.
+
+        Args:
+            source (Path): A PNG or JPEG image
+            width (int): Resize to this width, keeping the aspect ratio. Images
+                are never enlarged. None to keep the size.
+        """
+        source = Path(source)
+        cached = self.cache_path(source, width)
+
+        if cached.exists():
+            with self._lock:
+                self.hits += 1
+            return cached
+
+        with self._lock:
+            self.misses += 1
+        data = self._process(source, width)
+
+        # Another build may be writing the same image, so write a temp file and rename
+        cached.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=cached.parent, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, cached)
+
+        return cached
+
+    def _process(self, source: Path, width: int = None):
+        with Image.open(source) as img:
+            img.load()
+            fmt = img.format
+
+        if width is not None and width < img.width:
+            if img.mode == 'P':
+                img = img.convert('RGBA')
+            img = img.resize((width, round(img.height * width / img.width)), Image.LANCZOS)
+
+        out = io.BytesIO()
+        if fmt == 'JPEG':
+            if img.mode not in ('RGB', 'L'):
+                img = img.convert('RGB')
+            img.save(out, 'JPEG', quality=self.jpeg_quality, optimize=True, progressive=True)
+        else:
+            img.save(out, 'PNG', optimize=True)
+
+        data = out.getvalue()
+
+        # Recompressing an already small image can make it larger
+        if width is None and len(data) >= source.stat().st_size:
+            return source.read_bytes()
+
+        return data
+
+    def summary(self):
+        return f"Images: {self.hits} cached, {self.misses} optimized"
+
+
+@dataclass
+class ImageWrite(ResourceWrite):
+    """Writes an optimized copy of an image, or a resized variant"""
+
+    optimizer: ImageOptimizer = None
+    width: int = None
+
+    def write(self):
+        from .sink import sink
+
+        sink.write_bytes(self.dest, self.optimizer.optimize(self.source, self.width).read_bytes())
+
+    def inputs_key(self):
+        return json.dumps([self.width, self.optimizer.settings])
+
+
+def shown_widths(writes):
+    """Map the destinations of images that are shown at a known width to the
+    width, from the goal_image() calls in the rendered texts"""
+    shown = {}
+
+    for w in writes:
+        if w.is_render:
+            wd = Path(w.source['working_directory'])
+            for name in GOAL_IMAGE_RE.findall(w.source.get('content', '')):
+                shown[(wd / name).absolute()] = GOAL_IMAGE_WIDTH
+
+    return shown
+
+
+def optimize_writes(writes, optimizer: ImageOptimizer):
+    """Replace the copies of PNG and JPEG images with ImageWrites, and add
+    writes for the variants of the images that are shown at a known width: one
+    for the display width and one for twice that, for high density screens,
+    if the image is larger."""
+
+    shown = shown_widths(writes)
+    res = []
+
+    for w in writes:
+        if (w.is_render or not isinstance(w.source, Path)
+                or w.source.suffix.lower() not in OPTIMIZED_EXTENSIONS or not w.source.is_file()):
+            res.append(w)
+            continue
+
+        res.append(ImageWrite(w.source, w.dest, w.file, w.line, optimizer=optimizer))
+
+        width = shown.get(Path(w.dest).absolute())
+        if width is not None:
+            source_width = optimizer.size(w.source)[0]
+            for vw in (width, width * 2):
+                if vw < source_width:
+                    res.append(ImageWrite(w.source, variant_path(Path(w.dest), vw), w.file, w.line,
+                                          optimizer=optimizer, width=vw))
+
+    return res
@@ -0,0 +1,149 @@
+""" The metadata for the java-modules levels, stored in per-level shards. This
+replaces the single meta.yaml, which had every level and all of the README
+texts in one file, so a build of one level had to parse all of them.
+
+The store is in the `meta` dir of the repo root:
+
+    meta/index.json             The levels, and the modules in each level
+    meta/<Level>.json           The metadata for one level, without the texts
+    meta/<Level>/<hash>.md      The README and assignment texts of the level
+
+In the shards, each 'text' and '_readme' string is replaced by a 'text_file'
+or '_readme_file' key with the name of the text file, which is the hash of
+the text, so unchanged texts are never rewritten.
+"""
+import hashlib
+import json
+import logging
+from pathlib import Path
+
+from ..sink import sink
+
+logger = logging.getLogger('lesson-builder')
+
+META_DIR = 'meta'
+META_STORE_VERSION = 1
+
+TEXT_KEYS = ('text', '_readme')
+
+
+def meta_dir(repo_root):
+    return Path(repo_root) / META_DIR
+
+
+def _split_texts(obj, texts):
+    """Copy obj, replacing the texts with the names of their files, and
+    collect the texts in texts, {file name: text}"""
+    if isinstance(obj, dict):
+        out = {}
+        for k, v in obj.items():
+            if k in TEXT_KEYS and isinstance(v, str):
+                name = hashlib.sha256(v.encode('utf8')).hexdigest()[:20] + '.md'
+                texts[name] = v
+                out[k + '_file'] = name
+            else:
+                out[k] = _split_texts(v, texts)
+        return out
+    elif isinstance(obj, list):
+        return [_split_texts(e, texts) for e in obj]
+    else:
+        return obj
+
+
+def _join_texts(obj, text_dir: Path, cache: dict):
+    """Replace the text file names in obj with the texts, in place"""
+    if isinstance(obj, dict):
+        for k in list(obj):
+            v = obj[k]
+            if k.endswith('_file') and k[:-len('_file')] in TEXT_KEYS:
+                if v not in cache:
+                    cache[v] = (text_dir / v).read_text()
+                del obj[k]
+                obj[k[:-len('_file')]] = cache[v]
+            else:
+                _join_texts(v, text_dir, cache)
+    elif isinstance(obj, list):
+        for e in obj:
+            _join_texts(e, text_dir, cache)
+
+    return obj
+
+
+def write_meta(repo_root, metas: dict):
+    """Write the metadata for all levels, as update_meta() compiles it, to the
+    store. Files whose content is unchanged are not rewritten, and the shards
+    and texts of levels and texts that are gone are removed."""
+
+    md = meta_dir(repo_root)
+
+    index = {'version': META_STORE_VERSION, 'levels': {}}
+
+    for level, lv in sorted(metas.items()):
+        texts = {}
+        shard = _split_texts(lv, texts)
+
+        sink.write_text(md / f'{level}.json', json.dumps(shard, indent=1, sort_keys=True))
+
+        text_dir = md / level
+        for name, text in texts.items():
+            sink.write_text(text_dir / name, text)
+
+        for f in text_dir.glob('*.md'):
+            if f.name not in texts:
+                f.unlink()
+
+        index['levels'][level] = {'modules': sorted(k for k in lv if not k.startswith('_'))}
+
+    for f in md.glob('*.json'):
+        if f.stem != 'index' and f.stem not in metas:
+            f.unlink()
+            for t in (md / f.stem).glob('*.md'):
+                t.unlink()
+
+    sink.write_text(md / 'index.json', json.dumps(index, indent=1, sort_keys=True))
+
+    return index
+
+
+def _legacy_meta(repo_root):
+    """The meta.yaml of repos that were not updated since the store was added"""
+    import yaml
+
+    p = Path(repo_root) / 'meta.yaml'
+    if not p.exists():
+        return None
+
+    logger.warning(f"Reading the old {p}; run 'jtl java meta' to write the meta store")
+    return yaml.safe_load(p.read_text())
+
+
+def read_index(repo_root):
+    """The index of the store: {'levels': {level: {'modules': [...]}}}"""
+    p = meta_dir(repo_root) / 'index.json'
+
+    if not p.exists():
+        legacy = _legacy_meta(repo_root)
+        if legacy is None:
+            raise FileNotFoundError(f"No metadata in {meta_dir(repo_root)}; run 'jtl java meta' first")
+
+        return {'version': META_STORE_VERSION,
+                'levels': {l: {'modules': sorted(k for k in lv if not k.startswith('_'))}
+                           for l, lv in legacy.items()}}
+
+    return json.loads(p.read_text())
+
+
+def read_level(repo_root, level):
+    """The metadata for one level, with the texts, as make_lessons() uses it.
+    Only the level's shard and texts are read."""
+
+    md = meta_dir(repo_root)
+    p = md / f'{level}.json'
+
+    if not p.exists():
+        if not (md / 'index.json').exists() and (legacy := _legacy_meta(repo_root)) is not None:
+            return legacy[level]
+
+        raise KeyError(f"No metadata for level '{level}' in {md}; run 'jtl java meta' first")
+
+    return _join_texts(json.loads(p.read_text()), md / level, {})
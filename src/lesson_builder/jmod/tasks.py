@@ -2,10 +2,11 @@ import logging
 
 import yaml
 
-from .git import create_repo
 from .html import _proc_html
+from .metastore import write_meta
 from .util import *
 from .walk import *
+from .walk import cached_process_dir, scan_levels
 
 logger = logging.getLogger('lesson-builder')
 
@@ -26,70 +27,74 @@ def update_modules(repo_root, levels_root):
 
 def push(repo_root, root, org, build_dir):
     """Upload the module in the current dir to Github"""
+    # Here, since the git module needs the gh CLI, and update_meta() doesn't
+    from .git import create_repo
 
     for dir_ in walk_modules(root):
         create_repo(dir_, org, build_dir)
         # make_repo_template(dir_)
 
 
-def update_meta(repo_root, level_root):
+def update_meta(repo_root, level_root, force=False):
     """Create the .meta files for the assignments, while hold information
-    used in creating README, images, and assigment pages."""
+    used in creating README, images, and assigment pages, and write the
+    metadata for all of the levels to the meta store.
 
-    import yaml
+    The .meta file of an assignment is reused if the README, .web and images
+    of the assignment are unchanged since it was written. With force, every
+    assignment is processed again.
+
+    Returns:
+        (reused, processed), the numbers of assignment dirs
+    """
 
     asgn_metas = []
+    reused = processed = 0
+
+    # One walk of the tree finds the assignments and the READMEs
+    entries = list(scan_levels(level_root))
 
     # Read the meta for the assignments. This will
     # get READMEs for the assignments and put it in to the
     # 'text' key in the metadata
-    for l in walk_assignments(Path(level_root)):
-        # java = list(l.glob('*.java'))
-        # pde = list(l.glob('*.pde'))
-        # web = (l / '.web').exists()
+    for e in entries:
+        if e.kind != 'assignment':
+            continue
+
+        r, was_reused = cached_process_dir(repo_root, level_root, e.path, force=force)
 
-        r = process_dir(repo_root, level_root, l)
+        if was_reused:
+            reused += 1
+        else:
+            processed += 1
 
         if r:
-            (l / '.meta').write_text(yaml.dump(r, indent=2))
             asgn_metas.append(r)
         else:
-            logger.debug("No meta " + str(l))
-
-    metas = compile_meta(asgn_metas)
+            logger.debug("No meta " + str(e.path))
 
-    # Add in readmes for levels and modules
-    ld = Path(level_root).absolute()
-
-    for p in ld.glob('**/README.md'):
-        if '/src/' in str(p) or '/bin/' in str(p):
-            continue
-
-        l, m = get_lm(p)
-        if l and not m:
-            metas[l]['_readme'] = p.read_text()
-        elif l and m:
-            metas[l][m]['_readme'] = p.read_text()
-        else:
-            print(f"Could not find level or module for {p}")
+    logger.info(f"Assignment metadata: {reused} reused, {processed} processed")
 
+    metas = compile_meta(asgn_metas)
 
-    # Readmes for lessons, which are the parent directories of the
-    # assignments
-    for p in ld.glob('**/README.md'):
-        if '/src/' not in str(p) or '/bin/' in str(p):
+    # Add in readmes for levels, modules and lessons
+    for e in entries:
+        if e.kind != 'readme':
             continue
 
-        l, m, ls, a = get_lmla(p)
-        if a == 'README.md':
+        if e.lesson:
             try:
-                metas[l][m][ls.strip('_')]['_readme'] = p.read_text()
+                metas[e.level][e.module][e.lesson.strip('_')]['_readme'] = e.path.read_text()
             except KeyError:
-                assert '99' in ls, f"Could not find {l} {m} {ls} in metas"
+                assert '99' in e.lesson, f"Could not find {e.level} {e.module} {e.lesson} in metas"
                 # This happens for 99_extras, which don't have any metadata
-                #print(metas[l][m].keys(), f"Could not find {l} {m} {ls} in metas")
                 pass
-
+        elif e.level and not e.module:
+            metas[e.level]['_readme'] = e.path.read_text()
+        elif e.level and e.module:
+            metas[e.level][e.module]['_readme'] = e.path.read_text()
+        else:
+            print(f"Could not find level or module for {e.path}")
 
     # Create missing readmes
     for i, (mk, mv) in enumerate(sorted(metas.items())):
@@ -97,7 +102,9 @@ def update_meta(repo_root, level_root):
         if not '_readme' in mv:
             mv['_readme'] = f"# {mk}\n\n"
 
-    (repo_root / 'meta.yaml').write_text(yaml.dump(metas, indent=2))
+    write_meta(repo_root, metas)
+
+    return reused, processed
 
 
 def make_readme(root):
@@ -1,15 +1,90 @@
+import os
+from dataclasses import dataclass
 from pathlib import Path
+
 from lesson_builder.config import resource_extensions
 
-def walk_modules(root):
+# Directories that scan_levels() does not walk into: build output, libraries,
+# git data and tests. The .web dirs are read by process_dir(), not walked.
+PRUNE_DIRS = frozenset(('bin', 'lib', '.git', 'league_token', 'tests', '.web'))
+
+ASSIGNMENT_SUFFIXES = ('.java', '.pdf')
+
+# Part of the fingerprint of every .meta file. Change it when process_dir()
+# changes what it writes, so the old .meta files are not reused
+META_VERSION = 1
+
+
+@dataclass
+class LevelEntry:
+    """A module dir, assignment dir or README found by scan_levels()"""
+
+    kind: str  # 'module', 'assignment' or 'readme'
+    path: Path
+    level: str = None
+    module: str = None
+    lesson: str = None
+
+
+def scan_levels(root):
+    """Walk a levels tree once, and yield a LevelEntry for each module dir,
+    assignment dir, and README of a level, module or lesson, in sorted order.
+
+    A dir is an assignment if it has a .java or .pdf file or a .web dir. The
+    level and module of a README outside of src are the last Level* and
+    Module* names in its path, as with get_lm(). For a README in a lesson dir,
+    they are the two dirs above src, as with get_lmla(). The READMEs of
+    assignments are not yielded; process_dir() reads those.
+    """
     root = Path(root)
+    level, module = get_lm(root)
+
+    # (dir, level, module, lesson, depth below src, or None outside of src)
+    stack = [(str(root), level, module, None, None)]
+
+    while stack:
+        dir_, level, module, lesson, depth = stack.pop()
+
+        try:
+            with os.scandir(dir_) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            continue
+
+        name = os.path.basename(dir_)
+        names = {e.name for e in entries}
+
+        if name.startswith('Module'):
+            yield LevelEntry('module', Path(dir_), level, module)
+
+        if '.web' in names or any(n.endswith(ASSIGNMENT_SUFFIXES) for n in names):
+            yield LevelEntry('assignment', Path(dir_), level, module, lesson)
+
+        if 'README.md' in names and (depth is None or depth == 1):
+            yield LevelEntry('readme', Path(dir_, 'README.md'), level, module, lesson)
 
-    if root.name.startswith("Module"):
-        yield root
+        children = []
+        for e in entries:
+            if e.name in PRUNE_DIRS or not e.is_dir():
+                continue
 
-    for dir_ in root.glob("**/*"):
-        if dir_.name.startswith("Module"):
-            yield dir_
+            if depth is not None:
+                children.append((e.path, level, module, e.name if depth == 0 else lesson, depth + 1))
+            elif e.name == 'src':
+                children.append((e.path, os.path.basename(os.path.dirname(dir_)), name, None, 0))
+            else:
+                children.append((e.path,
+                                 e.name if e.name.startswith('Level') else level,
+                                 e.name if e.name.startswith('Module') else module,
+                                 None, None))
+
+        stack.extend(reversed(children))
+
+
+def walk_modules(root):
+    for e in scan_levels(root):
+        if e.kind == 'module':
+            yield e.path
 
 
 def walk_lessons(root):
@@ -188,21 +263,70 @@ def process_dir(repo_root, root, f):
     return r
 
 
-def walk_assignments(root):
-    adirs = set()
+def fingerprint_dir(f):
+    """A hash of the names, sizes and mtimes of the files that process_dir()
+    reads: the README, and the files in .web and images. The path is part of
+    it too, since the metadata has the level, module and lesson names, and so
+    are META_VERSION and the resource extensions, which decide what
+    process_dir() does with the files"""
+    import hashlib
+    import json
 
-    for f in root.glob('**/*'):
-        p = f.parent
+    # With os.path rather than pathlib, since this runs for every assignment
+    f = os.path.abspath(f)
+    entries = [META_VERSION, sorted(resource_extensions), f]
 
-        if p.name in ('.web', 'lib', 'league_token', 'tests', 'bin'):
+    try:
+        st = os.stat(os.path.join(f, 'README.md'))
+        entries.append(['README.md', st.st_size, st.st_mtime_ns])
+    except FileNotFoundError:
+        pass
+
+    for sub in ('.web', 'images'):
+        try:
+            with os.scandir(os.path.join(f, sub)) as it:
+                files = sorted((e.name, e.stat().st_size, e.stat().st_mtime_ns)
+                               for e in it if e.is_file())
+        except (FileNotFoundError, NotADirectoryError):
             continue
+        entries.append([sub, files])
+
+    return hashlib.sha256(json.dumps(entries).encode('utf8')).hexdigest()
 
-        java = list(p.glob('*.java'))
-        pdf = list(p.glob('*.pdf'))
 
-        web = (p / '.web').exists()
+def cached_process_dir(repo_root, root, f, force=False):
+    """Like process_dir(), but reuse the .meta file of the assignment if the
+    fingerprint of the directory has not changed since it was written. Writes
+    the .meta file, with the fingerprint, when the directory is processed.
 
-        if len(java) > 0 or len(pdf) > 0 or web:
-            adirs.add(p)
+    Returns:
+        (meta, reused). meta is None if the directory is not an assignment
+    """
+    import yaml
 
-    return list(sorted(adirs))
+    from ..parsecache import parse_cache
+    from ..sink import sink
+
+    f = Path(f)
+    meta_file = f / '.meta'
+    fp = fingerprint_dir(f)
+
+    if not force and meta_file.exists():
+        try:
+            old = parse_cache.yaml(meta_file)
+        except yaml.YAMLError:
+            old = None
+
+        if isinstance(old, dict) and old.pop('_fingerprint', None) == fp:
+            return old, True
+
+    r = process_dir(repo_root, root, f)
+
+    if r:
+        sink.write_text(meta_file, yaml.dump(dict(r, _fingerprint=fp), indent=2))
+
+    return r, False
+
+
+def walk_assignments(root):
+    return sorted(e.path for e in scan_levels(root) if e.kind == 'assignment')
@@ -5,49 +5,50 @@ file system.
 import logging
 from pathlib import Path
 from textwrap import dedent
-
-import frontmatter
+from typing import TYPE_CHECKING
 
 from .assignment import Assignment
-from .util import ResourceWrite, get_first_h1_heading
+from .parsecache import parse_cache
+from .util import Frozen, ResourceWrite, freeze, get_first_h1_heading
+
+if TYPE_CHECKING:
+    from .lesson_plan import LessonPlan
 
 logger = logging.getLogger('lesson-builder')
 
 indent = '    '
 
 
-class Lesson:
+class Lesson(Frozen):
     """A Lesson is a collection data from the lesson plan. It may also
     have a directory, but may not. If it does, it will be a sub-directory of the
-    containing directory of the lesson plan """
+    containing directory of the lesson plan.
 
-    def __init__(self, lesson_plan: "LessonPlan", lesson_data):
-        self.lesson_plan = lesson_plan
-        self.ld = lesson_data
+    Everything that depends on the file system is resolved once, when the
+    lesson is constructed, and the lesson is immutable after that."""
 
-    @property
-    def name(self):
-        return self.ld['name']
+    __slots__ = ('lesson_plan', 'ld', 'name', 'src_dir', 'has_dir', 'dest_dir',
+                 'lesson_text_path', 'title', 'assignments')
 
-    @property
-    def src_dir(self):
+    def __init__(self, lesson_plan: "LessonPlan", lesson_data):
+        self._set(lesson_plan=lesson_plan, ld=freeze(lesson_data), name=lesson_data['name'])
+
+        dc = self.lesson_plan.dir_cache
 
         d = self.lesson_plan.less_plan_dir / self.name
-        if not d.exists():
-            return None
-        return d
+        src_dir = d if dc.exists(d) else None
 
-    @property
-    def has_dir(self):
-        return self.src_dir is not None and self.src_dir.is_dir()
+        self._set(src_dir=src_dir,
+                  has_dir=src_dir is not None and dc.is_dir(src_dir),
+                  dest_dir=self.lesson_plan.less_output_dir / self.name)
 
-    @property
-    def dest_dir(self):
-        return self.lesson_plan.less_output_dir / self.name
+        self._set(lesson_text_path=self._find_lesson_text_path())
+        self._set(title=self._find_title())
+        self._set(assignments=tuple(self._load_assignments()))
 
-    @property
-    def lesson_text_path(self):
+    def _find_lesson_text_path(self):
 
+        dc = self.lesson_plan.dir_cache
         lpt_base = self.lesson_plan.less_plan_dir / self.name
 
         lt_path_file = lpt_base.with_suffix('.md')
@@ -56,9 +57,9 @@ class Lesson:
         if 'text' in self.ld:
             #  the text field is the name of the file, in the lesson plan dir
             lt_path = self.lesson_plan.less_plan_dir / self.ld['text']
-        elif lt_path_file.exists():
+        elif dc.exists(lt_path_file):
             lt_path = lt_path_file
-        elif self.has_dir and lt_path_index is not None and lt_path_index.exists():
+        elif self.has_dir and lt_path_index is not None and dc.exists(lt_path_index):
             lt_path = lt_path_index
         elif 'title' in self.ld:
             # No text is expected
@@ -82,12 +83,19 @@ class Lesson:
             raise FileNotFoundError(f"No lesson file for {self.lesson_text_path}")
 
     @property
-    def title(self):
+    def lesson_frontmatter(self):
+        """The frontmatter.Post of the lesson text, from the parse cache"""
+        try:
+            return parse_cache.frontmatter(self.lesson_text_path)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"No lesson file for {self.lesson_text_path}")
+
+    def _find_title(self):
 
         if 'title' in self.ld:
             return self.ld['title']
 
-        fm = frontmatter.loads(self.lesson_text)
+        fm = self.lesson_frontmatter
         try:
             return fm['title']
         except KeyError:
@@ -99,25 +107,24 @@ class Lesson:
             else:
                 return title
 
-    def collect_writes(self):
-        """Write the lesson to the root directory
-
-        Args:
-            root (Path): The root directory of lessons in the vuepress site
-        """
+    def collect_own_writes(self):
+        """Collect the writes for the lesson text and resources, but not
+        for the assignments"""
 
         res = []
 
         if self.lesson_text_path is not None and self.lesson_text_path.exists():
 
-            fm = frontmatter.loads(self.lesson_text_path.read_text())
+            fm = parse_cache.frontmatter(self.lesson_text_path)
             if 'template' in fm.metadata:
                 md = dict(template_name=fm.metadata['template'],
                           frontmatter=fm.metadata,
                           working_directory=self.dest_dir,
-                          content=self.lesson_text_path.read_text())
+                          trinket_embed=self.lesson_plan.trinket_embed,
+                          content=fm.content)
 
-                res.append(ResourceWrite(md, self.dest_dir / 'index.md'))
+                res.append(ResourceWrite(md, self.dest_dir / 'index.md',
+                                         file=str(self.lesson_text_path)))
             else:
                 res.append(ResourceWrite(self.lesson_text_path, self.dest_dir / 'index.md'))
 
@@ -126,6 +133,17 @@ class Lesson:
 
             res.append(ResourceWrite(self.lesson_plan.assets_src_dir / resource, self.dest_dir / resource))
 
+        return self.lesson_plan.prepare_writes(res)
+
+    def collect_writes(self):
+        """Write the lesson to the root directory
+
+        Args:
+            root (Path): The root directory of lessons in the vuepress site
+        """
+
+        res = self.collect_own_writes()
+
         for a in self.assignments:
             res.extend(a.collect_writes())
 
@@ -156,13 +174,14 @@ class Lesson:
 
         return d
 
-    @property
-    def assignments(self):
+    def _load_assignments(self):
+        dc = self.lesson_plan.dir_cache
+
         for a in self.ld.get('assignments',[]):
 
             abs_dir = self.lesson_plan.asgn_dir / a
 
-            if not abs_dir.exists():
+            if not dc.exists(abs_dir):
                 raise FileNotFoundError(f'Assignment {a} not found in assignment dir {abs_dir}')
 
             yield Assignment(self, abs_dir)
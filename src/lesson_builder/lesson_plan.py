@@ -2,7 +2,14 @@ from pathlib import Path
 
 import yaml
 
+from .build_plan import BuildPlan, CancelToken
+from .curriculum import Curriculum
+from .dircache import DirCache
 from .lesson import Lesson
+from .manifest import BuildManifest
+from .parsecache import parse_cache
+from .sink import sink
+from .trinket import EMBED_SCRIPT, check_embed_mode
 
 from .config import example_config
 from .util import ResourceWrite
@@ -32,7 +39,7 @@ class LessonPlan:
             self.less_plan_dir = Path(less_plan_dir)
             self.lesson_plan_file = self.less_plan_dir / 'lesson-plan.yaml'
 
-        self.lesson_plan = yaml.safe_load(self.lesson_plan_file.read_text())
+        self.lesson_plan = parse_cache.yaml(self.lesson_plan_file)
         self.vue_doc_dir = Path(vue_doc_dir)
         self.web_src_dir = self.vue_doc_dir / 'src'
         self.less_output_dir = self.web_src_dir / less_subdir  # Where we write lesson outputs
@@ -41,11 +48,76 @@ class LessonPlan:
 
         self.asgn_dir = asgn_dir if asgn_dir is not None else self.less_plan_dir
 
+        self._curriculum = None
+        self.dir_cache = DirCache()  # Directory listings, shared by the lessons and assignments
+        self._image_optimizer = None
+        self._asset_store = None
+
+    @property
+    def curriculum(self):
+        """The lessons and assignments, loaded once on first use"""
+        if self._curriculum is None:
+            self._curriculum = Curriculum.from_lesson_plan(self)
+        return self._curriculum
+
     @property
     def lessons(self):
-        for lesson_key, lesson in self.lesson_plan['lessons'].items():
-            lesson['name'] = lesson_key
-            yield Lesson(self, lesson)
+        return self.curriculum.lessons
+
+    @property
+    def trinket_embed(self):
+        """How python.run blocks and trinket() calls are embedded, from the
+        trinket_embed key of the lesson plan. One of trinket.EMBED_MODES"""
+        try:
+            return check_embed_mode(self.lesson_plan.get('trinket_embed', 'iframe'))
+        except ValueError as e:
+            raise ValueError(f"{self.lesson_plan_file}: {e}") from e
+
+    @property
+    def uses_embed_script(self):
+        """True if the embeds are placeholders that need the embed script"""
+        return self.trinket_embed in ('click', 'visible')
+
+    @property
+    def image_optimizer(self):
+        """The ImageOptimizer, if the optimize_images key of the lesson plan is
+        true and Pillow is installed, or None"""
+        if self._image_optimizer is None and self.lesson_plan.get('optimize_images'):
+            from .images import ImageOptimizer, pillow_available
+
+            if pillow_available():
+                self._image_optimizer = ImageOptimizer()
+            else:
+                logger.warning("optimize_images is set, but Pillow is not installed; "
+                               "images are copied as they are")
+                self._image_optimizer = False
+
+        return self._image_optimizer or None
+
+    @property
+    def asset_store(self):
+        """The AssetStore, if the asset_store key of the lesson plan is true, or None"""
+        if self._asset_store is None and self.lesson_plan.get('asset_store'):
+            from .assetstore import AssetStore
+            self._asset_store = AssetStore(self.web_src_dir / '.vuepress/public/assets')
+
+        return self._asset_store
+
+    def prepare_writes(self, writes):
+        """Apply the optional stages to collected writes: image optimization,
+        then the asset store"""
+        if self.image_optimizer is not None:
+            from .images import optimize_writes
+            writes = optimize_writes(writes, self.image_optimizer)
+
+        if self.asset_store is not None:
+            writes = self.asset_store.store_writes(writes)
+
+        return writes
+
+    @property
+    def manifest_path(self):
+        return self.web_src_dir / '.vuepress' / '.lb-manifest'
 
     def update_config(self, basedir=None):
         """Generate the config file for vue"""
@@ -62,7 +134,7 @@ class LessonPlan:
                 "_You can probably just copy this one {example_config}: " +
                 example_config)
 
-        config = yaml.safe_load(config_file.read_text())
+        config = parse_cache.yaml(config_file)
 
         if not config:
             raise ValueError(f"Config file {config_file} is empty")
@@ -72,7 +144,7 @@ class LessonPlan:
 
         idx = self.less_plan_dir / 'index.md'
 
-        fm = frontmatter.loads(idx.read_text())
+        fm = parse_cache.frontmatter(idx)
         changes = 0
 
         for k in ('tagline','actionText'):
@@ -85,7 +157,7 @@ class LessonPlan:
                 raise
 
         if changes:
-            idx.write_text(frontmatter.dumps(fm) )
+            sink.write_text(idx, frontmatter.dumps(fm))
 
         if basedir:
             config['base'] = '/' + basedir.strip('/') + '/'
@@ -97,16 +169,24 @@ class LessonPlan:
 
         config['themeConfig']['sidebar'] = self.make_sidebar()
 
+        if self.uses_embed_script:
+            # Head entries are not prefixed with the base by vuepress
+            script = ['script', {'src': config['base'] + 'assets/' + EMBED_SCRIPT.name, 'defer': True}]
+            config.setdefault('head', [])
+            if script not in config['head']:
+                config['head'].append(script)
+
         logger.info(f'Writing config to {config_file}')
-        config_file.write_text(yaml.dump(config))
+        sink.write_text(config_file, yaml.dump(config))
 
         # Remove the old config.js file
         js_config = self.web_src_dir / '.vuepress/config.js'
         if js_config.exists():
             js_config.unlink()
 
-    def collect_writes(self):
-        """Collect all of the files to be written"""
+    def collect_plan_writes(self):
+        """Collect the pages and resources of the lesson plan itself, but not
+        of the lessons"""
 
         res = []
 
@@ -122,46 +202,96 @@ class LessonPlan:
 
             res.append(ResourceWrite(res_file, dest_file))
 
+        if self.uses_embed_script:
+            res.append(ResourceWrite(EMBED_SCRIPT, assets_dir / EMBED_SCRIPT.name))
+
+        return self.prepare_writes(res)
+
+    def collect_writes(self):
+        """Collect all of the files to be written"""
+
+        res = self.collect_plan_writes()
+
         for lesson in self.lessons:
             res.extend(lesson.collect_writes())
 
         return res
 
-    def write_dir(self):
+    @property
+    def plan_sources(self):
+        """Source files of the pages and resources of the lesson plan"""
+        return [self.less_plan_dir / page for page in self.lesson_plan['pages']] + \
+            [self.assets_src_dir / resource for resource in self.lesson_plan['resources']]
+
+    @property
+    def structure_files(self):
+        """Files that define the structure of the site. When these change, the
+        whole site must be rebuilt"""
+        return [self.lesson_plan_file, self.less_plan_dir / 'config.yml']
+
+    def reload_lessons(self, names):
+        """Re-read the named lessons and their assignments from the file system,
+        keeping the rest of the curriculum"""
+
+        cur = self.curriculum
+        self.dir_cache = DirCache()  # The files may have changed
+        self._curriculum = cur.replace(Lesson(self, cur.lesson(n).ld) for n in names)
+        return self._curriculum
+
+    def build_plan(self):
+        """Collect the writes once and return them as a BuildPlan"""
+        return BuildPlan.from_lesson_plan(self)
+
+    def write_dir(self, plan: BuildPlan = None, jobs: int = 1,
+                  manifest: BuildManifest = None, render_procs: int = 0,
+                  cancel: CancelToken = None):
         """Write the lesson plan to the root directory
+
+        Args:
+            plan (BuildPlan): A plan from build_plan(). If not specified, a new one is
+                collected.
+            jobs (int): Number of worker threads for the writes
+            manifest (BuildManifest): Manifest of the previous build, used to skip
+                unchanged writes
+            render_procs (int): Number of worker processes for rendering templates.
+                With 0, templates are rendered in this process.
+            cancel (CancelToken): Token to stop the writes early
         """
-        # Write all of the files first
-        for r in self.collect_writes():
-            if not r.is_render:
-                logger.debug(f'Writing {r}')
-                try:
-                    r.write()
-                except Exception as e:
-                    logger.error(f'Error writing {str(r)}: {e}')
-                    raise
-
-        # Then do the renders
-        for r in self.collect_writes():
-            if r.is_render:
-                logger.debug(f'Rendering {r}')
-                r.render()
-
-    def build(self, root_dir: Path = None, url_base_dir=None):
+
+        plan = self.build_plan() if plan is None else plan
+
+        plan.execute(jobs=jobs, manifest=manifest, render_procs=render_procs, cancel=cancel)
+
+        return plan
+
+    def build(self, root_dir: Path = None, url_base_dir=None, plan: BuildPlan = None,
+              jobs: int = 1, manifest: BuildManifest = None, render_procs: int = 0,
+              cancel: CancelToken = None):
         """Write the lesson plan to the root directory
 
         Args:
             root_dir (Path): The root directory to write the lesson to
             url_base_dir (str): The base directory for the URL
+            plan (BuildPlan): The plan to execute. If not specified, a new one is
+                collected.
+            jobs (int): Number of worker threads for the writes
+            manifest (BuildManifest): Manifest of the previous build, used to skip
+                unchanged writes
+            render_procs (int): Number of worker processes for rendering templates
+            cancel (CancelToken): Token to stop the build early
         """
 
         root_dir = self.less_output_dir if root_dir is None else root_dir
 
         logger.info(f'Writing lesson plan to {root_dir}')
 
-        self.write_dir()
+        plan = self.write_dir(plan, jobs=jobs, manifest=manifest, render_procs=render_procs,
+                              cancel=cancel)
 
         self.update_config(url_base_dir)
 
+        return plan
+
     def make_sidebar(self):
 
         return (self.lesson_plan['sidebar'] + [l.sidebar_entry for l in self.lessons])
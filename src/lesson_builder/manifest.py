@@ -0,0 +1,230 @@
+""" Build manifest, which records content hashes for every ResourceWrite
+destination so that a build can skip writes whose inputs have not changed.
+"""
+import hashlib
+import json
+import logging
+import shutil
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import lesson_builder.templates as tmpl
+from .sink import sink
+
+if TYPE_CHECKING:
+    from .lesson_plan import LessonPlan
+    from .util import ResourceWrite
+
+logger = logging.getLogger('lesson-builder')
+
+CHUNK_SIZE = 1024 * 1024
+
+MANIFEST_VERSION = 1
+
+
+def hash_bytes(b: bytes):
+    return hashlib.sha256(b).hexdigest()
+
+
+def hash_file(path: Path):
+    """Hash a file in fixed size chunks, so large assets are never read into
+    memory all at once"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(CHUNK_SIZE):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def hash_render_source(source: dict):
+    """Hash the argument dict for render()"""
+    return hash_bytes(json.dumps(source, sort_keys=True, default=str).encode('utf8'))
+
+
+def file_stat(path: Path):
+    st = path.stat()
+    return [st.st_size, st.st_mtime_ns]
+
+
+class BuildManifest:
+    """The manifest maps each destination path to the hashes of the source, the
+    render inputs and the output of the last write to it. Source file hashes are
+    also memoized by size and mtime, so unchanged files are not re-read.
+
+    The manifest is stored as JSON, by default in `.vuepress/.lb-manifest`
+    in the vuepress source dir."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._templates_hash = None
+
+        self.entries = {}
+        self.files = {}
+
+        if self.path.exists():
+            try:
+                d = json.loads(self.path.read_text())
+            except ValueError:
+                logger.warning(f"Ignoring unreadable manifest {self.path}")
+                d = {}
+
+            if d.get('version') == MANIFEST_VERSION:
+                self.entries = d.get('entries', {})
+                self.files = d.get('files', {})
+
+    @classmethod
+    def for_lesson_plan(cls, lesson_plan: "LessonPlan"):
+        return cls(lesson_plan.manifest_path)
+
+    def file_hash(self, path: Path):
+        """Hash of a source file or directory, reusing the recorded hash when the
+        size and mtime have not changed"""
+        path = Path(path)
+
+        if path.is_dir():
+            h = hashlib.sha256()
+            for f in sorted(path.rglob('*')):
+                if f.is_file():
+                    h.update(str(f.relative_to(path)).encode('utf8'))
+                    h.update(self.file_hash(f).encode('ascii'))
+            return h.hexdigest()
+
+        key = str(path.absolute())
+        stat = file_stat(path)
+
+        memo = self.files.get(key)
+        if memo and memo[:2] == stat:
+            return memo[2]
+
+        h = hash_file(path)
+        self.files[key] = stat + [h]
+        return h
+
+    @property
+    def templates_hash(self):
+        """Hash of the template files, which are inputs to every render"""
+        if self._templates_hash is None:
+            self._templates_hash = self.file_hash(Path(tmpl.__file__).parent)
+        return self._templates_hash
+
+    def source_hash(self, r: "ResourceWrite"):
+        if isinstance(r.source, Path):
+            return self.file_hash(r.source)
+        elif isinstance(r.source, str):
+            return hash_bytes(r.source.encode('utf8'))
+        elif isinstance(r.source, bytes):
+            return hash_bytes(r.source)
+        else:
+            return hash_render_source(r.source)
+
+    def inputs_hash(self, r: "ResourceWrite"):
+        """For renders, the templates and the files in the working directory,
+        which trinket() and read_code() can read. For copies, the settings
+        from ResourceWrite.inputs_key(), like the image optimization settings"""
+        if not r.is_render:
+            key = r.inputs_key()
+            return None if key is None else hash_bytes(key.encode('utf8'))
+
+        wd = Path(r.source['working_directory'])
+
+        files = []
+        if wd.is_dir():
+            for f in sorted(wd.iterdir()):
+                if f.is_file() and f != Path(r.dest):
+                    files.append((f.name, self.file_hash(f)))
+
+        return hash_bytes(json.dumps([self.templates_hash, files]).encode('utf8'))
+
+    def output_hash(self, dest: Path):
+        if not dest.exists():
+            return None
+        return self.file_hash(dest)
+
+    def key(self, r: "ResourceWrite"):
+        return str(Path(r.dest).absolute())
+
+    def is_fresh(self, r: "ResourceWrite"):
+        """True if the last write to this destination had the same inputs, and
+        the output is still there and unmodified."""
+
+        e = self.entries.get(self.key(r))
+
+        fresh = (e is not None
+                 and e['source'] == self.source_hash(r)
+                 and e['inputs'] == self.inputs_hash(r)
+                 and e['output'] is not None
+                 and self.output_hash(Path(r.dest)) == e['output'])
+
+        with self._lock:
+            if fresh:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        return fresh
+
+    def record(self, r: "ResourceWrite"):
+        """Record the hashes after a write"""
+        self.entries[self.key(r)] = {
+            'source': self.source_hash(r),
+            'inputs': self.inputs_hash(r),
+            'output': self.output_hash(Path(r.dest)),
+        }
+
+    @property
+    def root(self):
+        """The vuepress source dir that the manifest's outputs are in"""
+        return self.path.parent.parent
+
+    def prune(self, dests):
+        """Delete the outputs of previous builds that are not in dests, the
+        destinations of the current build, and drop them from the manifest.
+        Only files that the manifest records as build outputs, inside the
+        vuepress source dir, are deleted. Returns the deleted paths."""
+
+        current = set(str(Path(d).absolute()) for d in dests)
+        root = self.root.absolute()
+
+        pruned = []
+
+        for key in sorted(set(self.entries) - current):
+            del self.entries[key]
+            p = Path(key)
+
+            if root not in p.parents:
+                continue
+
+            if p.is_dir() and not p.is_symlink():
+                if any(Path(c).is_relative_to(p) for c in current):
+                    continue
+                shutil.rmtree(p)
+            elif p.exists() or p.is_symlink():
+                p.unlink()
+            else:
+                continue
+
+            logger.debug(f"Pruned {p}")
+            pruned.append(p)
+            self.files.pop(key, None)
+
+            # Remove directories that are now empty
+            for d in p.parents:
+                if d == root or root not in d.parents or any(d.iterdir()):
+                    break
+                d.rmdir()
+
+        return pruned
+
+    def save(self):
+        sink.write_text(self.path, json.dumps({
+            'version': MANIFEST_VERSION,
+            'entries': self.entries,
+            'files': self.files
+        }, indent=1, sort_keys=True))
+
+    def summary(self):
+        return f"Manifest: {self.hits} unchanged, {self.misses} written"
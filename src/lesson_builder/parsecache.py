@@ -0,0 +1,151 @@
+""" A persistent cache of parsed YAML and markdown frontmatter. PyYAML is slow,
+and every build parses the lesson plan, config.yml, every _assignment.yaml and
+the frontmatter of every lesson and assignment text, so the parsed values are
+pickled to the cache dir and reused while the files are unchanged.
+
+An entry is reused if the size and mtime of the file are unchanged or, if they
+changed, when the content hash is unchanged, as after a checkout or a touch.
+"""
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+import threading
+from pathlib import Path
+
+logger = logging.getLogger('lesson-builder')
+
+# Part of every entry. Change it when the format of the parsed values changes
+PARSE_CACHE_VERSION = 1
+
+
+class ParseCache:
+    """Parsed file contents, cached on disk, one pickle per source file.
+
+    Args:
+        cache_dir (Path): Where to keep the pickles. The default is 'parse' in
+            the lesson-builder cache dir
+        enabled (bool): If False, files are always parsed, and the cache is
+            neither read nor written
+    """
+
+    def __init__(self, cache_dir: Path = None, enabled: bool = True):
+        self._cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def cache_dir(self):
+        if self._cache_dir is None:
+            from .config import cache_dir
+            return cache_dir / 'parse'
+        return self._cache_dir
+
+    def entry_path(self, path: Path, kind: str):
+        """The path of the pickle for a file, as a str. Paths are built with
+        os.path, since this is called for every file that is parsed"""
+        key = hashlib.sha256(f"{kind}:{os.path.abspath(path)}".encode('utf8')).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], key + '.pickle')
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _read_entry(self, entry_path):
+        try:
+            with open(entry_path, 'rb') as f:
+                entry = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.debug(f"Ignoring unreadable parse cache entry {entry_path}: {e}")
+            return None
+
+        return entry if entry.get('version') == PARSE_CACHE_VERSION else None
+
+    def _write_entry(self, entry_path, entry):
+        try:
+            os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(entry_path), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, entry_path)
+        except OSError as e:
+            logger.debug(f"Can't write parse cache entry {entry_path}: {e}")
+
+    def load(self, path: Path, kind: str, parse_f):
+        """Return the parsed contents of a file, from the cache if the file is
+        unchanged, or by calling parse_f with the text of the file.
+
+        Args:
+            path (Path): The file
+            kind (str): The kind of parse, like 'yaml', so a file can be cached
+                for more than one parser
+            parse_f (): Parses the text of the file. The value must be picklable
+        """
+        if not self.enabled:
+            return parse_f(Path(path).read_text())
+
+        st = os.stat(path)
+        stat = (st.st_size, st.st_mtime_ns)
+
+        entry_path = self.entry_path(path, kind)
+        entry = self._read_entry(entry_path)
+
+        if entry is not None and entry['stat'] == stat:
+            self._count(True)
+            return entry['value']
+
+        with open(path, 'rb') as fh:
+            data = fh.read()
+        digest = hashlib.sha256(data).hexdigest()
+
+        if entry is not None and entry['hash'] == digest:
+            # Touched, but not changed
+            self._count(True)
+            entry['stat'] = stat
+            self._write_entry(entry_path, entry)
+            return entry['value']
+
+        self._count(False)
+        value = parse_f(data.decode('utf8'))
+
+        self._write_entry(entry_path, {'version': PARSE_CACHE_VERSION, 'stat': stat,
+                                       'hash': digest, 'value': value})
+        return value
+
+    def yaml(self, path: Path):
+        """The YAML document in a file, parsed with yaml.safe_load"""
+
+        def parse(text):
+            import yaml
+            return yaml.safe_load(text)
+
+        return self.load(path, 'yaml', parse)
+
+    def frontmatter(self, path: Path):
+        """The frontmatter.Post for a markdown file"""
+        import frontmatter
+
+        def parse(text):
+            post = frontmatter.loads(text)
+            return post.metadata, post.content
+
+        metadata, content = self.load(path, 'frontmatter', parse)
+
+        post = frontmatter.Post(content)
+        post.metadata.update(metadata)
+        return post
+
+    def summary(self):
+        return f"Parse cache: {self.hits} reused, {self.misses} parsed"
+
+
+# The parse cache shared by the lesson plan, lessons and assignments
+parse_cache = ParseCache()
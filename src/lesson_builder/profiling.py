@@ -0,0 +1,168 @@
+""" Profiling for `jtl build --profile`. The build runs under cProfile, and the
+profile is written as a .pstats file. With --sample, a stack sampler also runs
+alongside it, and writes collapsed stacks that flamegraph.pl, speedscope or
+inferno can read.
+"""
+import cProfile
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+SAMPLE_INTERVAL = 0.001  # seconds
+
+_active = threading.local()
+
+
+class StackSampler:
+    """Samples the stacks of all threads at a fixed interval, and counts each
+    distinct stack, outermost frame first."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def frame_label(frame):
+        module = frame.f_globals.get('__name__', '?')
+        return f"{module}:{frame.f_code.co_name}"
+
+    def sample(self):
+        me = threading.get_ident()
+
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+
+            labels = []
+            while frame is not None:
+                labels.append(self.frame_label(frame))
+                frame = frame.f_back
+
+            self.stacks[';'.join(reversed(labels))] += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='lesson-builder-sampler',
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def collapsed(self):
+        """The samples in collapsed stack format, one 'a;b;c count' line per stack"""
+        return ''.join(f"{stack} {n}\n" for stack, n in sorted(self.stacks.items()))
+
+
+def module_of(filename):
+    """The dotted module name for a lesson_builder source file, or the top level
+    package or module name for anything else"""
+
+    parts = Path(filename).with_suffix('').parts
+
+    if 'lesson_builder' in parts:
+        i = len(parts) - 1 - parts[::-1].index('lesson_builder')
+        return '.'.join(parts[i:])
+
+    if 'site-packages' in parts:
+        i = parts.index('site-packages')
+        return parts[i + 1] if i + 1 < len(parts) else filename
+
+    return parts[-1] if parts else filename
+
+
+def grouped_report(stats: pstats.Stats, n_modules=10, n_functions=5):
+    """Group the functions in the profile by module, and return a report of the
+    modules with the most internal time, and their hottest functions. The
+    lesson_builder modules come first."""
+
+    groups = defaultdict(list)
+
+    for (filename, line, name), (cc, nc, tt, ct, callers) in stats.stats.items():
+        if filename.startswith('<') or filename == '~':
+            # Builtins, like {method 'read' of '_io.BufferedReader' objects}
+            module = 'builtins'
+        else:
+            module = module_of(filename)
+        groups[module].append((tt, ct, nc, f"{name}:{line}"))
+
+    def total(m):
+        return sum(e[0] for e in groups[m])
+
+    lb = sorted((m for m in groups if m.startswith('lesson_builder')), key=total, reverse=True)
+    other = sorted((m for m in groups if not m.startswith('lesson_builder')), key=total,
+                   reverse=True)[:n_modules]
+
+    lines = []
+    for title, modules in (('lesson_builder modules', lb), ('Other modules', other)):
+        lines.append(f"=== {title}")
+        for m in modules:
+            lines.append(f"{m:<40} {total(m):8.3f}s")
+            for tt, ct, nc, fn in sorted(groups[m], reverse=True)[:n_functions]:
+                lines.append(f"    {fn:<36} {tt:8.3f}s {ct:8.3f}s cum {nc:8d} calls")
+
+    return '\n'.join(lines)
+
+
+@contextmanager
+def profiled(name='lesson-builder', out_dir=None, sample=False):
+    """Profile the body of the with statement. On exit, write <name>.pstats in
+    out_dir, the current directory by default, and print the hot functions
+    grouped by module. Nested profiled() blocks are part of the outer profile,
+    since only one profiler can be active at a time.
+
+    Args:
+        name (str): Base name of the output files
+        out_dir (Path): Where to write them
+        sample (bool): Also run a StackSampler, and write <name>.collapsed. The
+            sampler's thread holds the GIL while it samples, so the cProfile
+            times include its overhead
+    """
+
+    if getattr(_active, 'profiler', None) is not None:
+        yield _active.profiler
+        return
+
+    out_dir = Path.cwd() if out_dir is None else Path(out_dir)
+
+    profiler = cProfile.Profile()
+    sampler = StackSampler() if sample else None
+
+    start = time.perf_counter()
+    if sampler is not None:
+        sampler.start()
+    profiler.enable()
+    _active.profiler = profiler
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        _active.profiler = None
+        if sampler is not None:
+            sampler.stop()
+        elapsed = time.perf_counter() - start
+
+        out_dir.mkdir(parents=True, exist_ok=True)
+        pstats_path = out_dir / f'{name}.pstats'
+        profiler.dump_stats(pstats_path)
+
+        print(grouped_report(pstats.Stats(profiler)))
+
+        if sampler is None:
+            print(f"\nProfiled {elapsed:.2f}s. Wrote {pstats_path}")
+        else:
+            collapsed_path = out_dir / f'{name}.collapsed'
+            collapsed_path.write_text(sampler.collapsed())
+            print(f"\nProfiled {elapsed:.2f}s. Wrote {pstats_path} and {collapsed_path}")
+            print("The times above include the overhead of the stack sampler")
@@ -1,14 +1,19 @@
+import logging
 import re
+from functools import lru_cache
 from pathlib import Path
 
 import yaml
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
 import frontmatter
 import lesson_builder.templates as tmpl
 from lesson_builder.config import level_module_repo_src_tmpl, level_module_repo_tmpl, level_module_codespaces_tmpl
+from lesson_builder.config import cache_dir
 from .trinket import read_code, trinket, goal_image
 from textwrap import dedent
 
+logger = logging.getLogger('lesson-builder')
+
 def strip_html(text):
     return re.sub('<.*?>', '', text) if text else ''
 
@@ -90,12 +95,31 @@ def strip_frontmatter(markdown_text):
         return markdown_text
 
 
-def render(template_name, *args, **kwargs):
-    """Render a Jinja2 template"""
+def make_bytecode_cache():
+    """Return an on-disk cache for compiled templates, or None if the cache
+    directory can't be created."""
+
+    d = cache_dir / 'jinja'
+
+    try:
+        d.mkdir(parents=True, exist_ok=True)
+    except OSError as e:
+        logger.debug(f"No template bytecode cache: {e}")
+        return None
+
+    return FileSystemBytecodeCache(str(d))
+
+
+@lru_cache(maxsize=None)
+def get_environment(bytecode_cache: bool = True):
+    """Return the shared Jinja2 environment. It is configured once and not
+    modified afterwards, so it is safe to reuse across renders and threads, and
+    its template cache keeps the parsed templates between renders."""
 
     tmpl_dir = Path(tmpl.__file__).parent
 
-    env = Environment(loader=FileSystemLoader(tmpl_dir))
+    env = Environment(loader=FileSystemLoader(tmpl_dir),
+                      bytecode_cache=make_bytecode_cache() if bytecode_cache else None)
     env.filters['strip_html'] = strip_html
     env.globals['trinket'] = trinket
     env.globals['goal_image'] = goal_image
@@ -106,6 +130,14 @@ def render(template_name, *args, **kwargs):
     env.globals['read_code'] = read_code
     env.filters['yaml'] = dict_to_yaml
 
+    return env
+
+
+def render(template_name, *args, **kwargs):
+    """Render a Jinja2 template"""
+
+    env = get_environment()
+
 
     if 'content' in kwargs:
 
@@ -136,4 +168,10 @@ def render(template_name, *args, **kwargs):
 
     template = env.get_template(template_name)
 
-    return template.render(*args, **kwargs)
+    text = template.render(*args, **kwargs)
+
+    if kwargs.get('asset_urls'):
+        from .assetstore import rewrite_asset_refs
+        text = rewrite_asset_refs(text, kwargs['asset_urls'])
+
+    return text
@@ -0,0 +1,215 @@
+""" The output sink. All generated files are written through it, so that files
+whose content has not changed are left untouched, and changed files are
+replaced atomically. The VuePress dev server watches the output tree, and only
+sees real, complete changes.
+
+Asset copies can use hard links, reflinks or symlinks instead of copying the
+bytes; see OutputSink.link_mode.
+"""
+import filecmp
+import logging
+import os
+import secrets
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+logger = logging.getLogger('lesson-builder')
+
+LINK_MODES = ('copy', 'hardlink', 'reflink', 'symlink')
+
+FICLONE = 0x40049409  # Linux ioctl to clone a file on btrfs, xfs and others
+
+
+class OutputSink:
+    """Writes files only if their content differs from what is on disk, through
+    a temp file in the same directory and a rename. Counts written and unchanged
+    files."""
+
+    def __init__(self, link_mode='copy'):
+        self.written = 0
+        self.unchanged = 0
+        self._lock = threading.Lock()
+        self._link_mode = None
+        self._unsupported = set()  # (link mode, source device, dest device)
+
+        self.link_mode = link_mode
+
+    @property
+    def link_mode(self):
+        """How copy_file puts files in place: one of LINK_MODES"""
+        return self._link_mode
+
+    @link_mode.setter
+    def link_mode(self, mode):
+        if mode not in LINK_MODES:
+            raise ValueError(f"Unknown link mode '{mode}', expected one of {', '.join(LINK_MODES)}")
+        self._link_mode = mode
+
+    def reset(self):
+        """Zero the counts, at the start of a build"""
+        with self._lock:
+            self.written = 0
+            self.unchanged = 0
+
+    def _count(self, changed):
+        with self._lock:
+            if changed:
+                self.written += 1
+            else:
+                self.unchanged += 1
+        return changed
+
+    def _replace(self, dest: Path, write_f):
+        """Write to a temp file next to dest with write_f(temp_path), then
+        rename it over dest"""
+
+        dest.parent.mkdir(parents=True, exist_ok=True)
+
+        tmp = self._temp_file(dest)
+        try:
+            write_f(tmp)
+            os.replace(tmp, dest)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    @staticmethod
+    def _temp_file(dest: Path):
+        """Create an empty temp file next to dest and return its path. Unlike
+        tempfile.mkstemp, which makes private files, it is created with mode
+        0o666, and the kernel applies the umask, as for any new file."""
+        for _ in range(tempfile.TMP_MAX):
+            tmp = str(dest.parent / f'.{dest.name}.{secrets.token_hex(4)}.tmp')
+            try:
+                os.close(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666))
+                return tmp
+            except FileExistsError:
+                continue
+
+        raise FileExistsError(f"No unused temp file name for {dest}")
+
+    def write_bytes(self, dest, data: bytes):
+        """Write data to dest if it differs. Returns True if the file was written"""
+        dest = Path(dest)
+
+        if dest.is_file() and dest.stat().st_size == len(data) and dest.read_bytes() == data:
+            return self._count(False)
+
+        # Replacing a file keeps its permissions; new files have the temp file's
+        mode = dest.stat().st_mode & 0o777 if dest.exists() else None
+
+        def write(tmp):
+            Path(tmp).write_bytes(data)
+            if mode is not None:
+                os.chmod(tmp, mode)
+
+        self._replace(dest, write)
+        return self._count(True)
+
+    def write_text(self, dest, text: str, encoding='utf-8'):
+        """Write text to dest if it differs. Returns True if the file was written"""
+        return self.write_bytes(dest, text.encode(encoding))
+
+    def _same_file(self, source: Path, dest: Path):
+        """True if dest already holds the content of source: it is a link to
+        source, or it has the same size and mtime, or the same bytes."""
+
+        if not dest.exists() and not dest.is_symlink():
+            return False
+
+        if dest.is_symlink():
+            return self.link_mode == 'symlink' and dest.resolve() == source.resolve()
+
+        if not dest.is_file():
+            return False
+
+        if os.path.samefile(source, dest):
+            return True
+
+        ss, ds = source.stat(), dest.stat()
+
+        if ss.st_size != ds.st_size:
+            return False
+
+        if ss.st_mtime_ns == ds.st_mtime_ns:
+            return True
+
+        return filecmp.cmp(source, dest, shallow=False)
+
+    def _link(self, mode, source: Path, tmp: str):
+        """Put a link or clone of source at tmp. Raises OSError if the file
+        system doesn't support the mode"""
+
+        os.unlink(tmp)
+
+        if mode == 'hardlink':
+            os.link(source, tmp)
+        elif mode == 'symlink':
+            os.symlink(source.absolute(), tmp)
+        elif mode == 'reflink':
+            try:
+                import fcntl
+            except ImportError:
+                raise OSError("reflink is not supported on this platform")
+
+            with open(source, 'rb') as s, open(tmp, 'wb') as d:
+                fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+            shutil.copystat(source, tmp)
+
+    def copy_file(self, source, dest):
+        """Copy source to dest if the contents differ, keeping the permission bits
+        and times, like shutil.copy2. With a link mode other than 'copy', link or
+        clone the file instead, falling back to a copy when the file system can't
+        do it, for instance when source and dest are on different devices.
+        Returns True if the file was written"""
+        source, dest = Path(source), Path(dest)
+
+        if dest.is_dir() and not dest.is_symlink():
+            dest = dest / source.name
+
+        if self._same_file(source, dest):
+            return self._count(False)
+
+        mode = self.link_mode
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        devs = (mode, source.stat().st_dev, dest.parent.stat().st_dev)
+
+        def copy(tmp):
+            if mode != 'copy' and devs not in self._unsupported:
+                try:
+                    self._link(mode, source, tmp)
+                    return
+                except OSError as e:
+                    logger.debug(f"Can't {mode} {source} to {dest}, copying instead: {e}")
+                    self._unsupported.add(devs)
+
+            shutil.copy2(source, tmp)
+
+        self._replace(dest, copy)
+        return self._count(True)
+
+    def copy_tree(self, source, dest):
+        """Mirror each file in the source directory to dest, like
+        shutil.copytree(dirs_exist_ok=True), but only writing files whose size
+        or mtime differ. Returns the number of files written"""
+        source, dest = Path(source), Path(dest)
+
+        n = 0
+        for dirpath, dirnames, filenames in os.walk(source):
+            rel = Path(dirpath).relative_to(source)
+            (dest / rel).mkdir(parents=True, exist_ok=True)
+
+            for fn in filenames:
+                n += self.copy_file(Path(dirpath) / fn, dest / rel / fn)
+
+        return n
+
+    def summary(self):
+        return f"Output: {self.written} written, {self.unchanged} unchanged"
+
+
+# The sink shared by everything that writes generated files
+sink = OutputSink()
@@ -0,0 +1,246 @@
+""" Synthetic curricula for benchmarks and tests. Generates lesson plans of a
+configurable size, with file and directory assignments, python.run blocks,
+images and templated lesson texts, and java-modules style level trees for
+update_meta and make_lessons.
+
+The output is deterministic for a given seed, so benchmark runs are comparable.
+"""
+import random
+import struct
+import zlib
+from pathlib import Path
+from textwrap import dedent
+
+import yaml
+
+CONFIG = {
+    'base': '/',
+    'plugins': ['@vuepress/plugin-back-to-top'],
+    'themeConfig': {
+        'displayAllHeaders': True,
+        'logo': '/assets/logo.png',
+        'nav': [{'link': '/about/', 'text': 'About'}],
+    }
+}
+
+
+def png_bytes(width=16, height=16, color=(243, 113, 33)):
+    """A valid, solid color RGB PNG image"""
+
+    def chunk(kind, data):
+        return (struct.pack('>I', len(data)) + kind + data +
+                struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+    row = b'\x00' + bytes(color) * width
+    return (b'\x89PNG\r\n\x1a\n' +
+            chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)) +
+            chunk(b'IDAT', zlib.compress(row * height)) +
+            chunk(b'IEND', b''))
+
+
+def python_program(rng: random.Random, lines=None):
+    """A small turtle program, between 3 and 20 lines long"""
+    lines = rng.randint(3, 20) if lines is None else lines
+
+    body = [f"t.forward({rng.randint(10, 200)})\nt.left({rng.choice([45, 60, 90, 120])})"
+            for _ in range(lines)]
+
+    return 'import turtle\n\nt = turtle.Turtle()\n' + '\n'.join(body) + '\n'
+
+
+def python_run_block(rng: random.Random):
+    """A python.run fence, sometimes with a height spec"""
+    spec = f": height={rng.randint(2, 8) * 100}" if rng.random() < 0.5 else ''
+    return f"```python.run{spec}\n{python_program(rng)}```\n"
+
+
+def markdown_text(rng: random.Random, title, run_blocks=2, images=(), paragraphs=3):
+    """A markdown page with a heading, paragraphs, python.run blocks and image
+    references"""
+
+    parts = [f"# {title}\n"]
+
+    for i in range(max(paragraphs, run_blocks)):
+        words = ' '.join(rng.choice(['turtle', 'draw', 'loop', 'color', 'angle', 'shape',
+                                     'program', 'square', 'circle', 'the', 'a', 'and'])
+                         for _ in range(rng.randint(20, 60)))
+        parts.append(words.capitalize() + '.\n')
+
+        if i < run_blocks:
+            parts.append(python_run_block(rng))
+
+    for img in images:
+        parts.append(f"![{Path(img).stem}]({img})\n")
+
+    return '\n'.join(parts)
+
+
+def write_file_assignment(rng, path: Path, title, run_blocks, images):
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    names = [f"{path.stem}_{i}.png" for i in range(images)]
+    for n in names:
+        (path.parent / n).write_bytes(png_bytes(color=(rng.randrange(256), 64, 128)))
+
+    path.write_text(markdown_text(rng, title, run_blocks, names))
+
+
+def write_dir_assignment(rng, path: Path, title, run_blocks, images):
+    path.mkdir(parents=True, exist_ok=True)
+
+    (path / '_assignment.yaml').write_text(yaml.dump({'title': title, 'description': title}))
+    (path / 'program.py').write_text(python_program(rng))
+
+    names = [f"image_{i}.png" for i in range(images)]
+    for n in names:
+        (path / n).write_bytes(png_bytes(color=(64, rng.randrange(256), 128)))
+
+    text = markdown_text(rng, title, run_blocks, names)
+    text += '\n{{ trinket("program.py", width="100%", height="600", embed_type="python") | safe }}\n'
+    (path / 'trinket.md').write_text(text)
+
+
+def make_lesson_plan(root, lessons=4, assignments=3, dir_fraction=0.5, run_blocks=2,
+                     images=1, seed=0, **_):
+    """Write a synthetic lesson plan in root/lessons and an empty vuepress
+    docs dir in root/docs
+
+    Args:
+        root: Directory to create the site in
+        lessons (int): Number of lessons
+        assignments (int): Number of assignments per lesson
+        dir_fraction (float): Fraction of the assignments that are directories
+            with an _assignment.yaml, rather than single markdown files
+        run_blocks (int): Number of python.run blocks per text
+        images (int): Number of images per assignment
+        seed (int): Seed for the random content
+
+    Returns:
+        (lesson_dir, docs_dir)
+    """
+
+    rng = random.Random(seed)
+    root = Path(root)
+
+    lesson_dir = root / 'lessons'
+    docs_dir = root / 'docs'
+
+    (docs_dir / 'src' / '.vuepress').mkdir(parents=True, exist_ok=True)
+    (lesson_dir / 'assets').mkdir(parents=True, exist_ok=True)
+
+    (lesson_dir / 'assets' / 'logo.png').write_bytes(png_bytes())
+    (lesson_dir / 'config.yml').write_text(yaml.dump(CONFIG))
+    (lesson_dir / 'index.md').write_text(dedent("""
+        ---
+        home: true
+        tagline: Synthetic lessons
+        actionText: Get Started
+        actionLink: /lessons/
+        ---
+        """).lstrip())
+    (lesson_dir / 'about.md').write_text("# About\n\nA synthetic lesson plan.\n")
+
+    plan = {
+        'title': f'Synthetic {lessons}x{assignments}',
+        'description': 'Generated lesson plan',
+        'pages': ['index.md', 'about.md'],
+        'resources': ['logo.png'],
+        'sidebar': [{'path': '/about', 'title': 'About'}],
+        'lessons': {}
+    }
+
+    for li in range(lessons):
+        name = f'lesson_{li:03d}'
+        ld = lesson_dir / name
+        ld.mkdir(parents=True, exist_ok=True)
+
+        # Lesson texts are templates, rendered with their frontmatter
+        text = markdown_text(rng, '{{ fm_title }}', run_blocks=0, paragraphs=2)
+        text += '\n{% for i in range(3) %}* Step {{ i + 1 }}\n{% endfor %}\n'
+        (ld / 'index.md').write_text(
+            f"---\ntitle: Lesson {li}\ntemplate: readme.md\n---\n{text}")
+
+        asgns = []
+        for ai in range(assignments):
+            title = f'Assignment {li}.{ai}'
+            if rng.random() < dir_fraction:
+                rel = f'{name}/{ai:02d}_dir'
+                write_dir_assignment(rng, lesson_dir / rel, title, run_blocks, images)
+            else:
+                rel = f'{name}/{ai:02d}_file.md'
+                write_file_assignment(rng, lesson_dir / rel, title, run_blocks, images)
+            asgns.append(rel)
+
+        plan['lessons'][name] = {'resources': ['logo.png'], 'assignments': asgns}
+
+    (lesson_dir / 'lesson-plan.yaml').write_text(yaml.dump(plan, sort_keys=False))
+
+    return lesson_dir, docs_dir
+
+
+def make_levels(root, levels=1, modules=2, lessons=4, assignments=3, images=1, seed=0, **_):
+    """Write a java-modules style tree in root/levels, with a README.md and
+    a java file in each assignment, and a lesson plan for each level's website
+    in root/_build/<level>/lessons, for make_lessons()
+
+    Args:
+        root: Repo root to create the tree in
+        levels (int): Number of levels
+        modules (int): Number of modules per level
+        lessons (int): Number of lessons per module
+        assignments (int): Number of assignments per lesson
+        images (int): Number of images per assignment
+        seed (int): Seed for the random content
+
+    Returns:
+        The levels directory
+    """
+
+    rng = random.Random(seed)
+    root = Path(root)
+    levels_dir = root / 'levels'
+
+    for lv in range(levels):
+        level = f'Level{lv}'
+        ld = levels_dir / level
+        ld.mkdir(parents=True, exist_ok=True)
+        (ld / 'README.md').write_text(f"# {level}\n\nThe synthetic {level}.\n")
+
+        web_lessons = root / '_build' / level / 'lessons'
+        web_lessons.mkdir(parents=True, exist_ok=True)
+        (web_lessons / 'lesson-plan.yaml').write_text(yaml.dump({
+            'title': level, 'description': level, 'pages': [], 'resources': []}))
+
+        for mv in range(modules):
+            md = ld / f'Module{mv}'
+            (md / 'bin').mkdir(parents=True, exist_ok=True)
+            (md / 'README.md').write_text(f"# Module {mv}\n\nThe synthetic module.\n")
+
+            for ls in range(lessons):
+                lsd = md / 'src' / f'_{ls:02d}_lesson_{ls}'
+                lsd.mkdir(parents=True, exist_ok=True)
+                (lsd / 'README.md').write_text(f"# Lesson {ls}\n\nAbout the lesson.\n")
+
+                for a in range(assignments):
+                    ad = lsd / f'_{a}_assignment_{a}'
+                    (ad / 'images').mkdir(parents=True, exist_ok=True)
+
+                    names = [f'goal_{i}.png' for i in range(images)]
+                    for n in names:
+                        (ad / 'images' / n).write_bytes(png_bytes(color=(rng.randrange(256), 0, 0)))
+
+                    (ad / f'Assignment{a}.java').write_text(dedent(f"""
+                        package _{ls:02d}_lesson_{ls}._{a}_assignment_{a};
+
+                        public class Assignment{a} {{
+                            public static void main(String[] args) {{
+                                System.out.println("{rng.random()}");
+                            }}
+                        }}
+                        """).lstrip())
+
+                    text = markdown_text(rng, f'Assignment {a}', run_blocks=0,
+                                         images=[f'./images/{n}' for n in names])
+                    (ad / 'README.md').write_text(text)
+
+    return levels_dir
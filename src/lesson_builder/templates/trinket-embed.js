@@ -0,0 +1,80 @@
+/**
+ * Replaces the trinket placeholders that lesson-builder writes for the
+ * 'click' and 'visible' embed modes with their iframes. A placeholder loads
+ * when its Run button is clicked, and a 'visible' placeholder also loads when
+ * it scrolls into view. Without IntersectionObserver, 'visible' placeholders
+ * load at once, as iframes with loading="lazy".
+ *
+ * The iframe is added inside the placeholder, and the preview is hidden, so
+ * the elements that Vue rendered stay where Vue expects them.
+ */
+(function () {
+  var SELECTOR = '.trinket-embed[data-trinket-src]';
+
+  function load(el) {
+    if (el.getAttribute('data-trinket-loaded')) {
+      return;
+    }
+    el.setAttribute('data-trinket-loaded', 'true');
+
+    for (var i = 0; i < el.children.length; i++) {
+      el.children[i].style.display = 'none';
+    }
+
+    var f = document.createElement('iframe');
+    f.src = el.getAttribute('data-trinket-src');
+    f.width = el.getAttribute('data-trinket-width');
+    f.height = el.getAttribute('data-trinket-height');
+    f.setAttribute('loading', 'lazy');
+    f.setAttribute('frameborder', '0');
+    f.setAttribute('marginwidth', '0');
+    f.setAttribute('marginheight', '0');
+    f.setAttribute('allowfullscreen', '');
+    el.appendChild(f);
+  }
+
+  document.addEventListener('click', function (e) {
+    var button = e.target.closest && e.target.closest('.trinket-run');
+    var el = button && button.closest(SELECTOR);
+    if (el) {
+      load(el);
+    }
+  });
+
+  var observer = null;
+  if ('IntersectionObserver' in window) {
+    observer = new IntersectionObserver(function (entries) {
+      entries.forEach(function (entry) {
+        if (entry.isIntersecting) {
+          observer.unobserve(entry.target);
+          load(entry.target);
+        }
+      });
+    }, { rootMargin: '200px' });
+  }
+
+  function watch() {
+    var els = document.querySelectorAll(SELECTOR + '[data-trinket-load="visible"]:not([data-trinket-watched])');
+    for (var i = 0; i < els.length; i++) {
+      els[i].setAttribute('data-trinket-watched', 'true');
+      if (observer) {
+        observer.observe(els[i]);
+      } else {
+        load(els[i]);
+      }
+    }
+  }
+
+  // Pages are replaced without a reload when the reader follows a link, so
+  // look for new placeholders whenever the document changes
+  function start() {
+    watch();
+    new MutationObserver(watch).observe(document.body, { childList: true, subtree: true });
+  }
+
+  if (document.readyState === 'loading') {
+    document.addEventListener('DOMContentLoaded', start);
+  } else {
+    start();
+  }
+})();
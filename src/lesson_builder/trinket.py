@@ -1,19 +1,40 @@
+import logging
 import re
 import urllib.parse
+from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
 
 from jinja2 import pass_context
 
+from .util import variant_path
+
+logger = logging.getLogger('lesson-builder')
+
 def read_code(file_path):
     with open(file_path, 'r') as file:
         return file.read()
 
 
+GOAL_IMAGE_WIDTH = 200  # Display width of goal images, in CSS pixels
+
+
 @pass_context
 def goal_image(context, file):
     path = Path(context['working_directory']) / file
 
-    return f'<img src="./{path.name}" alt="Your Goal" style="float: right; width: 200px; margin-bottom:20px; "/>'
+    # The resized variants are written by the image optimizer, if it is enabled.
+    # With the asset store, they are in the store instead of the working directory
+    asset_urls = context.get('asset_urls')
+
+    def exists(v):
+        return v.name in asset_urls if asset_urls else v.exists()
+
+    variants = [(w, variant_path(path, w)) for w in (GOAL_IMAGE_WIDTH, GOAL_IMAGE_WIDTH * 2)]
+    srcset = ', '.join(f'./{v.name} {w}w' for w, v in variants if exists(v))
+    srcset = f' srcset="{srcset}" sizes="{GOAL_IMAGE_WIDTH}px"' if srcset else ''
+
+    return f'<img src="./{path.name}"{srcset} alt="Your Goal" style="float: right; width: {GOAL_IMAGE_WIDTH}px; margin-bottom:20px; "/>'
 
 
 def generate_trinket_iframe_src(code,  embed_type='python', width='300', height='500'):
@@ -33,11 +54,11 @@ def trinket(context, file, embed_type='python', width='300', height='500'):
 
     code = read_code(context['working_directory'] / file)
 
-    iframe_src = generate_trinket_iframe_src(code, embed_type, width, height)
-    return f'<iframe width="{width}" height="{height}" src="{iframe_src}" frameborder="0" marginwidth="0" marginheight="0" allowfullscreen></iframe>'
+    return generate_trinket_embed(code.strip(), width, height, embed_type,
+                                  mode=context.get('trinket_embed', 'iframe'))
 
 
-def generate_trinket_iframe(code, width='300', height='500', embed_type='python'):
+def generate_trinket_iframe(code, width='300', height='500', embed_type='python', loading=None):
     """
     Generates an HTML iframe for a Trinket.io embed.
 
@@ -46,6 +67,7 @@ def generate_trinket_iframe(code, width='300', height='500', embed_type='python'
     - width (str): The width of the iframe (default is '300', can be specified in pixels or percentage).
     - height (str): The height of the iframe (default is '500').
     - embed_type (str): The type of Trinket embed (e.g., 'python').
+    - loading (str): The loading attribute of the iframe, like 'lazy'. None for no attribute.
 
     Returns:
     - str: An HTML iframe element as a string.
@@ -59,57 +81,227 @@ def generate_trinket_iframe(code, width='300', height='500', embed_type='python'
     src_url = f'{base_url}{embed_type}#code={encoded_code}'
 
     # Construct and return the iframe HTML string
-    iframe_html = f'<iframe width="{width}" height="{height}" src="{src_url}" frameborder="0" marginwidth="0" marginheight="0" allowfullscreen></iframe>'
+    loading_attr = f' loading="{loading}"' if loading else ''
+    iframe_html = f'<iframe width="{width}" height="{height}" src="{src_url}"{loading_attr} frameborder="0" marginwidth="0" marginheight="0" allowfullscreen></iframe>'
 
     return iframe_html
 
 
-def extract_python(source: str, base_name: str = None, replacement_f=None):
-    """ Regex pattern to find python.run blocks with optional height and width
-    Args:
-        source (str): Markdown source
-        base_name (str):
-        replacement_f ():
+# How python.run blocks and trinket() calls are embedded, set with the
+# trinket_embed key of lesson-plan.yaml:
+#   iframe: an iframe that loads with the page
+#   lazy: an iframe with loading="lazy", which the browser loads near the viewport
+#   click: a highlighted preview of the code, replaced by the iframe when Run is clicked
+#   visible: a preview, replaced by the iframe when it scrolls into view, or on Run
+EMBED_MODES = ('iframe', 'lazy', 'click', 'visible')
+
+# The script that turns the click and visible placeholders into iframes. It is
+# copied to the site's public assets
+EMBED_SCRIPT = Path(__file__).parent / 'templates' / 'trinket-embed.js'
 
-    Returns:
 
+def check_embed_mode(mode):
+    if mode not in EMBED_MODES:
+        raise ValueError(f"trinket_embed must be one of {', '.join(EMBED_MODES)}, not '{mode}'")
+    return mode
+
+
+def generate_trinket_placeholder(code, width='300', height='500', embed_type='python', load='click'):
+    """
+    Generates a placeholder for a Trinket.io embed: the code, in a fenced
+    block that VuePress highlights, and a Run button. The embed script replaces
+    it with the iframe when Run is clicked or, with load='visible', when it
+    scrolls into view. The blank lines around the fence end the HTML blocks,
+    so the fence is rendered as markdown.
     """
-    pattern = re.compile(r"```python\.run(?:\:\s*height='?(\d+)'?)?(?:,width='?(\d+)%?'?)?\n(.*?)```",
-                         re.DOTALL)
+    src_url = generate_trinket_iframe_src(code, embed_type)
+    lang = 'python' if embed_type.startswith('python') else embed_type
 
-    counter = [1]
-    code = {}
+    # The fence must be longer than any run of backticks in the code
+    fence = '`' * max([3] + [len(r) + 1 for r in re.findall(r'`{3,}', code)])
+
+    return (f'<div class="trinket-embed" data-trinket-load="{load}" data-trinket-src="{src_url}" '
+            f'data-trinket-width="{width}" data-trinket-height="{height}" style="width: {width};">\n\n'
+            f'{fence}{lang}\n{code.rstrip()}\n{fence}\n\n'
+            f'<button type="button" class="trinket-run">Run ▶</button>\n\n'
+            f'</div>\n')
+
+
+def generate_trinket_embed(code, width='300', height='500', embed_type='python', mode='iframe'):
+    """
+    Generates a Trinket.io embed in one of the EMBED_MODES.
+    """
+    check_embed_mode(mode)
+
+    if mode in ('click', 'visible'):
+        return generate_trinket_placeholder(code, width, height, embed_type, load=mode)
+
+    return generate_trinket_iframe(code, width, height, embed_type,
+                                   loading='lazy' if mode == 'lazy' else None)
+
+
+# The opening line of a runnable fence, like "```python.run: height=600, width=80%"
+RUN_FENCE_RE = re.compile(r"^[ \t]*(?P<fence>`{3,}|~{3,})(?P<lang>[\w+-]+)\.run\b:?(?P<spec>.*?)\r?$",
+                          re.MULTILINE)
+
+RUN_OPTION_RE = re.compile(r"(\w+)\s*=\s*(?:'([^']*)'|\"([^\"]*)\"|([^\s,]+))")
+
+
+@lru_cache(maxsize=None)
+def closing_fence_re(fence: str):
+    """A line that closes a fence: the same character, at least as many times"""
+    return re.compile(rf"^[ \t]*{re.escape(fence[0])}{{{len(fence)},}}[ \t]*\r?$", re.MULTILINE)
 
-    # Function to replace matched objects
-    def replacer(match):
-        m = match.group(0).strip('```')
 
-        lines = m.split('\n')
-        first = lines[0]
-        py_code = '\n'.join(lines[1:])
-        if ':' in first:
-            _, spec = first.split(':')
-            spec = spec.strip()
-            _, height = spec.split('=')
-            height = int(height.strip("'"))
-        else:
-            height = (len(py_code.split('\n')) * 17) + 110
+@dataclass
+class RunBlock:
+    """A runnable fenced code block, like ```python.run"""
+    lang: str
+    options: dict
+    code: str
+    line: int  # Line number of the opening fence, starting at 1
+    end_line: int  # Line number of the closing fence
+    raw: str  # The block as it is in the source, from the opening to the closing fence
 
-        if replacement_f is not None:
-            replacement = replacement_f(py_code+"\n\n\n", height)
-        else:
-            # Replace the code with the Jinja function
-            prog_name = f"{base_name}_{counter[0]}.py"
+    @property
+    def height(self):
+        """The height option, or a height that fits the code"""
+        if 'height' in self.options:
+            return int(self.options['height'])
+        return (len(self.code.split('\n')) * 17) + 110
 
-            code[prog_name] = py_code
-            # Construct the replacement string
-            replacement = f"{{{{ trinket(\"{prog_name}\", width=\"100%\", height=\"{height}\", embed_type=\"python3\") | safe }}}}"
+    @property
+    def width(self):
+        """The width option as a CSS width, or None. Plain numbers are percentages"""
+        w = self.options.get('width')
+        if w is None:
+            return None
+        return w if not w.isdigit() else w + '%'
 
-        counter[0] += 1
 
-        return replacement
+def parse_run_options(spec: str, line: int = None):
+    """Parse the options after the language of a fence, like "height=600, width='80%'" """
+    options = {}
 
-    # Replace matched blocks in the source with the template string
-    modified_source = pattern.sub(replacer, source)
+    for key, single, double, bare in RUN_OPTION_RE.findall(spec):
+        options[key] = single or double or bare
 
-    return modified_source, code
+    if 'height' in options and not options['height'].isdigit():
+        raise ValueError(f"Line {line}: height must be a number, not '{options['height']}'")
+
+    return options
+
+
+def _find_line(source, pos, needle, pattern):
+    """Find the next line at or after pos that contains needle and matches
+    pattern at its start. Finding the needle with str.find first is much
+    faster than searching with the line anchored pattern."""
+
+    while (i := source.find(needle, pos)) >= 0:
+        line_start = source.rfind('\n', 0, i) + 1
+        m = pattern.match(source, max(line_start, pos))
+        if m is not None:
+            return m
+        pos = source.find('\n', i)
+        if pos < 0:
+            break
+
+    return None
+
+
+def tokenize_run_fences(source: str, source_name: str = None):
+    """Split markdown into text and RunBlocks, in one pass over the source.
+
+    Yields strings for the text between the runnable blocks, and a RunBlock
+    for each block. A block starts at a line like ```python.run and ends at
+    a line with the same fence, at least as long as the opening one. The fence
+    lines are found by searching for '.run' and fence characters and checking
+    the lines they are on, so the text in between is never split into lines.
+    An unclosed block runs to the end of the source, like in CommonMark, and
+    is yielded as text, with a warning.
+    """
+
+    pos = 0
+    line = 1
+
+    while (m := _find_line(source, pos, '.run', RUN_FENCE_RE)) is not None:
+        line += source.count('\n', pos, m.start())
+        fence = m.group('fence')
+        code_start = m.end() + 1  # After the newline
+
+        close = None
+        if code_start <= len(source):
+            close = _find_line(source, code_start, fence[0] * 3, closing_fence_re(fence))
+
+        if close is None:
+            name = f"{source_name}, line" if source_name else "Line"
+            logger.warning(f"{name} {line}: unclosed {m.group('lang')}.run block is left as text")
+            break
+
+        if m.start() > pos:
+            yield source[pos:m.start()]
+
+        spec = m.group('spec')
+        end_line = line + source.count('\n', m.start(), close.end())
+
+        yield RunBlock(lang=m.group('lang'),
+                       options=parse_run_options(spec, line) if spec.strip() else {},
+                       code=source[code_start:close.start()],
+                       line=line, end_line=end_line,
+                       raw=source[m.start():close.end()])
+
+        # The newline after the closing fence is not part of the block
+        line = end_line
+        pos = close.end()
+
+    if pos < len(source):
+        yield source[pos:]
+
+
+def extract_python(source: str, base_name: str = None, replacement_f=None, source_name: str = None):
+    """ Replace the python.run blocks in markdown with Trinket embeds
+    Args:
+        source (str): Markdown source
+        base_name (str): Base name for the program files, when replacement_f is None
+        replacement_f (): Called with the code, the height and, if the block has
+            a width option, the width, and returns the replacement text
+        source_name (str): Name of the source, for error messages
+
+    Returns:
+        The modified source, and a dict of program file names to code, for the
+        blocks that became trinket() calls
+    """
+
+    counter = 1
+    code = {}
+    out = []
+
+    for t in tokenize_run_fences(source, source_name):
+        if isinstance(t, str):
+            out.append(t)
+            continue
+
+        if t.lang != 'python':
+            # Other .run blocks are left for other handlers
+            out.append(t.raw)
+            continue
+
+        try:
+            if replacement_f is not None:
+                args = (t.code + "\n\n\n", t.height) + ((t.width,) if t.width else ())
+                replacement = replacement_f(*args)
+            else:
+                # Replace the code with the Jinja function
+                prog_name = f"{base_name}_{counter}.py"
+
+                code[prog_name] = t.code
+                # Construct the replacement string
+                replacement = f"{{{{ trinket(\"{prog_name}\", width=\"{t.width or '100%'}\", height=\"{t.height}\", embed_type=\"python3\") | safe }}}}"
+        except Exception as e:
+            name = f"{source_name}, line" if source_name else "Line"
+            raise ValueError(f"{name} {t.line}: error in python.run block: {e}") from e
+
+        counter += 1
+        out.append(replacement)
+
+    return ''.join(out), code
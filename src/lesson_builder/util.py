@@ -6,12 +6,17 @@ import shutil
 import zipfile
 import os
 import inspect
+import json
 
 import yaml
 
 import logging
 logger = logging.getLogger('lesson-builder')
 
+# Directories that find_file_path() doesn't search
+SEARCH_SKIP_DIRS = frozenset(('node_modules', '.git', '_build', '__pycache__', '.venv', 'venv',
+                              '.tox', '.cache', 'dist'))
+
 def download_and_extract_zip(url, new_location):
     # Create a temporary directory
     with tempfile.TemporaryDirectory() as temp_dir:
@@ -41,27 +46,109 @@ def download_and_extract_zip(url, new_location):
 
 from pathlib import Path
 
-def find_file_path(directory, filename):
+def find_file_path(directory, filename, skip_dirs=SEARCH_SKIP_DIRS):
     """
-    Search for all instances of the specified directory in the given directory and its subdirectories,
-    and return the one with the shortest path (least depth).
+    Search breadth first for the specified file or directory in the given directory and its
+    subdirectories, and return the one with the shortest path (least depth). The search
+    stops at the first depth with a match, does not follow symlinks, and does not descend
+    into the directories named in skip_dirs.
 
     Parameters:
     - directory: The root directory to start the search from, as a string or a Path object.
-    - dir_name: The name of the directory to search for.
+    - filename: The name of the file or directory to search for.
+    - skip_dirs: Names of directories to not search, like node_modules and .git
 
     Returns:
     - The full path to the shallowest instance of the specified directory if found, otherwise None.
     """
-    directory_path = Path(directory)
-    matching_dirs = [path for path in directory_path.rglob(filename) ]
+    level = [Path(directory)]
 
-    if not matching_dirs:
-        return None
+    while level:
+        matches = []
+        next_level = []
+
+        for d in level:
+            try:
+                with os.scandir(d) as it:
+                    for e in it:
+                        if e.name == filename:
+                            matches.append(Path(e.path))
+                        if e.name not in skip_dirs and e.is_dir(follow_symlinks=False):
+                            next_level.append(Path(e.path))
+            except OSError:
+                continue
+
+        if matches:
+            return min(matches)
+
+        level = sorted(next_level)
+
+    return None
+
+
+def find_vuepress_dir(directory, skip_dirs=SEARCH_SKIP_DIRS):
+    """Find the shallowest .vuepress directory in the project at directory. The
+    result is cached per project in the cache dir, and reused for as long as
+    the directory exists."""
+
+    from .config import cache_dir
+
+    root = str(Path(directory).resolve())
+    cache_file = cache_dir / 'vuepress-dirs.json'
+
+    try:
+        cache = json.loads(cache_file.read_text())
+    except (OSError, ValueError):
+        cache = {}
+
+    vp = cache.get(root)
+    if vp and Path(vp).is_dir():
+        return Path(vp)
+
+    vp = find_file_path(root, '.vuepress', skip_dirs)
+
+    if vp is not None:
+        cache[root] = str(vp)
+        try:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            cache_file.write_text(json.dumps(cache, indent=1, sort_keys=True))
+        except OSError as e:
+            logger.debug(f"Can't cache the .vuepress location: {e}")
+
+    return vp
 
-    # Select the directory with the shortest path
-    shallowest_dir = min(matching_dirs, key=lambda path: len(path.parts))
-    return shallowest_dir
+
+def freeze(obj):
+    """A read-only copy of obj: mappings become MappingProxyTypes and lists
+    become tuples, recursively. Other values are returned as they are"""
+    from collections.abc import Mapping
+    from types import MappingProxyType
+
+    if isinstance(obj, Mapping):
+        return MappingProxyType({k: freeze(v) for k, v in obj.items()})
+    elif isinstance(obj, (list, tuple)):
+        return tuple(freeze(e) for e in obj)
+    else:
+        return obj
+
+
+class Frozen:
+    """Base for immutable objects with __slots__. Subclasses set their
+    attributes once, in __init__, with _set(). Only the attributes are
+    protected; mappings and lists that are exposed as attributes should be
+    made read-only with freeze()"""
+
+    __slots__ = ()
+
+    def _set(self, **kwargs):
+        for k, v in kwargs.items():
+            object.__setattr__(self, k, v)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable, can't set '{name}'")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable, can't delete '{name}'")
 
 
 @dataclass
@@ -85,38 +172,48 @@ class ResourceWrite:
 
     def render(self):
         from .render import render
-        rw = ResourceWrite(render(**self.source), self.dest)
+        self.write_rendered(render(**self.source))
+
+    def write_rendered(self, text: str):
+        """Write the output of rendering this resource"""
+        rw = ResourceWrite(text, self.dest)
         rw.write()
 
+    def inputs_key(self):
+        """A string with the settings that change the output of a copy, other
+        than the source, or None. The build manifest hashes it."""
+        return None
+
     def write(self):
 
+        from .sink import sink
+
         if isinstance(self.source, Path):
 
             if self.source.is_file():
-                self.dest.parent.mkdir(parents=True, exist_ok=True)
-                shutil.copy(self.source, self.dest)
+                sink.copy_file(self.source, self.dest)
             else:
-                shutil.copytree(self.source, self.dest, dirs_exist_ok=True)
+                sink.copy_tree(self.source, self.dest)
 
         elif isinstance(self.source, str):
-            self.dest.parent.mkdir(parents=True, exist_ok=True)
-            self.dest.write_text(self.source)
+            sink.write_text(self.dest, self.source)
         elif isinstance(self.source, bytes):
-            self.dest.parent.mkdir(parents=True, exist_ok=True)
-            self.dest.write_bytes(self.source)
+            sink.write_bytes(self.dest, self.source)
         else:
             pass  # it is a render, save it for later.
 
     def as_str(self, root: Path):
+        root = Path(root).absolute()
+
         if isinstance(self.source, Path):
-            src = self.source.relative_to(root)
+            src = self.source.absolute().relative_to(root)
 
-        elif isinstance(self.source, str):
+        elif isinstance(self.source, (str, bytes)):
             src = f"<{len(self.source)} bytes>"
         elif isinstance(self.source, dict):
             src = f"<Render {self.source['working_directory'].name}>"
 
-        dst = self.dest.relative_to(root)
+        dst = self.dest.absolute().relative_to(root)
 
         return f"{src} -> {dst}"
 
@@ -134,6 +231,11 @@ class ResourceWrite:
         return f"{src} -> {dst}"
 
 
+def variant_path(path: Path, width: int):
+    """The path of a resized variant of an image, like goal-200w.png"""
+    return path.with_name(f"{path.stem}-{width}w{path.suffix}")
+
+
 def get_first_h1_heading(markdown_file_path):
     """
     Extracts the text of the first h1 heading from a markdown file.
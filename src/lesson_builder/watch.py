@@ -0,0 +1,441 @@
+""" Incremental builds for `jtl build --watch`. The builder keeps the lesson plan
+and a reverse index from source files to the writes that use them, so a change
+to one file re-runs only the writes that depend on it.
+"""
+import logging
+import threading
+import time
+from fnmatch import fnmatch
+from pathlib import Path
+
+from watchdog.events import (EVENT_TYPE_CLOSED, EVENT_TYPE_CREATED, EVENT_TYPE_DELETED,
+                             EVENT_TYPE_MODIFIED, EVENT_TYPE_MOVED, FileSystemEventHandler)
+from watchdog.observers import Observer
+
+from .build_plan import BuildPlan, BuildCancelled, CancelToken
+from .config import DEFAULT_DEBOUNCE, DEFAULT_IGNORE
+from .lesson import Lesson
+from .lesson_plan import LessonPlan
+from .manifest import BuildManifest
+from .sink import sink
+
+logger = logging.getLogger('lesson-builder')
+
+PLAN_KEY = ('plan', None)
+
+# Events that change a file. Watchdog also reports files that are only opened
+# and read, which a rebuild does to its own sources.
+CHANGE_EVENTS = frozenset((EVENT_TYPE_CREATED, EVENT_TYPE_MODIFIED, EVENT_TYPE_DELETED,
+                           EVENT_TYPE_MOVED, EVENT_TYPE_CLOSED))
+
+
+def lesson_key(lesson):
+    return ('lesson', lesson.name)
+
+
+def assignment_key(assignment):
+    return ('assignment', assignment.path.absolute())
+
+
+class IncrementalBuilder:
+    """Builds the website from a lesson plan, then rebuilds only what depends on
+    the files that changed.
+
+    The writes are grouped by the node that produces them: the lesson plan's own
+    pages and resources, each lesson's text and resources, and each assignment.
+    The curriculum's source index maps a changed file to these nodes. Changes
+    to the lesson plan or config.yml rebuild everything."""
+
+    def __init__(self, lesson_path, docs_path, assignments_path, url_base=None,
+                 jobs=1, render_procs=0):
+        self.lesson_path = lesson_path
+        self.docs_path = docs_path
+        self.assignments_path = assignments_path
+        self.url_base = url_base
+        self.jobs = jobs
+        self.render_procs = render_procs
+
+        self.lp = None
+        self.writes = {}  # node key -> [ResourceWrite]
+        self.sidebar = None
+        self.complete = False  # False until a full build has finished
+
+    def make_lesson_plan(self):
+        return LessonPlan(self.lesson_path, self.docs_path, self.assignments_path,
+                          less_subdir='lessons')
+
+    def collect_node_writes(self, lesson, keys=None):
+        """Collect the writes for a lesson and its assignments, or only the ones
+        in keys"""
+
+        if keys is None or lesson_key(lesson) in keys:
+            self.writes[lesson_key(lesson)] = lesson.collect_own_writes()
+
+        for a in lesson.assignments:
+            if keys is None or assignment_key(a) in keys:
+                self.writes[assignment_key(a)] = a.collect_writes()
+
+    def full_build(self, force=False, cancel: CancelToken = None):
+        """Build everything, and index the writes for later incremental builds
+
+        Args:
+            force (bool): Ignore the hashes in the build manifest and rewrite every
+                output
+            cancel (CancelToken): Token to stop the build early
+
+        Returns:
+            The BuildManifest
+        """
+
+        sink.reset()
+        self.complete = False
+        self.lp = lp = self.make_lesson_plan()
+        lp.update_config(basedir=self.url_base)
+        logger.info(str(lp.curriculum))
+
+        self.writes = {PLAN_KEY: lp.collect_plan_writes()}
+        for lesson in lp.lessons:
+            self.collect_node_writes(lesson)
+
+        plan = BuildPlan(lp, [w for ws in self.writes.values() for w in ws])
+        logger.info(str(plan))
+
+        manifest = BuildManifest.for_lesson_plan(lp)
+        if force:
+            # Forget the hashes, but keep the outputs, so stale ones are pruned
+            manifest.entries = {d: dict(source=None, inputs=None, output=None)
+                                for d in manifest.entries}
+
+        lp.build(url_base_dir=self.url_base, plan=plan, jobs=self.jobs,
+                 manifest=manifest, render_procs=self.render_procs, cancel=cancel)
+
+        self.prune(manifest)
+
+        self.sidebar = lp.make_sidebar()
+        self.complete = True
+
+        return manifest
+
+    @property
+    def destinations(self):
+        return [w.dest for ws in self.writes.values() for w in ws]
+
+    def prune(self, manifest):
+        """Delete outputs of earlier builds that no current write produces, such
+        as pages for renamed lessons, removed assignments and dropped resources."""
+
+        pruned = manifest.prune(self.destinations)
+        manifest.save()
+
+        if pruned:
+            logger.info(f"Pruned {len(pruned)} stale outputs")
+
+        return pruned
+
+    def affected(self, path: Path):
+        """Return the keys of the nodes whose writes depend on path, or None if
+        path changes the structure of the site."""
+
+        path = Path(path).absolute()
+        lp = self.lp
+
+        if path in [p.absolute() for p in lp.structure_files]:
+            return None
+
+        cur = lp.curriculum
+        plan_sources = set(p.absolute() for p in lp.plan_sources)
+        keys = set()
+
+        # Check the path and its parents, for files inside resource directories
+        # and directory assignments.
+        for p in [path] + list(path.parents):
+            if p in plan_sources:
+                keys.add(PLAN_KEY)
+
+            for node in cur.sources(p):
+                keys.add(lesson_key(node) if isinstance(node, Lesson) else assignment_key(node))
+
+            a = cur.assignment(p)
+            if a is not None:
+                keys.add(assignment_key(a))
+
+            if keys:
+                break
+
+        if not keys:
+            keys = self.lesson_dir_keys(path)
+
+        return keys
+
+    def lesson_dir_keys(self, path: Path):
+        """Return the keys of a lesson and its assignments if path is in the
+        lesson's dir, or next to one of its file assignments. A new file, such
+        as an image that an assignment's text references, is not in the source
+        index until the lesson is read again."""
+
+        keys = set()
+
+        for lesson in self.lp.curriculum:
+            dirs = [a.path.absolute().parent for a in lesson.assignments if a.path.is_file()]
+
+            in_lesson = (lesson.src_dir is not None and lesson.src_dir.absolute() in path.parents) \
+                or path.parent in dirs
+
+            if in_lesson:
+                keys.add(lesson_key(lesson))
+                keys.update(assignment_key(a) for a in lesson.assignments)
+
+        return keys
+
+    def rebuild(self, paths, cancel: CancelToken = None):
+        """Rebuild the outputs that depend on the changed paths
+
+        Args:
+            paths: The changed files
+            cancel (CancelToken): Token to stop the build early. A cancelled
+                rebuild can be re-run with the same paths, plus new ones.
+
+        Returns:
+            The BuildManifest for the rebuild, or None if nothing depended on
+            the paths.
+        """
+
+        if self.lp is None or not self.complete:
+            return self.full_build(cancel=cancel)
+
+        sink.reset()
+
+        keys = set()
+        for p in paths:
+            k = self.affected(p)
+            if k is None:
+                logger.info(f"Structure changed in {p}, rebuilding everything")
+                return self.full_build(cancel=cancel)
+            keys |= k
+
+        if not keys:
+            logger.info(f"No outputs depend on {', '.join(str(p) for p in paths)}")
+            return None
+
+        lp = self.lp
+        cur = lp.curriculum
+
+        # Re-read the lessons that own the changed nodes, since titles, texts
+        # and resource lists may have changed.
+        names = set()
+        for kind, k in keys:
+            if kind == 'lesson':
+                names.add(k)
+            elif kind == 'assignment':
+                names.add(cur.assignment(k).lesson.name)
+
+        cur = lp.reload_lessons(names)
+
+        if PLAN_KEY in keys:
+            self.writes[PLAN_KEY] = lp.collect_plan_writes()
+
+        for name in names:
+            self.collect_node_writes(cur.lesson(name), keys)
+
+        writes = [w for k in keys for w in self.writes.get(k, [])]
+        plan = BuildPlan(lp, writes)
+        logger.info(f"Incremental {plan}")
+
+        manifest = BuildManifest.for_lesson_plan(lp)
+        plan.execute(jobs=self.jobs, manifest=manifest, render_procs=self.render_procs,
+                     cancel=cancel)
+
+        self.prune(manifest)
+
+        sidebar = lp.make_sidebar()
+        if sidebar != self.sidebar:
+            logger.info("Titles changed, updating config")
+            lp.update_config(self.url_base)
+            self.sidebar = sidebar
+
+        return manifest
+
+
+def watch_roots(paths):
+    """Resolve the directories to watch, dropping duplicates and directories
+    that are inside another watched directory"""
+
+    roots = sorted(set(Path(p).resolve() for p in paths), key=lambda p: len(p.parts))
+
+    out = []
+    for r in roots:
+        if not any(r == o or o in r.parents for o in out):
+            out.append(r)
+
+    return out
+
+
+def is_ignored(path, ignore=DEFAULT_IGNORE, ignore_dirs=()):
+    """True if any component of path matches one of the ignore globs, or if
+    the path is in one of the ignored directories, such as the docs output."""
+
+    path = Path(path).absolute()
+
+    if any(d == path or d in path.parents for d in ignore_dirs):
+        return True
+
+    return any(fnmatch(part, g) for part in path.parts for g in ignore)
+
+
+class ChangeCollector(FileSystemEventHandler):
+    """Collects the paths from file system events, so that a burst of events,
+    from several watched roots or from an editor that writes a file in several
+    steps, becomes one rebuild."""
+
+    def __init__(self, ignore=DEFAULT_IGNORE, ignore_dirs=()):
+        self.ignore = tuple(ignore)
+        self.ignore_dirs = tuple(Path(d).resolve() for d in ignore_dirs)
+
+        self.pending = set()
+        self.last_event = None
+        self.cond = threading.Condition()
+
+    def add(self, path):
+        path = Path(path).absolute()
+
+        if is_ignored(path, self.ignore, self.ignore_dirs):
+            return
+
+        with self.cond:
+            self.pending.add(path)
+            self.last_event = time.monotonic()
+            self.cond.notify_all()
+
+    def on_any_event(self, event):
+        if event.is_directory or event.event_type not in CHANGE_EVENTS:
+            return
+
+        self.add(event.src_path)
+
+        if getattr(event, 'dest_path', None):
+            self.add(event.dest_path)
+
+    def take(self, debounce=DEFAULT_DEBOUNCE, timeout=None):
+        """Wait until events have been pending and then quiet for debounce
+        seconds, and return the changed paths. Returns an empty set if there
+        were no events before the timeout."""
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self.cond:
+            while True:
+                now = time.monotonic()
+
+                if self.pending:
+                    quiet = now - self.last_event
+                    if quiet >= debounce:
+                        paths, self.pending = self.pending, set()
+                        return paths
+                    wait = debounce - quiet
+                else:
+                    wait = None
+
+                if deadline is not None:
+                    if now >= deadline and not self.pending:
+                        return set()
+                    wait = max(deadline - now, 0.01) if wait is None else wait
+
+                self.cond.wait(wait)
+
+
+class BuildWorker:
+    """Runs rebuilds on a worker thread. Submitting new changes while a build
+    is running cancels it at the next write boundary and starts again with the
+    changes from both, so the newest state of the files always wins."""
+
+    def __init__(self, builder: IncrementalBuilder, after_build=None):
+        self.builder = builder
+        self.after_build = after_build
+
+        self.thread = None
+        self.token = None
+        self.unfinished = set()  # Paths of the running or last cancelled build
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def submit(self, paths):
+        """Start a rebuild for paths, cancelling and merging any running build"""
+
+        if self.running:
+            logger.info("Cancelling the running build")
+            self.token.cancel()
+            self.thread.join()
+
+        paths = set(paths) | self.unfinished
+        self.unfinished = paths
+        self.token = CancelToken()
+
+        self.thread = threading.Thread(target=self._run, args=(sorted(paths), self.token),
+                                       name='lesson-builder-watch', daemon=True)
+        self.thread.start()
+
+    def _run(self, paths, token):
+        try:
+            manifest = self.builder.rebuild(paths, cancel=token)
+        except BuildCancelled:
+            logger.info("Build cancelled")
+            return
+        except Exception as e:
+            logger.error(f"Error building: {e}")
+            self.unfinished = set()
+            return
+
+        self.unfinished = set()
+
+        if manifest is not None:
+            print(manifest.summary())
+
+        if self.after_build is not None:
+            try:
+                self.after_build()
+            except Exception as e:
+                logger.error(f"Error after build: {e}")
+
+    def join(self):
+        if self.thread is not None:
+            self.thread.join()
+
+
+def watch(builder: IncrementalBuilder, roots, ignore=DEFAULT_IGNORE, debounce=DEFAULT_DEBOUNCE,
+          after_build=None):
+    """Watch the roots and rebuild after each burst of changes
+
+    Args:
+        builder (IncrementalBuilder): The builder, after its first build
+        roots: Directories to watch. Duplicates and nested roots are dropped.
+        ignore: Globs for paths that do not trigger rebuilds
+        debounce (float): Seconds of quiet to wait for before building
+        after_build: Called with no arguments after each successful rebuild
+    """
+
+    collector = ChangeCollector(ignore, ignore_dirs=[builder.lp.vue_doc_dir])
+    worker = BuildWorker(builder, after_build)
+
+    observer = Observer()
+    for r in watch_roots(roots):
+        logger.info(f"Watching {r}")
+        observer.schedule(collector, str(r), recursive=True)
+
+    observer.start()
+    try:
+        while observer.is_alive():
+            paths = collector.take(debounce, timeout=1)
+            if not paths:
+                continue
+
+            logger.info(f"Got {len(paths)} changed files: {', '.join(str(p) for p in sorted(paths))}")
+
+            worker.submit(paths)
+    finally:
+        observer.stop()
+        observer.join()
+        if worker.running:
+            worker.token.cancel()
+        worker.join()
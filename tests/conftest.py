@@ -7,4 +7,45 @@
     - https://docs.pytest.org/en/stable/writing_plugins.html
 """
 
-# import pytest
+import shutil
+from pathlib import Path
+
+import pytest
+
+lessons_dir = Path(__file__).parent / 'lessons'
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    """Keep the parse, image and template caches in the test's tmp dir, rather
+    than in the developer's ~/.cache/lesson-builder"""
+    from importlib import import_module
+
+    from lesson_builder import config
+    from lesson_builder.parsecache import parse_cache
+
+    # lesson_builder.render is the render() function, so get the module by name
+    render = import_module('lesson_builder.render')
+
+    d = tmp_path / 'cache'
+
+    monkeypatch.setenv('LESSON_BUILDER_CACHE_DIR', str(d))
+    monkeypatch.setattr(config, 'cache_dir', d)
+    monkeypatch.setattr(render, 'cache_dir', d)
+    monkeypatch.setattr(parse_cache, '_cache_dir', d / 'parse')
+
+    return d
+
+
+@pytest.fixture
+def basic_site(tmp_path):
+    """A copy of the basic lesson plan and an empty vuepress docs dir, so
+    builds don't write into the test tree. Returns (lesson_dir, docs_dir)"""
+
+    lesson_dir = tmp_path / 'lessons'
+    docs_dir = tmp_path / 'docs'
+
+    shutil.copytree(lessons_dir / 'basic', lesson_dir)
+    (docs_dir / 'src' / '.vuepress').mkdir(parents=True)
+
+    return lesson_dir, docs_dir
@@ -0,0 +1,56 @@
+from lesson_builder.assetstore import rewrite_asset_refs
+from lesson_builder.lesson_plan import LessonPlan
+from lesson_builder.manifest import BuildManifest
+from lesson_builder.synthetic import png_bytes
+
+
+def test_rewrite_asset_refs():
+    urls = {'goal.png': '/assets/ab/ab12.png', 'goal-200w.png': '/assets/cd/cd34.png'}
+
+    text = ('![The "goal"](goal.png)\n'
+            '![Other](other.png)\n'
+            '<img src="./goal.png" srcset="./goal-200w.png 200w" alt="Your Goal"/>\n'
+            '<img :src="$withBase(\'/assets/icon.png\')" data-src="goal.png">\n')
+
+    out = rewrite_asset_refs(text, urls).splitlines()
+
+    assert out[0] == '<img :src="$withBase(\'/assets/ab/ab12.png\')" alt="The &quot;goal&quot;">'
+    assert out[1] == '![Other](other.png)'
+    assert out[2] == ('<img :src="$withBase(\'/assets/ab/ab12.png\')" '
+                      ':srcset="$withBase(\'/assets/cd/cd34.png\') + \' 200w\'" alt="Your Goal"/>')
+    assert out[3] == '<img :src="$withBase(\'/assets/icon.png\')" data-src="goal.png">'
+
+
+def test_build_with_asset_store(basic_site):
+    lesson_dir, docs_dir = basic_site
+    lp_file = lesson_dir / 'lesson-plan.yaml'
+    lp_file.write_text(lp_file.read_text() + '\nasset_store: true\n')
+
+    # The same image, in the assignment dir and in the lesson dir
+    image = png_bytes(40, 30)
+    asgn = lesson_dir / 'module_1' / 'basic_dir'
+    (asgn / 'goal.png').write_bytes(image)
+    with open(asgn / 'trinket.md', 'a') as f:
+        f.write('\n{{ goal_image("goal.png") }}\n')
+
+    (lesson_dir / 'module_1' / 'turtle.png').write_bytes(image)
+    (lesson_dir / 'module_1' / 'basic_file.md').write_text('# Basic File\n\n![Turtle](turtle.png)\n')
+
+    lp = LessonPlan(lesson_dir, docs_dir)
+    lp.build(manifest=BuildManifest.for_lesson_plan(lp))
+
+    out = docs_dir / 'src' / 'lessons' / 'module_1'
+    assert not list(out.glob('*/*.png'))
+
+    store = docs_dir / 'src' / '.vuepress' / 'public' / 'assets'
+    stored = [p for p in store.rglob('*.png') if p.parent != store]
+    assert len(stored) == 1 and stored[0].read_bytes() == image
+
+    url = f"/assets/{stored[0].parent.name}/{stored[0].name}"
+    assert f":src=\"$withBase('{url}')\"" in (out / 'basic_dir' / 'index.md').read_text()
+    assert f"<img :src=\"$withBase('{url}')\" alt=\"Turtle\">" in (out / 'basic_file' / 'index.md').read_text()
+
+    lp = LessonPlan(lesson_dir, docs_dir)
+    manifest = BuildManifest.for_lesson_plan(lp)
+    lp.build(manifest=manifest)
+    assert manifest.misses == 0
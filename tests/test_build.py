@@ -0,0 +1,138 @@
+from pathlib import Path
+
+import pytest
+
+from lesson_builder.build_plan import BuildPlan, render_in_worker, write_chains
+from lesson_builder.lesson_plan import LessonPlan
+from lesson_builder.util import ResourceWrite
+
+
+def test_build_plan_phases(basic_site):
+    lesson_dir, docs_dir = basic_site
+    plan = LessonPlan(lesson_dir, docs_dir).build_plan()
+
+    assert all(not r.is_render for r in plan.copies)
+    assert all(r.is_render for r in plan.renders)
+    assert len(plan.renders) == 2
+    assert plan.writes == plan.copies + plan.renders
+
+
+def test_build_collects_once(basic_site, monkeypatch):
+    lesson_dir, docs_dir = basic_site
+    lp = LessonPlan(lesson_dir, docs_dir)
+
+    calls = []
+    collect_writes = lp.collect_writes
+
+    def counting_collect_writes():
+        calls.append(1)
+        return collect_writes()
+
+    monkeypatch.setattr(lp, 'collect_writes', counting_collect_writes)
+
+    plan = lp.build()
+
+    assert isinstance(plan, BuildPlan)
+    assert len(calls) == 1
+
+    out = docs_dir / 'src' / 'lessons' / 'module_1'
+    assert (out / 'index.md').exists()
+    assert (out / 'basic_dir' / 'python_program.py').exists()
+    assert 'trinket.io' in (out / 'basic_dir' / 'index.md').read_text()
+    assert (docs_dir / 'src' / '.vuepress' / 'config.yml').exists()
+
+
+def test_parallel_build(basic_site):
+    lesson_dir, docs_dir = basic_site
+    LessonPlan(lesson_dir, docs_dir).build(jobs=4)
+
+    out = docs_dir / 'src' / 'lessons' / 'module_1'
+    assert (out / 'basic_dir' / 'python_program.py').exists()
+    assert 'Basic File' in (out / 'basic_file' / 'index.md').read_text()
+
+
+def test_write_chains_keep_destination_order(tmp_path):
+    a, b = tmp_path / 'a.txt', tmp_path / 'b.txt'
+    writes = [ResourceWrite('1', a), ResourceWrite('x', b), ResourceWrite('2', a)]
+
+    chains = write_chains(writes)
+
+    assert [[w.source for w in c] for c in chains] == [['1', '2'], ['x']]
+
+
+def test_write_chains_join_nested_destinations(tmp_path):
+    images, other = tmp_path / 'lesson' / 'images', tmp_path / 'other.txt'
+    writes = [ResourceWrite('goal', images / 'goal.png'), ResourceWrite('x', other),
+              ResourceWrite('tree', images), ResourceWrite('deep', images / 'sub' / 'a.png'),
+              ResourceWrite('lesson', tmp_path / 'lesson' / 'index.md')]
+
+    chains = write_chains(writes)
+
+    # The lesson's index.md is not in images, so it can run on its own
+    assert [[w.source for w in c] for c in chains] == [['goal', 'tree', 'deep'], ['x'], ['lesson']]
+
+
+def test_process_pool_renders(basic_site, tmp_path, monkeypatch):
+    lesson_dir, docs_dir = basic_site
+
+    # A fresh site for the serial build, so its manifest doesn't skip anything
+    serial = tmp_path / 'serial'
+    (serial / 'src' / '.vuepress').mkdir(parents=True)
+    LessonPlan(lesson_dir, serial).build()
+
+    # Renders in this process would fail; the workers call render() directly
+    def no_render(self):
+        raise AssertionError(f"Rendered {self.dest} in the main process")
+
+    monkeypatch.setattr(ResourceWrite, 'render', no_render)
+    plan = LessonPlan(lesson_dir, docs_dir).build(render_procs=2)
+    assert len(plan.renders) == 2
+
+    out = docs_dir / 'src' / 'lessons' / 'module_1'
+    for p in ('basic_dir/index.md', 'basic_file/index.md'):
+        assert (out / p).read_text() == (serial / 'src/lessons/module_1' / p).read_text()
+
+
+def test_process_pool_render_errors(basic_site):
+    lesson_dir, docs_dir = basic_site
+    broken = lesson_dir / 'module_1' / 'basic_file.md'
+    broken.write_text("# Basic File\n\n{{ nope( }}\n")
+
+    with pytest.raises(RuntimeError, match='basic_file.md'):
+        LessonPlan(lesson_dir, docs_dir).build(render_procs=2)
+
+
+def test_worker_errors_name_the_source():
+    with pytest.raises(RuntimeError, match='broken.md'):
+        render_in_worker(dict(template_name='assignment.md', frontmatter={},
+                              working_directory=Path('.'), content='{{ nope( }}'),
+                         file='lessons/broken.md')
+
+
+def test_placeholder_embeds(basic_site):
+    lesson_dir, docs_dir = basic_site
+    lp_file = lesson_dir / 'lesson-plan.yaml'
+    lp_file.write_text(lp_file.read_text() + '\ntrinket_embed: visible\n')
+    (lesson_dir / 'module_1' / 'basic_file.md').write_text(
+        "# Basic File\n\n```python.run\nd = {'a': {'b': 1}}\n```\n")
+
+    LessonPlan(lesson_dir, docs_dir).build()
+
+    out = docs_dir / 'src' / 'lessons' / 'module_1'
+    for p in ('basic_dir/index.md', 'basic_file/index.md'):
+        text = (out / p).read_text()
+        assert 'data-trinket-load="visible"' in text and '<iframe' not in text
+    assert "```python\nd = {'a': {'b': 1}}\n```" in (out / 'basic_file' / 'index.md').read_text()
+
+    vp = docs_dir / 'src' / '.vuepress'
+    assert (vp / 'public' / 'assets' / 'trinket-embed.js').exists()
+    assert 'trinket-embed.js' in (vp / 'config.yml').read_text()
+
+
+def test_bad_embed_mode(basic_site):
+    lesson_dir, docs_dir = basic_site
+    lp_file = lesson_dir / 'lesson-plan.yaml'
+    lp_file.write_text(lp_file.read_text() + '\ntrinket_embed: eager\n')
+
+    with pytest.raises(ValueError, match='lesson-plan.yaml: trinket_embed must be one of'):
+        LessonPlan(lesson_dir, docs_dir).build()
@@ -0,0 +1,103 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+from textwrap import dedent
+
+from click.testing import CliRunner
+
+src_dir = Path(__file__).parent.parent / 'src'
+
+# Cumulative import time budget for the CLI module, in microseconds. The CLI
+# imports in about 50ms; importing everything eagerly took about 350ms.
+IMPORT_BUDGET_US = 150_000
+
+# Modules that only the commands that use them may import
+LAZY_MODULES = ('watchdog', 'plumbum', 'slugify', 'jinja2', 'frontmatter', 'bs4',
+                'requests', 'yaml', 'lesson_builder.lesson_plan', 'lesson_builder.jmod')
+
+
+def import_times(module):
+    """Run `python -X importtime` and return {module: cumulative microseconds}"""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([str(src_dir), os.environ.get('PYTHONPATH', '')]))
+
+    p = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                       env=env, capture_output=True, text=True, check=True)
+
+    times = {}
+    for line in p.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        times[name.strip()] = int(cumulative)
+
+    return times
+
+
+def test_cli_import_is_lazy():
+    times = import_times('lesson_builder.cli.jtl')
+
+    eager = [m for m in times if m.split('.')[0] in LAZY_MODULES or
+             any(m == l or m.startswith(l + '.') for l in LAZY_MODULES)]
+
+    assert not eager, f"The CLI imports {', '.join(eager)} at startup"
+    assert times['lesson_builder.cli.jtl'] < IMPORT_BUDGET_US
+
+
+def test_cli_help():
+    from lesson_builder.cli.jtl import main
+
+    result = CliRunner().invoke(main, ['--help'])
+    assert result.exit_code == 0
+    assert 'build' in result.output and 'bench' in result.output
+
+
+def test_bench_needs_a_suite(tmp_path, monkeypatch):
+    from lesson_builder.cli import jtl
+
+    result = CliRunner().invoke(jtl.main, ['bench', '--suite', str(tmp_path / 'nope')])
+    assert result.exit_code == 2 and 'No benchmark suite' in result.output
+
+    # As when installed in site-packages, without the benchmarks dir
+    monkeypatch.setattr(jtl, '__file__', str(tmp_path / 'a' / 'b' / 'cli' / 'jtl.py'))
+    result = CliRunner().invoke(jtl.main, ['bench'])
+    assert result.exit_code == 2 and '--suite' in result.output
+
+
+def test_reexported_names_shadow_submodules():
+    """`from lesson_builder import render, trinket` gives the functions, even
+    after the submodules of the same names were imported"""
+    code = dedent("""
+        import lesson_builder.render, lesson_builder.trinket
+        from lesson_builder import render, trinket
+        assert callable(render) and render.__module__ == 'lesson_builder.render', render
+        assert callable(trinket) and trinket.__module__ == 'lesson_builder.trinket', trinket
+        import lesson_builder
+        assert lesson_builder.render is render and lesson_builder.generate_trinket_embed
+    """)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([str(src_dir), os.environ.get('PYTHONPATH', '')]))
+    subprocess.run([sys.executable, '-c', code], env=env, check=True)
+
+
+def test_bench_size_keeps_unsized_benchmarks(monkeypatch):
+    import pytest
+
+    from lesson_builder.cli import jtl
+
+    calls = []
+    monkeypatch.setattr(pytest, 'main', lambda args: calls.append(args) or 0)
+    CliRunner().invoke(jtl.main, ['bench', '-s', 'small'])
+
+    args = calls[0]
+    keyword = args[args.index('-k') + 1]
+
+    # Collect the real suite with the same keyword expression
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([str(src_dir), os.environ.get('PYTHONPATH', '')]))
+    p = subprocess.run([sys.executable, '-m', 'pytest', args[0], '--collect-only', '-q',
+                        '-o', 'addopts=', '-p', 'no:cacheprovider', '-k', keyword],
+                       env=env, capture_output=True, text=True, check=True)
+    ids = [l for l in p.stdout.splitlines() if '::' in l]
+
+    assert any('test_bench_fences' in i for i in ids)
+    assert any('[small]' in i for i in ids)
+    assert not any('[medium]' in i or '[large]' in i for i in ids)
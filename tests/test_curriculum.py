@@ -0,0 +1,55 @@
+import pytest
+
+from lesson_builder.lesson_plan import LessonPlan
+
+
+def test_curriculum_indexes(basic_site):
+    lesson_dir, docs_dir = basic_site
+    lp = LessonPlan(lesson_dir, docs_dir)
+    cur = lp.curriculum
+
+    assert lp.curriculum is cur
+    assert [l.name for l in cur] == ['module_1']
+
+    lesson = cur.lesson('module_1')
+    assert lesson.assignments is lesson.assignments
+    assert [a.name for a in lesson.assignments] == ['basic_dir', 'basic_file']
+
+    a = cur.assignment(lesson_dir / 'module_1' / 'basic_dir')
+    assert a is lesson.assignments[0]
+
+    assert cur.sources(lesson_dir / 'module_1' / 'basic_dir' / 'python_program.py') == (a,)
+    assert cur.sources(lesson_dir / 'lesson1.md') == (lesson,)
+    assert lesson in cur.sources(lesson_dir / 'assets' / 'flag.png')
+
+
+def test_curriculum_is_immutable(basic_site):
+    lesson_dir, docs_dir = basic_site
+    cur = LessonPlan(lesson_dir, docs_dir).curriculum
+    lesson = cur.lessons[0]
+
+    with pytest.raises(AttributeError):
+        lesson.title = 'Changed'
+
+    with pytest.raises(AttributeError):
+        lesson.assignments[0].name = 'changed'
+
+    with pytest.raises(TypeError):
+        cur.by_lesson['new'] = lesson
+
+    # The lesson and assignment data are read-only too
+    with pytest.raises(TypeError):
+        lesson.ld['title'] = 'Changed'
+
+    for a in lesson.assignments:
+        with pytest.raises(TypeError):
+            a.ass_data['texts']['new'] = a.path
+        assert isinstance(a.ass_data['resources'], tuple)
+
+
+def test_curriculum_leaves_lesson_plan_alone(basic_site):
+    lesson_dir, docs_dir = basic_site
+    lp = LessonPlan(lesson_dir, docs_dir)
+
+    assert lp.curriculum.lesson('module_1').ld['name'] == 'module_1'
+    assert all('name' not in l for l in lp.lesson_plan['lessons'].values())
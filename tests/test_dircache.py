@@ -0,0 +1,90 @@
+import os
+from collections import Counter
+from pathlib import Path
+
+from lesson_builder.assignment import get_assignment
+from lesson_builder.config import resource_extensions
+from lesson_builder.dircache import DirCache
+from lesson_builder.lesson_plan import LessonPlan
+from lesson_builder.synthetic import make_lesson_plan, png_bytes
+
+
+def test_dir_cache(tmp_path):
+    (tmp_path / 'd').mkdir()
+    (tmp_path / 'd' / 'a.py').write_text('')
+    (tmp_path / 'd' / 'b.md').write_text('')
+    (tmp_path / 'd' / '.hidden.md').write_text('')
+
+    dc = DirCache()
+
+    assert dc.is_dir(tmp_path / 'd') and not dc.is_file(tmp_path / 'd')
+    assert dc.is_file(tmp_path / 'd' / 'a.py')
+    assert not dc.exists(tmp_path / 'd' / 'nope')
+    assert not dc.is_dir(tmp_path / 'nope' / 'deeper')
+    # Like Path.glob('*'), hidden entries are included
+    assert dc.children(tmp_path / 'd') == sorted((tmp_path / 'd').glob('*'))
+    assert dc.children(tmp_path / 'd', '.md') == [tmp_path / 'd' / '.hidden.md', tmp_path / 'd' / 'b.md']
+    assert dc.is_dir('/')
+
+    scans = dc.scans
+    dc.children(tmp_path / 'd')
+    dc.exists(tmp_path / 'd' / 'b.md')
+    assert dc.scans == scans
+
+
+def test_lesson_plan_scans_each_dir_once(tmp_path, monkeypatch):
+    lesson_dir, docs_dir = make_lesson_plan(tmp_path, lessons=3, assignments=6, dir_fraction=0.3)
+
+    scanned = Counter()
+    scandir = os.scandir
+
+    def counting_scandir(path='.'):
+        scanned[os.path.abspath(path)] += 1
+        return scandir(path)
+
+    monkeypatch.setattr(os, 'scandir', counting_scandir)
+
+    lp = LessonPlan(lesson_dir, docs_dir)
+    assert len(lp.curriculum.assignments) == 18
+
+    assert scanned and max(scanned.values()) == 1
+    assert lp.dir_cache.scans == len(scanned)
+
+
+def glob_assignment(path):
+    """The sources, texts and resources of an assignment, found with
+    Path.glob, as get_assignment() found them before the DirCache"""
+    path = Path(path)
+
+    if path.is_file():
+        files, sources, texts = list(path.parent.glob('*')), [], {'trinket': path}
+    else:
+        files = list(path.glob('*'))
+        sources = list(path.glob('*.py'))
+        texts = {f.stem: f for f in path.glob('*.md')}
+
+    return sorted(sources), texts, sorted(f for f in files if f.suffix in resource_extensions)
+
+
+def test_get_assignment_matches_glob(tmp_path):
+    lesson_dir, docs_dir = make_lesson_plan(tmp_path, lessons=1, assignments=6, dir_fraction=0.5, seed=3)
+    paths = [a.path for a in LessonPlan(lesson_dir, docs_dir).curriculum.assignments]
+    assert any(p.is_dir() for p in paths) and any(p.is_file() for p in paths)
+
+    # Hidden files are sources, texts and resources too
+    for p in paths:
+        d = p if p.is_dir() else p.parent
+        (d / '.hidden.py').write_text('print(1)\n')
+        (d / '.notes.md').write_text('# Notes\n')
+        (d / '.hidden.png').write_bytes(png_bytes())
+
+    dc = DirCache()
+    for p in paths:
+        meta = get_assignment(p, dc)
+        sources, texts, resources = glob_assignment(p)
+
+        assert sorted(meta['sources']) == sources
+        assert meta['texts'] == texts
+        # File assignments also get the resources their text references
+        assert set(resources) <= set(meta['resources'])
+        assert any(r.name == '.hidden.png' for r in meta['resources'])
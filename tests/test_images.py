@@ -0,0 +1,63 @@
+import pytest
+
+from lesson_builder.lesson_plan import LessonPlan
+from lesson_builder.manifest import BuildManifest
+from lesson_builder.synthetic import png_bytes
+
+Image = pytest.importorskip('PIL.Image')
+
+from lesson_builder.images import ImageOptimizer  # noqa: E402
+
+
+def test_optimizer_caches_by_content(tmp_path):
+    src = tmp_path / 'goal.png'
+    src.write_bytes(png_bytes(800, 600))
+
+    opt = ImageOptimizer(tmp_path / 'cache')
+
+    full = opt.optimize(src)
+    small = opt.optimize(src, 200)
+    assert (opt.hits, opt.misses) == (0, 2)
+    assert full.stat().st_size <= src.stat().st_size
+
+    with Image.open(small) as img:
+        assert img.size == (200, 150)
+
+    assert opt.optimize(src, 200) == small
+    assert opt.hits == 1
+
+    # Same content in another file is the same cache entry
+    copy = tmp_path / 'copy.png'
+    copy.write_bytes(src.read_bytes())
+    assert opt.optimize(copy, 200) == small
+
+    src.write_bytes(png_bytes(800, 600, color=(0, 0, 0)))
+    assert opt.optimize(src, 200) != small
+
+
+def test_build_optimizes_images(basic_site, tmp_path, monkeypatch):
+    monkeypatch.setattr('lesson_builder.config.cache_dir', tmp_path / 'cache')
+
+    lesson_dir, docs_dir = basic_site
+    lp_file = lesson_dir / 'lesson-plan.yaml'
+    lp_file.write_text(lp_file.read_text() + '\noptimize_images: true\n')
+
+    asgn = lesson_dir / 'module_1' / 'basic_dir'
+    (asgn / 'goal.png').write_bytes(png_bytes(1000, 500))
+    with open(asgn / 'trinket.md', 'a') as f:
+        f.write('\n{{ goal_image("goal.png") }}\n')
+
+    lp = LessonPlan(lesson_dir, docs_dir)
+    lp.build(manifest=BuildManifest.for_lesson_plan(lp))
+
+    out = docs_dir / 'src' / 'lessons' / 'module_1' / 'basic_dir'
+    with Image.open(out / 'goal-400w.png') as img:
+        assert img.width == 400
+    assert (out / 'goal-200w.png').exists()
+    assert 'srcset="./goal-200w.png 200w, ./goal-400w.png 400w"' in (out / 'index.md').read_text()
+    assert lp.image_optimizer.misses == 5  # With the two plan assets
+
+    lp = LessonPlan(lesson_dir, docs_dir)
+    manifest = BuildManifest.for_lesson_plan(lp)
+    lp.build(manifest=manifest)
+    assert manifest.misses == 0
@@ -0,0 +1,74 @@
+import os
+
+import yaml
+
+from lesson_builder.jmod import walk
+from lesson_builder.jmod.walk import cached_process_dir, process_dir, scan_levels, walk_assignments, walk_modules
+from lesson_builder.synthetic import make_levels, png_bytes
+
+
+def process_all(repo_root, levels_dir, **kwargs):
+    results = [cached_process_dir(repo_root, levels_dir, d, **kwargs) for d in walk_assignments(levels_dir)]
+    return [m for m, _ in results], sum(reused for _, reused in results)
+
+
+def test_cached_process_dir(tmp_path, monkeypatch):
+    levels_dir = make_levels(tmp_path, modules=1, lessons=2, assignments=2)
+    dirs = walk_assignments(levels_dir)
+
+    metas, reused = process_all(tmp_path, levels_dir)
+    assert reused == 0 and len(metas) == 4
+    assert metas == [process_dir(tmp_path, levels_dir, d) for d in dirs]
+
+    meta_file = dirs[0] / '.meta'
+    assert '_fingerprint' in yaml.safe_load(meta_file.read_text())
+
+    again, reused = process_all(tmp_path, levels_dir)
+    assert reused == 4 and again == metas
+
+    # A changed README, and a new image, are processed again
+    readme = dirs[0] / 'README.md'
+    readme.write_text(readme.read_text() + '\nMore.\n')
+    (dirs[1] / 'images' / 'new.png').write_bytes(png_bytes())
+
+    again, reused = process_all(tmp_path, levels_dir)
+    assert reused == 2
+    assert again[0]['text'].endswith('\nMore.\n')
+    assert any(r.endswith('new.png') for r in again[1]['resources'])
+
+    # A new version of process_dir() makes every .meta stale
+    monkeypatch.setattr(walk, 'META_VERSION', walk.META_VERSION + 1)
+    _, reused = process_all(tmp_path, levels_dir)
+    assert reused == 0
+
+    # Writing the same .meta again leaves the file alone
+    mtime = os.stat(meta_file).st_mtime_ns
+    _, reused = process_all(tmp_path, levels_dir, force=True)
+    assert reused == 0 and os.stat(meta_file).st_mtime_ns == mtime
+
+
+def test_scan_levels(tmp_path):
+    levels_dir = make_levels(tmp_path, levels=1, modules=2, lessons=2, assignments=2)
+    module = levels_dir / 'Level0' / 'Module0'
+
+    # Java files in pruned dirs are not assignments
+    for d in ('bin/_00_lesson_0/x', 'tests/t', '.git/objects'):
+        (module / d).mkdir(parents=True)
+        (module / d / 'Foo.java').write_text('class Foo {}')
+
+    # A .web dir alone makes an assignment
+    web_only = module / 'src' / '_01_lesson_1' / '_9_web_only'
+    (web_only / '.web').mkdir(parents=True)
+
+    entries = list(scan_levels(levels_dir))
+    assignments = walk_assignments(levels_dir)
+
+    assert len(assignments) == 9 and web_only in assignments
+    assert all('src' in a.parts for a in assignments)
+    assert [m.name for m in walk_modules(levels_dir)] == ['Module0', 'Module1']
+
+    readmes = {(e.level, e.module, e.lesson) for e in entries if e.kind == 'readme'}
+    assert readmes == {('Level0', None, None),
+                       ('Level0', 'Module0', None), ('Level0', 'Module1', None),
+                       ('Level0', 'Module0', '_00_lesson_0'), ('Level0', 'Module0', '_01_lesson_1'),
+                       ('Level0', 'Module1', '_00_lesson_0'), ('Level0', 'Module1', '_01_lesson_1')}
@@ -0,0 +1,41 @@
+from lesson_builder.lesson_plan import LessonPlan
+from lesson_builder.manifest import BuildManifest, hash_file
+
+
+def test_manifest_skips_unchanged(basic_site):
+    lesson_dir, docs_dir = basic_site
+    lp = LessonPlan(lesson_dir, docs_dir)
+
+    m = BuildManifest.for_lesson_plan(lp)
+    lp.build(manifest=m)
+    assert m.misses > 0
+    assert lp.manifest_path.exists()
+
+    m = BuildManifest.for_lesson_plan(lp)
+    lp.build(manifest=m)
+    assert m.misses == 0 and m.hits > 0
+
+
+def test_manifest_rebuilds_changed(basic_site):
+    lesson_dir, docs_dir = basic_site
+    lp = LessonPlan(lesson_dir, docs_dir)
+    lp.build(manifest=BuildManifest.for_lesson_plan(lp))
+
+    src = lesson_dir / 'module_1' / 'basic_dir' / 'python_program.py'
+    src.write_text(src.read_text() + '\nprint("changed")\n')
+
+    lp = LessonPlan(lesson_dir, docs_dir)
+    m = BuildManifest.for_lesson_plan(lp)
+    lp.build(manifest=m)
+
+    out = docs_dir / 'src' / 'lessons' / 'module_1' / 'basic_dir'
+    # The copy of the source, and the page that embeds it
+    assert m.misses >= 2
+    assert 'changed' in (out / 'python_program.py').read_text()
+    assert 'changed' in (out / 'index.md').read_text()
+
+    # Damaged outputs are rewritten too
+    (out / 'python_program.py').write_text('')
+    m = BuildManifest.for_lesson_plan(lp)
+    lp.build(manifest=m)
+    assert hash_file(out / 'python_program.py') == hash_file(src)
@@ -0,0 +1,73 @@
+import json
+from copy import deepcopy
+
+import pytest
+import yaml
+
+from lesson_builder.jmod.metastore import meta_dir, read_index, read_level, write_meta
+from lesson_builder.jmod.util import compile_meta
+from lesson_builder.jmod.walk import process_dir, walk_assignments
+from lesson_builder.synthetic import make_levels
+
+
+@pytest.fixture
+def metas(tmp_path):
+    levels_dir = make_levels(tmp_path, levels=2, modules=2, lessons=2, assignments=2)
+    found = [process_dir(tmp_path, levels_dir, d) for d in walk_assignments(levels_dir)]
+
+    metas = compile_meta([m for m in found if m])
+    for level, lv in metas.items():
+        lv['_readme'] = f"# {level}\n"
+        lv['Module0']['_readme'] = "# Module 0\n"
+
+    return metas
+
+
+def test_write_and_read_level(tmp_path, metas):
+    write_meta(tmp_path, deepcopy(metas))
+
+    md = meta_dir(tmp_path)
+    shard = json.loads((md / 'Level0.json').read_text())
+    assert '_readme' not in shard and '_readme_file' in shard
+    assert 'text' not in json.dumps(shard).replace('text_file', '')
+
+    assert read_level(tmp_path, 'Level0') == metas['Level0']
+    assert read_index(tmp_path)['levels']['Level1'] == {'modules': ['Module0', 'Module1']}
+
+    with pytest.raises(KeyError, match='Level9'):
+        read_level(tmp_path, 'Level9')
+
+
+def test_read_level_reads_one_level(tmp_path, metas):
+    write_meta(tmp_path, deepcopy(metas))
+
+    # Break the other level; reading Level0 must not touch it
+    md = meta_dir(tmp_path)
+    (md / 'Level1.json').write_text('not json')
+    for f in (md / 'Level1').glob('*.md'):
+        f.unlink()
+
+    assert read_level(tmp_path, 'Level0') == metas['Level0']
+
+
+def test_write_meta_removes_stale(tmp_path, metas):
+    write_meta(tmp_path, deepcopy(metas))
+
+    del metas['Level1']
+    metas['Level0']['_readme'] = "# Changed\n"
+    write_meta(tmp_path, deepcopy(metas))
+
+    md = meta_dir(tmp_path)
+    assert not (md / 'Level1.json').exists() and not list((md / 'Level1').glob('*.md'))
+    assert list(read_index(tmp_path)['levels']) == ['Level0']
+    assert read_level(tmp_path, 'Level0') == metas['Level0']
+
+    texts = {f.read_text() for f in (md / 'Level0').glob('*.md')}
+    assert "# Changed\n" in texts and "# Level0\n" not in texts
+
+
+def test_legacy_meta_yaml(tmp_path, metas):
+    (tmp_path / 'meta.yaml').write_text(yaml.dump(metas))
+
+    assert read_level(tmp_path, 'Level1') == metas['Level1']
+    assert sorted(read_index(tmp_path)['levels']) == ['Level0', 'Level1']
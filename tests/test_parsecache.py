@@ -0,0 +1,73 @@
+import os
+
+from click.testing import CliRunner
+
+from lesson_builder.lesson_plan import LessonPlan
+from lesson_builder.parsecache import ParseCache, parse_cache
+
+
+def test_parse_cache(tmp_path):
+    f = tmp_path / 'a.yaml'
+    f.write_text('a: 1\nb: [1, 2]\n')
+
+    pc = ParseCache(tmp_path / 'cache')
+
+    assert pc.yaml(f) == {'a': 1, 'b': [1, 2]}
+    assert (pc.hits, pc.misses) == (0, 1)
+
+    # Values are fresh copies, so callers can change them
+    pc.yaml(f)['a'] = 2
+    assert pc.yaml(f) == {'a': 1, 'b': [1, 2]}
+    assert pc.hits == 2
+
+    # Touched, but the same content
+    os.utime(f, ns=(1, 1))
+    assert pc.yaml(f) == {'a': 1, 'b': [1, 2]}
+    assert (pc.hits, pc.misses) == (3, 1)
+
+    f.write_text('a: 3\n')
+    assert pc.yaml(f) == {'a': 3}
+    assert pc.misses == 2
+
+    pc.enabled = False
+    f.write_text('a: 4\n')
+    os.utime(f, ns=(1, 1))
+    assert pc.yaml(f) == {'a': 4}
+    assert (pc.hits, pc.misses) == (3, 2)
+
+
+def test_parse_cache_frontmatter(tmp_path):
+    f = tmp_path / 'a.md'
+    f.write_text('---\ntitle: Hello\n---\n# Body\n')
+
+    pc = ParseCache(tmp_path / 'cache')
+    pc.frontmatter(f)
+    post = pc.frontmatter(f)
+
+    assert pc.hits == 1
+    assert post['title'] == 'Hello' and post.content == '# Body'
+
+
+def test_lesson_plan_uses_cache(basic_site, tmp_path, monkeypatch):
+    monkeypatch.setattr(parse_cache, 'hits', 0)
+    monkeypatch.setattr(parse_cache, 'misses', 0)
+
+    lesson_dir, docs_dir = basic_site
+
+    LessonPlan(lesson_dir, docs_dir).build()
+    parsed, hits = parse_cache.misses, parse_cache.hits
+    assert parsed
+
+    LessonPlan(lesson_dir, docs_dir).build()
+    assert parse_cache.misses == parsed and parse_cache.hits == hits + (parsed + hits)
+
+
+def test_no_cache_option(monkeypatch):
+    from lesson_builder.cli.jtl import main
+
+    monkeypatch.setattr(parse_cache, 'enabled', True)
+
+    result = CliRunner().invoke(main, ['--no-cache', 'config', '--help'])
+
+    assert result.exit_code == 0, result.output
+    assert parse_cache.enabled is False
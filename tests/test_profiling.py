@@ -0,0 +1,42 @@
+import pstats
+
+from lesson_builder.lesson_plan import LessonPlan
+from lesson_builder.profiling import module_of, profiled
+
+
+def test_profiled_build(basic_site, tmp_path, capsys):
+    lesson_dir, docs_dir = basic_site
+    out_dir = tmp_path / 'profile'
+
+    with profiled('build', out_dir, sample=True):
+        # Nested blocks are part of the outer profile
+        with profiled('inner', out_dir):
+            LessonPlan(lesson_dir, docs_dir).build()
+
+    assert not (out_dir / 'inner.pstats').exists()
+
+    stats = pstats.Stats(str(out_dir / 'build.pstats'))
+    assert any(fn.endswith('lesson_plan.py') for fn, _, _ in stats.stats)
+
+    for line in (out_dir / 'build.collapsed').read_text().splitlines():
+        stack, n = line.rsplit(' ', 1)
+        assert int(n) > 0 and stack
+
+    out = capsys.readouterr().out
+    assert '=== lesson_builder modules' in out
+    assert 'lesson_builder.lesson_plan' in out
+    assert 'overhead of the stack sampler' in out
+
+
+def test_profiled_without_sampler(tmp_path, capsys):
+    with profiled('quiet', tmp_path):
+        sum(range(1000))
+
+    assert (tmp_path / 'quiet.pstats').exists()
+    assert not (tmp_path / 'quiet.collapsed').exists()
+    assert 'overhead' not in capsys.readouterr().out
+
+
+def test_module_of():
+    assert module_of('/x/src/lesson_builder/jmod/walk.py') == 'lesson_builder.jmod.walk'
+    assert module_of('/venv/lib/python3.11/site-packages/jinja2/environment.py') == 'jinja2'
@@ -0,0 +1,21 @@
+from pathlib import Path
+
+from lesson_builder.render import get_environment, render
+
+
+def test_environment_is_shared():
+    env = get_environment()
+    assert env is get_environment()
+
+    t = env.get_template('assignment.md')
+    render('assignment.md', frontmatter={'title': 'T'}, working_directory=Path('.'),
+           content='# Hello')
+    assert env.get_template('assignment.md') is t
+
+
+def test_render_content_and_frontmatter():
+    out = render('assignment.md', frontmatter={'title': 'T'}, working_directory=Path('.'),
+                 content='---\nx: 1\n---\n# Hello {{ fm_x }}')
+
+    assert out.startswith('---\ntitle: T\n')
+    assert '# Hello 1' in out
@@ -0,0 +1,113 @@
+import os
+
+import pytest
+
+from lesson_builder.lesson_plan import LessonPlan
+from lesson_builder.sink import OutputSink, LINK_MODES
+
+
+def test_write_if_changed(tmp_path):
+    s = OutputSink()
+    f = tmp_path / 'sub' / 'a.txt'
+
+    assert s.write_text(f, 'hello')
+    os.utime(f, ns=(0, 0))
+
+    assert not s.write_text(f, 'hello')
+    assert f.stat().st_mtime_ns == 0
+
+    assert s.write_text(f, 'changed')
+    assert f.read_text() == 'changed'
+    assert (s.written, s.unchanged) == (2, 1)
+    assert [p.name for p in f.parent.iterdir()] == ['a.txt']
+
+
+def test_new_file_permissions(tmp_path):
+    s = OutputSink()
+    f = tmp_path / 'a.txt'
+
+    old = os.umask(0o027)
+    try:
+        s.write_text(f, 'new')
+    finally:
+        os.umask(old)
+
+    assert f.stat().st_mode & 0o777 == 0o640
+
+    # A replaced file keeps its permissions
+    f.chmod(0o600)
+    s.write_text(f, 'changed')
+    assert f.stat().st_mode & 0o777 == 0o600
+
+    s.reset()
+    assert (s.written, s.unchanged) == (0, 0)
+
+
+def test_copy_file_and_tree(tmp_path):
+    s = OutputSink()
+    src = tmp_path / 'src'
+    (src / 'd').mkdir(parents=True)
+    (src / 'a.txt').write_text('a')
+    (src / 'd' / 'b.txt').write_text('b')
+
+    assert s.copy_tree(src, tmp_path / 'dest') == 2
+    assert s.copy_tree(src, tmp_path / 'dest') == 0
+
+    (src / 'd' / 'b.txt').write_text('B')
+    assert s.copy_tree(src, tmp_path / 'dest') == 1
+    assert (tmp_path / 'dest' / 'd' / 'b.txt').read_text() == 'B'
+
+
+def test_rebuild_leaves_outputs_untouched(basic_site):
+    lesson_dir, docs_dir = basic_site
+    LessonPlan(lesson_dir, docs_dir).build()
+
+    outputs = [p for p in (docs_dir / 'src').rglob('*') if p.is_file()]
+    for p in outputs:
+        os.utime(p, ns=(0, 0))
+
+    # Without a manifest, everything is regenerated, but nothing changes
+    LessonPlan(lesson_dir, docs_dir).build()
+
+    assert [p for p in outputs if p.stat().st_mtime_ns != 0] == []
+
+
+@pytest.mark.parametrize('mode', LINK_MODES)
+def test_link_modes(tmp_path, mode):
+    s = OutputSink(link_mode=mode)
+    src = tmp_path / 'a.png'
+    src.write_bytes(b'png' * 100)
+    dest = tmp_path / 'out' / 'a.png'
+
+    assert s.copy_file(src, dest)
+    assert dest.read_bytes() == src.read_bytes()
+    assert not s.copy_file(src, dest)
+
+    if mode == 'hardlink':
+        assert os.path.samefile(src, dest)
+    elif mode == 'symlink':
+        assert dest.is_symlink()
+
+    # Writing generated content over a linked file must not touch the source
+    s.write_bytes(dest, b'new')
+    assert src.read_bytes() == b'png' * 100
+
+
+def test_link_fallback(tmp_path, monkeypatch):
+    s = OutputSink(link_mode='hardlink')
+    src = tmp_path / 'a.png'
+    src.write_bytes(b'png')
+
+    def no_link(*args):
+        raise OSError('Invalid cross-device link')
+
+    monkeypatch.setattr(os, 'link', no_link)
+
+    assert s.copy_file(src, tmp_path / 'out' / 'a.png')
+    assert (tmp_path / 'out' / 'a.png').read_bytes() == b'png'
+    assert len(s._unsupported) == 1
+
+
+def test_unknown_link_mode():
+    with pytest.raises(ValueError):
+        OutputSink(link_mode='teleport')
@@ -0,0 +1,42 @@
+from lesson_builder.jmod.util import compile_meta
+from lesson_builder.jmod.walk import process_dir, walk_assignments
+from lesson_builder.lesson_plan import LessonPlan
+from lesson_builder.synthetic import make_lesson_plan, make_levels, png_bytes
+
+
+def test_synthetic_lesson_plan(tmp_path):
+    lesson_dir, docs_dir = make_lesson_plan(tmp_path, lessons=3, assignments=4, seed=1)
+
+    lp = LessonPlan(lesson_dir, docs_dir)
+    plan = lp.build()
+
+    assert len(lp.lessons) == 3
+    assert len(lp.curriculum.assignments) == 12
+    # One render per lesson text and assignment
+    assert len(plan.renders) == 15
+
+    out = docs_dir / 'src' / 'lessons' / 'lesson_000'
+    text = (out / 'index.md').read_text()
+    assert '* Step 3' in text and 'Lesson 0' in text
+
+    for a in lp.lessons[0].assignments:
+        assert 'trinket.io' in (a.dest_dir / 'index.md').read_text()
+
+    # Same seed, same content
+    lesson_dir2, _ = make_lesson_plan(tmp_path / 'again', lessons=3, assignments=4, seed=1)
+    assert (lesson_dir2 / 'lesson-plan.yaml').read_text() == (lesson_dir / 'lesson-plan.yaml').read_text()
+
+
+def test_synthetic_levels(tmp_path):
+    levels_dir = make_levels(tmp_path, levels=1, modules=2, lessons=3, assignments=2)
+
+    metas = [process_dir(tmp_path, levels_dir, d) for d in walk_assignments(levels_dir)]
+    meta = compile_meta([m for m in metas if m])
+
+    assert sorted(meta['Level0']) == ['Module0', 'Module1']
+    assert len(meta['Level0']['Module0']) == 3
+    assert all(len(ls['assignments']) == 2 for ls in meta['Level0']['Module0'].values())
+
+
+def test_png_bytes():
+    assert png_bytes().startswith(b'\x89PNG\r\n\x1a\n')
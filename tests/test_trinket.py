@@ -0,0 +1,84 @@
+import pytest
+
+from lesson_builder.trinket import RunBlock, extract_python, generate_trinket_embed, tokenize_run_fences
+
+SOURCE = """# Title
+
+Some text
+```python.run: height=600, width='80%'
+print("one")
+```
+More text
+```python.run
+print("two")
+print("three")
+```
+
+```java.run
+System.out.println("four");
+```
+~~~~python.run:height=300
+print("``` not a fence")
+~~~~
+"""
+
+
+def test_tokenize_run_fences():
+    tokens = list(tokenize_run_fences(SOURCE))
+    blocks = [t for t in tokens if isinstance(t, RunBlock)]
+
+    assert ''.join(t if isinstance(t, str) else t.raw for t in tokens) == SOURCE
+
+    assert [b.lang for b in blocks] == ['python', 'python', 'java', 'python']
+    assert [(b.line, b.end_line) for b in blocks] == [(4, 6), (8, 11), (13, 15), (16, 18)]
+
+    one, two, java, tilde = blocks
+    assert one.options == {'height': '600', 'width': '80%'}
+    assert (one.height, one.width) == (600, '80%')
+    assert two.code == 'print("two")\nprint("three")\n'
+    assert (two.height, two.width) == (3 * 17 + 110, None)
+    assert tilde.code == 'print("``` not a fence")\n'
+
+
+def test_extract_python():
+    out, code = extract_python(SOURCE, 'prog')
+
+    assert code == {'prog_1.py': 'print("one")\n', 'prog_2.py': 'print("two")\nprint("three")\n',
+                    'prog_3.py': 'print("``` not a fence")\n'}
+    assert '{{ trinket("prog_1.py", width="80%", height="600", embed_type="python3") | safe }}\nMore text' in out
+    assert 'height="161"' in out
+    assert '```java.run\nSystem.out.println("four");\n```\n' in out
+
+    calls = []
+    out, _ = extract_python(SOURCE, replacement_f=lambda *args: calls.append(args) or 'X')
+    assert [c[1:] for c in calls] == [(600, '80%'), (161,), (300,)]
+    assert calls[0][0] == 'print("one")\n\n\n\n'
+
+
+def test_extract_python_unclosed(caplog):
+    source = "# T\n\n```python.run\nprint(1)\n\nMore text\n"
+
+    out, code = extract_python(source, 'prog', source_name='lesson.md')
+
+    assert out == source and not code
+    assert 'lesson.md, line 3: unclosed python.run' in caplog.text
+
+
+def test_extract_python_bad_height():
+    with pytest.raises(ValueError, match='Line 2'):
+        extract_python("\n```python.run: height=big\nprint(1)\n```\n", 'prog')
+
+
+def test_embed_modes():
+    code = 'print("```")\n'
+
+    assert 'loading' not in generate_trinket_embed(code, '100%', '300')
+    assert 'loading="lazy"' in generate_trinket_embed(code, '100%', '300', mode='lazy')
+
+    ph = generate_trinket_embed(code, '100%', '300', 'python3', mode='click')
+    assert '<iframe' not in ph and 'data-trinket-load="click"' in ph
+    assert 'data-trinket-height="300"' in ph
+    assert '\n\n````python\nprint("```")\n````\n\n' in ph
+
+    with pytest.raises(ValueError, match='trinket_embed'):
+        generate_trinket_embed(code, mode='eager')
@@ -0,0 +1,40 @@
+import lesson_builder.config as config
+from lesson_builder.util import find_file_path, find_vuepress_dir
+
+
+def make_dirs(root, *paths):
+    for p in paths:
+        (root / p).mkdir(parents=True)
+
+
+def test_find_file_path_shallowest(tmp_path):
+    make_dirs(tmp_path, 'a/b/c/.vuepress', 'docs/src/.vuepress', 'z/docs/src/.vuepress')
+
+    assert find_file_path(tmp_path, '.vuepress') == tmp_path / 'docs/src/.vuepress'
+    assert find_file_path(tmp_path, 'nothing') is None
+
+
+def test_find_file_path_skips_heavy_dirs(tmp_path):
+    make_dirs(tmp_path, 'node_modules/x/.vuepress', '.git/.vuepress',
+              'site/_build/.vuepress', 'site/docs/src/.vuepress')
+
+    assert find_file_path(tmp_path, '.vuepress') == tmp_path / 'site/docs/src/.vuepress'
+    assert find_file_path(tmp_path, '.vuepress', skip_dirs=()) == tmp_path / '.git/.vuepress'
+
+
+def test_find_vuepress_dir_cached(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'cache_dir', tmp_path / 'cache')
+    project = tmp_path / 'project'
+    make_dirs(project, 'docs/src/.vuepress')
+
+    vp = find_vuepress_dir(project)
+    assert vp == project / 'docs/src/.vuepress'
+    assert (tmp_path / 'cache' / 'vuepress-dirs.json').exists()
+
+    # A shallower one is not found while the cached one exists ...
+    make_dirs(project, 'other/.vuepress')
+    assert find_vuepress_dir(project) == vp
+
+    # ... but the cache is not used once it is gone
+    vp.rmdir()
+    assert find_vuepress_dir(project) == project / 'other/.vuepress'
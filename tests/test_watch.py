@@ -0,0 +1,239 @@
+import shutil
+import time
+
+import pytest
+import yaml
+
+from lesson_builder.build_plan import BuildCancelled, CancelToken
+from lesson_builder.sink import sink
+from lesson_builder.watch import IncrementalBuilder, PLAN_KEY, BuildWorker, ChangeCollector
+from lesson_builder.watch import is_ignored, watch_roots
+
+
+def make_builder(basic_site):
+    lesson_dir, docs_dir = basic_site
+    b = IncrementalBuilder(lesson_dir, docs_dir, lesson_dir)
+    b.full_build()
+    return b
+
+
+def test_rebuild_only_affected(basic_site):
+    lesson_dir, docs_dir = basic_site
+    b = make_builder(basic_site)
+
+    src = lesson_dir / 'module_1' / 'basic_file.md'
+    keys = b.affected(src)
+    assert keys == {('assignment', src.absolute())}
+
+    src.write_text(src.read_text() + '\nMore text\n')
+    m = b.rebuild([src])
+
+    assert m.misses == 1
+    # The sink counts only this rebuild's writes: the page and the manifest
+    assert sink.written == 2
+    out = docs_dir / 'src' / 'lessons' / 'module_1' / 'basic_file' / 'index.md'
+    assert 'More text' in out.read_text()
+
+    assert b.affected(lesson_dir / 'about.md') == {PLAN_KEY}
+    assert b.affected(lesson_dir / 'unused.txt') == set()
+    assert b.rebuild([lesson_dir / 'unused.txt']) is None
+
+
+@pytest.mark.parametrize('without_meta', [False, True])
+def test_new_file_in_lesson_dir(basic_site, without_meta):
+    lesson_dir, docs_dir = basic_site
+
+    if without_meta:
+        # A dir assignment without _assignment.yaml only gets a warning
+        (lesson_dir / 'module_1' / 'basic_dir' / '_assignment.yaml').unlink()
+
+    b = make_builder(basic_site)
+
+    # A new image next to a file assignment is in no source index yet
+    img = lesson_dir / 'module_1' / 'new_image.png'
+    shutil.copy(next(lesson_dir.glob('**/*.png')), img)
+
+    keys = b.affected(img)
+    assert ('lesson', 'module_1') in keys
+    assert ('assignment', (lesson_dir / 'module_1' / 'basic_file.md').absolute()) in keys
+
+    m = b.rebuild([img])
+    assert m is not None
+    assert (docs_dir / 'src' / 'lessons' / 'module_1' / 'basic_file' / 'new_image.png').exists()
+
+
+def test_title_change_updates_config(basic_site):
+    lesson_dir, docs_dir = basic_site
+    b = make_builder(basic_site)
+
+    config = docs_dir / 'src' / '.vuepress' / 'config.yml'
+
+    yml = lesson_dir / 'module_1' / 'basic_dir' / '_assignment.yaml'
+    yml.write_text('description: basic\ntitle: Renamed\n')
+    b.rebuild([yml])
+
+    sidebar = yaml.safe_load(config.read_text())['themeConfig']['sidebar']
+    assert 'Renamed' in [c['title'] for c in sidebar[-1]['children']]
+
+    # A body-only change leaves the config alone
+    mtime = config.stat().st_mtime_ns
+    src = lesson_dir / 'module_1' / 'basic_dir' / 'python_program.py'
+    src.write_text(src.read_text() + '\n# comment\n')
+    b.rebuild([src])
+    assert config.stat().st_mtime_ns == mtime
+
+
+def test_structure_change_rebuilds_all(basic_site):
+    lesson_dir, docs_dir = basic_site
+    b = make_builder(basic_site)
+
+    lp_file = lesson_dir / 'lesson-plan.yaml'
+    assert b.affected(lp_file) is None
+
+    old_lp = b.lp
+    b.rebuild([lp_file])
+    assert b.lp is not old_lp
+
+
+def test_watch_roots_deduplicated(tmp_path):
+    (tmp_path / 'a' / 'b').mkdir(parents=True)
+
+    roots = watch_roots([tmp_path / 'a', tmp_path / 'a' / 'b', tmp_path / 'a' / '.'])
+    assert roots == [(tmp_path / 'a').resolve()]
+
+
+def test_ignored_paths(tmp_path):
+    docs = tmp_path / 'docs'
+
+    assert is_ignored(tmp_path / '.git' / 'index')
+    assert is_ignored(tmp_path / 'node_modules' / 'x' / 'y.js')
+    assert is_ignored(tmp_path / 'lesson.md.swp')
+    assert is_ignored(tmp_path / 'lesson.md~')
+    assert is_ignored(docs / 'src' / 'index.md', ignore_dirs=[docs])
+    assert not is_ignored(tmp_path / 'lesson.md', ignore_dirs=[docs])
+    assert is_ignored(tmp_path / 'draft.md', ignore=('draft*',))
+
+
+def test_events_are_coalesced(tmp_path):
+    c = ChangeCollector()
+
+    for name in ('a.md', 'a.md', 'a.md.swp', 'b.md'):
+        c.add(tmp_path / name)
+
+    assert c.take(debounce=0.05) == {tmp_path / 'a.md', tmp_path / 'b.md'}
+    assert c.take(debounce=0.05, timeout=0.05) == set()
+
+
+def test_reads_do_not_trigger_rebuilds(basic_site):
+    from watchdog.observers import Observer
+
+    lesson_dir, docs_dir = basic_site
+    b = make_builder(basic_site)
+
+    rebuilds = []
+    rebuild = b.rebuild
+
+    def counting_rebuild(paths, cancel=None):
+        rebuilds.append(paths)
+        return rebuild(paths, cancel=cancel)
+
+    b.rebuild = counting_rebuild
+
+    collector = ChangeCollector(ignore_dirs=[docs_dir])
+    worker = BuildWorker(b)
+    observer = Observer()
+    observer.schedule(collector, str(lesson_dir), recursive=True)
+    observer.start()
+    try:
+        time.sleep(0.1)
+        src = lesson_dir / 'module_1' / 'basic_dir' / 'trinket.md'
+        src.write_text(src.read_text() + '\nMore text\n')
+
+        # The rebuild reads its sources; those reads must not queue more builds
+        deadline = time.monotonic() + 2
+        while time.monotonic() < deadline:
+            paths = collector.take(debounce=0.1, timeout=0.2)
+            if paths:
+                worker.submit(paths)
+                worker.join()
+    finally:
+        observer.stop()
+        observer.join()
+        worker.join()
+
+    assert len(rebuilds) == 1
+    assert src.absolute() in rebuilds[0]
+
+
+def test_cancelled_build_is_restarted(basic_site):
+    lesson_dir, docs_dir = basic_site
+    b = IncrementalBuilder(lesson_dir, docs_dir, lesson_dir)
+
+    token = CancelToken()
+    token.cancel()
+    with pytest.raises(BuildCancelled):
+        b.full_build(cancel=token)
+
+    assert not b.complete
+    assert not (docs_dir / 'src' / 'lessons').exists()
+
+    # The next rebuild, for any change, finishes the full build
+    b.rebuild([lesson_dir / 'about.md'])
+    assert b.complete
+    assert (docs_dir / 'src' / 'lessons' / 'module_1' / 'basic_file' / 'index.md').exists()
+
+
+def test_worker_merges_cancelled_changes(basic_site):
+    lesson_dir, docs_dir = basic_site
+    b = make_builder(basic_site)
+
+    calls = []
+    rebuild = b.rebuild
+
+    def slow_rebuild(paths, cancel=None):
+        calls.append(list(paths))
+        if len(calls) == 1:
+            while not cancel.cancelled:
+                time.sleep(0.01)
+            cancel.check()
+        return rebuild(paths, cancel=cancel)
+
+    b.rebuild = slow_rebuild
+
+    w = BuildWorker(b)
+    first, second = lesson_dir / 'about.md', lesson_dir / 'intro.md'
+    w.submit([first])
+    w.submit([second])
+    w.join()
+
+    assert calls == [[first], [first, second]]
+    assert w.unfinished == set()
+
+
+def test_stale_outputs_are_pruned(basic_site):
+    lesson_dir, docs_dir = basic_site
+    b = make_builder(basic_site)
+
+    out = docs_dir / 'src' / 'lessons' / 'module_1'
+    user_file = docs_dir / 'src' / '.vuepress' / 'styles' / 'index.styl'
+    user_file.parent.mkdir(parents=True)
+    user_file.write_text('body {}')
+    assert (out / 'basic_file' / 'index.md').exists()
+
+    # Drop an assignment and a resource from the plan
+    lp_file = lesson_dir / 'lesson-plan.yaml'
+    plan = yaml.safe_load(lp_file.read_text())
+    plan['lessons']['module_1']['assignments'].remove('module_1/basic_file.md')
+    del plan['lessons']['module_1']['resources']
+    lp_file.write_text(yaml.dump(plan))
+
+    b.rebuild([lp_file])
+
+    assert not (out / 'basic_file').exists()
+    assert not (out / 'flag.png').exists()
+    assert (out / 'basic_dir' / 'index.md').exists()
+    assert user_file.exists()
+
+    # Forced builds prune too
+    b.full_build(force=True)
+    assert (out / 'basic_dir' / 'index.md').exists()